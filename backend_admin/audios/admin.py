@@ -1,10 +1,19 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
+from backend_admin.paginators import EstimatedCountPaginator
 from .models import Audio
+from .signals import send_audios_changed
 
 @admin.register(Audio)
 class AudioAdmin(admin.ModelAdmin):
     list_display = ['title', 'artist', 'format', 'duration_formatted', 'file_size_mb', 'is_public', 'is_featured', 'published', 'uploaded_by', 'created_at']
     list_filter = ['is_public', 'is_featured', 'published', 'format', 'genre', 'year', 'created_at']
+    list_select_related = ['uploaded_by']
+    # Estimated totals from table statistics instead of COUNT(*) per page load
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ['uploaded_by', 'related_events']
     search_fields = ['title', 'description', 'artist', 'album']
     readonly_fields = ['created_at', 'updated_at', 'file_size', 'file_size_mb', 'duration_formatted']
     list_editable = ['is_public', 'is_featured', 'published']
@@ -38,24 +47,33 @@ class AudioAdmin(admin.ModelAdmin):
             obj.uploaded_by = request.user
         super().save_model(request, obj, form, change)
     
+    def update_status(self, queryset, **changes):
+        """Bulk UPDATE that bumps updated_at and notifies listeners once"""
+        with transaction.atomic():
+            ids = list(queryset.values_list('id', flat=True))
+            updated = Audio.objects.filter(id__in=ids).update(**changes, updated_at=timezone.now()) if ids else 0
+        if ids:
+            send_audios_changed(ids, fields=list(changes) + ['updated_at'])
+        return updated
+    
     actions = ['publish_selected', 'unpublish_selected', 'make_featured', 'remove_featured']
     
     def publish_selected(self, request, queryset):
-        updated = queryset.update(published=True)
+        updated = self.update_status(queryset, published=True)
         self.message_user(request, f'{updated} audio(s) were successfully published.')
     publish_selected.short_description = "Publish selected audios"
     
     def unpublish_selected(self, request, queryset):
-        updated = queryset.update(published=False)
+        updated = self.update_status(queryset, published=False)
         self.message_user(request, f'{updated} audio(s) were successfully unpublished.')
     unpublish_selected.short_description = "Unpublish selected audios"
     
     def make_featured(self, request, queryset):
-        updated = queryset.update(is_featured=True)
+        updated = self.update_status(queryset, is_featured=True)
         self.message_user(request, f'{updated} audio(s) were successfully featured.')
     make_featured.short_description = "Make selected audios featured"
     
     def remove_featured(self, request, queryset):
-        updated = queryset.update(is_featured=False)
+        updated = self.update_status(queryset, is_featured=False)
         self.message_user(request, f'{updated} audio(s) were successfully unfeatured.')
     remove_featured.short_description = "Remove featured status from selected audios"
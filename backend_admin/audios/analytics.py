@@ -0,0 +1,168 @@
+"""
+Buffered play analytics.
+
+A ``plays += 1`` per stream would serialize every listener of a popular
+sermon on one row lock. Instead each process counts plays and listened
+seconds in memory, keyed by (audio, hour), and every
+``PLAY_FLUSH_INTERVAL`` seconds adds the whole buffer to
+``AudioPlayHourly`` with one multi-row upsert. Flushes run on the
+background pool, never in the request that happened to fill the buffer,
+and read from the primary database only: plays are counted in
+replica-routed requests, and the replica may not have an audio yet.
+
+Each flushed buffer gets a batch ID that is recorded in ``PlayFlushBatch``
+in the same transaction as the upsert. A batch whose commit failed (or
+whose outcome is unknown) is retried with the same ID, so it is applied at
+most once. Counts still in memory when a process stops (at most one
+interval's worth) are lost.
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+from . import background
+from .models import Audio, AudioPlayHourly, PlayFlushBatch
+
+logger = logging.getLogger(__name__)
+
+UPSERT_ROWS = 500
+# Failed batches kept for retry while the database is unreachable
+MAX_PENDING_BATCHES = 100
+BATCH_RETENTION = timedelta(days=1)
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _upsert_sql(rows):
+    table = connection.ops.quote_name(AudioPlayHourly._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+    sql = f"INSERT INTO {table} (audio_id, hour, plays, listened_seconds) VALUES {values} "
+    if connection.vendor == 'mysql':
+        sql += ('ON DUPLICATE KEY UPDATE plays = plays + VALUES(plays), '
+                'listened_seconds = listened_seconds + VALUES(listened_seconds)')
+    else:
+        sql += (f"ON CONFLICT (audio_id, hour) DO UPDATE SET plays = {table}.plays + excluded.plays, "
+                f"listened_seconds = {table}.listened_seconds + excluded.listened_seconds")
+    params = []
+    for audio_id, hour, plays, seconds in rows:
+        params += [audio_id, connection.ops.adapt_datetimefield_value(hour), plays, seconds]
+    return sql, params
+
+
+def apply_batch(batch_id, counts):
+    """
+    Add ``counts`` ({(audio_id, hour): [plays, seconds]}) to the hourly
+    rollup. Returns False when ``batch_id`` was already applied.
+    """
+    with transaction.atomic(using='default'):
+        try:
+            with transaction.atomic(using='default'):
+                PlayFlushBatch.objects.using('default').create(batch_id=batch_id)
+        except IntegrityError:
+            return False
+
+        # Audios deleted since they were played would violate the foreign key
+        existing = set(Audio.objects.using('default').filter(
+            pk__in={audio_id for audio_id, _ in counts}
+        ).values_list('pk', flat=True))
+        rows = [
+            (audio_id, hour, plays, round(seconds))
+            for (audio_id, hour), (plays, seconds) in counts.items()
+            if audio_id in existing
+        ]
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), UPSERT_ROWS):
+                cursor.execute(*_upsert_sql(rows[start:start + UPSERT_ROWS]))
+        PlayFlushBatch.objects.using('default').filter(applied_at__lt=timezone.now() - BATCH_RETENTION).delete()
+    return True
+
+
+class PlayBuffer:
+    """Per-process play counters; thread safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counts = {}
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._flush_queued = False
+
+    def add(self, audio_id, plays=1, seconds=0, now=None):
+        hour = hour_of(now or timezone.now())
+        interval = getattr(settings, 'PLAY_FLUSH_INTERVAL', 10)
+        with self._lock:
+            counts = self._counts.setdefault((audio_id, hour), [0, 0])
+            counts[0] += plays
+            counts[1] += seconds
+            due = not self._flush_queued and (
+                time.monotonic() - self._last_flush >= interval
+                or len(self._counts) >= getattr(settings, 'PLAY_BUFFER_MAX_KEYS', 5000)
+            )
+            if due:
+                self._flush_queued = True
+        if due:
+            background.submit(self._queued_flush)
+
+    def _queued_flush(self):
+        try:
+            self.flush()
+        finally:
+            self._flush_queued = False
+
+    def _take(self):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            self._last_flush = time.monotonic()
+        if counts:
+            self._pending.append((uuid.uuid4(), counts))
+        if len(self._pending) > MAX_PENDING_BATCHES:
+            dropped = self._pending.pop(0)
+            logger.warning("Dropping play batch %s: %d keys", dropped[0], len(dropped[1]))
+
+    def flush(self):
+        """Write buffered counts; returns the number of batches applied"""
+        # One flusher per process; other threads keep counting
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._take()
+            applied = 0
+            while self._pending:
+                batch_id, counts = self._pending[0]
+                try:
+                    apply_batch(batch_id, counts)
+                except DatabaseError:
+                    logger.exception("Play batch %s failed, will retry", batch_id)
+                    break
+                self._pending.pop(0)
+                applied += 1
+            return applied
+        finally:
+            self._flush_lock.release()
+
+    def clear(self):
+        """Forget everything not yet flushed"""
+        with self._lock:
+            self._counts = {}
+            self._pending = []
+
+
+play_buffer = PlayBuffer()
+
+
+def record_play(audio_id, plays=1, seconds=0):
+    """Count a play and/or listened seconds of an audio"""
+    play_buffer.add(audio_id, plays, seconds)
+
+
+def flush_plays():
+    return play_buffer.flush()
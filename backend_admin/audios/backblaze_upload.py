@@ -1,28 +1,51 @@
 import os
 import logging
-from b2sdk.v2 import *
+from collections import namedtuple
 from django.conf import settings
-from .config import B2_APPLICATION_KEY_ID, B2_APPLICATION_KEY, B2_BUCKET_NAME
+from django.utils.text import slugify
+from . import config
 
 logger = logging.getLogger(__name__)
 
+# One entry of a bucket listing; uploaded_at is in milliseconds since epoch
+B2File = namedtuple('B2File', ['name', 'file_id', 'size', 'uploaded_at'])
+
+def progress_listener(callback):
+    """b2sdk progress listener reporting to ``callback(bytes_done, total)``"""
+    from b2sdk.v2 import AbstractProgressListener
+
+    class CallbackProgressListener(AbstractProgressListener):
+        total = None
+
+        def set_total_bytes(self, total_byte_count):
+            self.total = total_byte_count
+            callback(0, total_byte_count)
+
+        def bytes_completed(self, byte_count):
+            # Cumulative; goes back down when b2sdk retries a part
+            callback(byte_count, self.total)
+
+    return CallbackProgressListener()
+
 class BackblazeB2Uploader:
     def __init__(self):
+        # b2sdk is slow to import; only load it when B2 is actually used
+        from b2sdk.v2 import B2Api, InMemoryAccountInfo
         self.info = InMemoryAccountInfo()
         self.b2_api = B2Api(self.info)
-        self.bucket_name = B2_BUCKET_NAME
+        self.bucket_name = config.B2_BUCKET_NAME
         
     def authenticate(self):
         """Authenticate with Backblaze B2"""
         try:
-            self.b2_api.authorize_account("production", B2_APPLICATION_KEY_ID, B2_APPLICATION_KEY)
+            self.b2_api.authorize_account("production", config.B2_APPLICATION_KEY_ID, config.B2_APPLICATION_KEY)
             logger.info("Successfully authenticated with Backblaze B2")
             return True
         except Exception as e:
             logger.error(f"Backblaze B2 authentication failed: {e}")
             return False
     
-    def upload_audio_file(self, file_path, file_name, content_type="audio/mpeg"):
+    def upload_audio_file(self, file_path, file_name, content_type="audio/mpeg", progress=None):
         """
         Upload audio file to Backblaze B2 bucket
         
@@ -30,6 +53,7 @@ class BackblazeB2Uploader:
             file_path: Local path to the audio file
             file_name: Name to save the file as in B2
             content_type: MIME type of the file
+            progress: Optional callable taking (bytes_done, total)
             
         Returns:
             dict: Upload result with URL and file info
@@ -46,7 +70,8 @@ class BackblazeB2Uploader:
             uploaded_file = bucket.upload_local_file(
                 local_file=file_path,
                 file_name=file_name,
-                content_type=content_type
+                content_type=content_type,
+                progress_listener=progress_listener(progress) if progress else None,
             )
             
             # Get download URL
@@ -100,6 +125,54 @@ class BackblazeB2Uploader:
             logger.error(f"Backblaze B2 delete failed: {e}")
             return False
     
+    def delete_file_version(self, file_id, file_name):
+        """
+        Delete a file version by ID, without looking it up first
+        
+        Args:
+            file_id: B2 file ID
+            file_name: Name of the file
+            
+        Returns:
+            bool: Success status
+        """
+        try:
+            self.b2_api.delete_file_version(file_id, file_name)
+            logger.info(f"Successfully deleted {file_name} from Backblaze B2")
+            return True
+        except Exception as e:
+            logger.error(f"Backblaze B2 delete of {file_name} failed: {e}")
+            return False
+    
+    def iter_files(self, page_size=1000, prefix=None):
+        """
+        Yield the latest version of every file in the bucket
+        
+        Pages through list_file_names, so only one page is held in memory.
+        Files come back sorted by name (UTF-8 byte order).
+        
+        Args:
+            page_size: Files requested per API call (B2 maximum is 10000)
+            prefix: Only list names starting with this
+            
+        Yields:
+            B2File
+        """
+        if not self.authenticate():
+            raise RuntimeError("Backblaze B2 authentication failed")
+        
+        bucket = self.b2_api.get_bucket_by_name(self.bucket_name)
+        start_file_name = None
+        while True:
+            page = self.b2_api.session.list_file_names(bucket.id_, start_file_name, page_size, prefix)
+            for item in page['files']:
+                # Skip hide markers and folder placeholders
+                if item['action'] == 'upload':
+                    yield B2File(item['fileName'], item['fileId'], item['contentLength'], item['uploadTimestamp'])
+            start_file_name = page.get('nextFileName')
+            if start_file_name is None:
+                return
+    
     def get_audio_url(self, file_name):
         """
         Get download URL for an audio file
@@ -125,7 +198,34 @@ class BackblazeB2Uploader:
             logger.error(f"Failed to get download URL: {e}")
             return None
 
+# Content types by file extension
+CONTENT_TYPE_MAP = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.ogg': 'audio/ogg'
+}
+
 # Helper functions for easy integration
+def build_b2_file_name(original_name, title, audio_id):
+    """
+    Build the B2 object name and content type for an upload
+    
+    Args:
+        original_name: Name of the uploaded file
+        title: Audio title for naming
+        audio_id: Audio ID for unique naming
+        
+    Returns:
+        tuple: (file_name, content_type)
+    """
+    # Create file name: title-slug_audio-id.ext
+    file_extension = os.path.splitext(original_name)[1]
+    file_name = f"{slugify(title) or 'audio'}_{audio_id}{file_extension}"
+    content_type = CONTENT_TYPE_MAP.get(file_extension.lower(), 'audio/mpeg')
+    return file_name, content_type
+
 def upload_audio_to_b2(audio_file, title, audio_id):
     """
     Upload audio file to Backblaze B2 with proper naming
@@ -139,20 +239,7 @@ def upload_audio_to_b2(audio_file, title, audio_id):
         dict: Upload result
     """
     uploader = BackblazeB2Uploader()
-    
-    # Create file name: title-slug_audio-id.ext
-    file_extension = os.path.splitext(audio_file.name)[1]
-    file_name = f"{title.replace(' ', '-').lower()}_{audio_id}{file_extension}"
-    
-    # Determine content type
-    content_type_map = {
-        '.mp3': 'audio/mpeg',
-        '.wav': 'audio/wav',
-        '.m4a': 'audio/mp4',
-        '.aac': 'audio/aac',
-        '.ogg': 'audio/ogg'
-    }
-    content_type = content_type_map.get(file_extension.lower(), 'audio/mpeg')
+    file_name, content_type = build_b2_file_name(audio_file.name, title, audio_id)
     
     # Save file temporarily
     temp_path = f"/tmp/{file_name}"
@@ -0,0 +1,46 @@
+"""
+Process-wide thread pool for fire-and-forget work.
+
+Used for slow calls to remote services that must not add to request
+latency, e.g. deleting a B2 object after its Audio row is gone. Work is
+best effort: a task that fails is logged, and anything still queued when
+the process exits is lost, so callers need a reconciliation path
+(``manage.py reconcile_b2`` for B2).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_WORKERS', 2),
+                    thread_name_prefix='audios-background',
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background task {func.__name__} failed")
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the background pool"""
+    return get_executor().submit(_run, func, args, kwargs)
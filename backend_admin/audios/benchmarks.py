@@ -0,0 +1,337 @@
+"""
+Offline microbenchmarks for per-request and per-row hot paths.
+
+Each benchmark is a factory that does its setup once and returns a
+zero-argument callable to be timed. Nothing here touches the database or
+the network, so results only move when the code under test changes.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from backend_admin.fieldsets import prune
+from backend_admin.throttling import ScopedTokenBucketThrottle
+from events.models import Events
+from .backblaze_upload import build_b2_file_name
+from .models import Audio, audio_file_path
+from .serializers import AudioListSerializer, AudioSerializer
+from .views import AdminAudioViewSet, PublicAudioViewSet
+
+User = get_user_model()
+
+BENCHMARKS = {}
+
+SERIALIZER_ROW_COUNTS = (10, 100, 1000)
+
+# ?fields= of a mobile title list
+SPARSE_FIELDS = ('id', 'title', 'duration_formatted')
+
+
+def benchmark(name):
+    """Register a benchmark factory under ``name``"""
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+    return decorator
+
+
+def _uploader():
+    return User(id=1, username='bench', first_name='Bench', last_name='User', email='bench@example.com')
+
+
+def _event(pk):
+    return Events(
+        id=pk,
+        title=f"Event {pk}",
+        start_date=date(2025, 7, 20),
+        end_date=date(2025, 9, 30),
+        published=True,
+    )
+
+
+def _audios(count, with_events=False):
+    uploader = _uploader()
+    events = [_event(pk) for pk in range(1, 4)]
+    audios = []
+    for pk in range(1, count + 1):
+        audio = Audio(
+            id=pk,
+            title=f"Sunday Service {pk}",
+            description='Sermon notes ' * 20,
+            audio_file=f"audios/sunday-service_{pk}.mp3",
+            b2_file_name=f"sunday-service_{pk}.mp3",
+            b2_download_url=f"https://f000.backblazeb2.com/file/bucket/sunday-service_{pk}.mp3",
+            duration=timedelta(seconds=3000 + pk),
+            file_size=40 * 1024 * 1024 + pk,
+            format='mp3',
+            artist='Pastor John',
+            uploaded_by=uploader,
+        )
+        if with_events:
+            # Mimic prefetch_related so the serializer never hits the DB
+            related = Events.objects.all()
+            related._result_cache = events
+            related._prefetch_done = True
+            audio._prefetched_objects_cache = {'related_events': related}
+        audios.append(audio)
+    return audios
+
+
+@benchmark('events.get_date_range_display')
+def bench_date_range_display():
+    events = [_event(pk) for pk in range(100)]
+
+    def run():
+        for event in events:
+            event.get_date_range_display()
+    return run
+
+
+@benchmark('audio.duration_formatted')
+def bench_duration_formatted():
+    audios = _audios(100)
+
+    def run():
+        for audio in audios:
+            audio.duration_formatted
+    return run
+
+
+@benchmark('audio.file_size_mb')
+def bench_file_size_mb():
+    audios = _audios(100)
+
+    def run():
+        for audio in audios:
+            audio.file_size_mb
+    return run
+
+
+def _serializer_benchmark(serializer_class, count, with_events):
+    def factory():
+        audios = _audios(count, with_events=with_events)
+
+        def run():
+            serializer_class(audios, many=True).data
+        return run
+    return factory
+
+
+def _sparse_serializer_benchmark(count):
+    def factory():
+        audios = _audios(count)
+
+        def run():
+            serializer = AudioListSerializer(audios, many=True)
+            prune(serializer, SPARSE_FIELDS)
+            serializer.data
+        return run
+    return factory
+
+
+for _count in SERIALIZER_ROW_COUNTS:
+    benchmark(f"AudioListSerializer[{_count}]")(_serializer_benchmark(AudioListSerializer, _count, False))
+    benchmark(f"AudioListSerializer[{_count}]?fields")(_sparse_serializer_benchmark(_count))
+    benchmark(f"AudioSerializer[{_count}]")(_serializer_benchmark(AudioSerializer, _count, True))
+
+
+@benchmark('audio_file_path')
+def bench_audio_file_path():
+    audio = Audio(id=42, title='Sunday Morning Service: Walking In Faith')
+
+    def run():
+        audio_file_path(audio, 'original upload.mp3')
+    return run
+
+
+@benchmark('build_b2_file_name')
+def bench_build_b2_file_name():
+    def run():
+        build_b2_file_name('Original Upload.M4A', 'Sunday Morning Service', 42)
+    return run
+
+
+def _viewset_query_benchmark(viewset_class, path, params, staff=False):
+    def factory():
+        request_factory = APIRequestFactory()
+
+        def run():
+            request = Request(request_factory.get(path, params))
+            if staff:
+                request.user = User(id=1, username='admin', is_staff=True)
+            view = viewset_class(request=request, format_kwarg=None, kwargs={}, action='list')
+            queryset = view.filter_queryset(view.get_queryset())
+            # Compile the SQL without executing it
+            str(queryset.query)
+        return run
+    return factory
+
+
+benchmark('PublicAudioViewSet.query')(_viewset_query_benchmark(
+    PublicAudioViewSet, '/api/public/audios/',
+    {'search': 'faith', 'genre': 'Sermon', 'ordering': 'title'},
+))
+benchmark('AdminAudioViewSet.query')(_viewset_query_benchmark(
+    AdminAudioViewSet, '/api/admin/audios/',
+    {'search': 'faith', 'published': 'true', 'ordering': '-created_at'}, staff=True,
+))
+benchmark('PublicAudioViewSet.query?fields')(_viewset_query_benchmark(
+    PublicAudioViewSet, '/api/public/audios/',
+    {'search': 'faith', 'genre': 'Sermon', 'ordering': 'title', 'fields': ','.join(SPARSE_FIELDS)},
+))
+
+
+def payload_sizes(count=100):
+    """Rendered JSON bytes of ``count`` list rows, in full and with ``SPARSE_FIELDS``"""
+    audios = _audios(count)
+    full = AudioListSerializer(audios, many=True)
+    sparse = AudioListSerializer(audios, many=True)
+    prune(sparse, SPARSE_FIELDS)
+    renderer = JSONRenderer()
+    return {
+        'rows': count,
+        'full_bytes': len(renderer.render(full.data)),
+        'sparse_bytes': len(renderer.render(sparse.data)),
+    }
+
+
+@benchmark('ScopedTokenBucketThrottle.allow_request')
+def bench_throttle_check():
+    """One bucket take in THROTTLE_CACHE (local memory unless configured), as an anonymous client"""
+    class Throttle(ScopedTokenBucketThrottle):
+        def get_rate(self, view):
+            return 'bench', '1000000000/s'
+
+    request = Request(APIRequestFactory().get('/api/public/audios/'))
+    request.user = AnonymousUser()
+    throttle = Throttle()
+
+    def run():
+        throttle.allow_request(request, None)
+    return run
+
+
+def measure(factory, min_time=0.2, repeat=5):
+    """
+    Time a benchmark and return the best seconds-per-call over ``repeat`` runs.
+
+    The number of calls per run is scaled up until one run takes at least
+    ``min_time`` seconds, like ``timeit.Timer.autorange``.
+    """
+    func = factory()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run_benchmarks(names=None, min_time=0.2, repeat=5):
+    """Run the selected benchmarks and return ``{name: microseconds_per_call}``"""
+    results = {}
+    for name, factory in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = round(measure(factory, min_time=min_time, repeat=repeat) * 1e6, 3)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+
+    Returns:
+        list: ``(name, baseline_us, current_us, change_pct)`` for every
+        benchmark slower than the baseline by more than ``threshold`` percent
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = (current - previous) / previous * 100
+        if change > threshold:
+            regressions.append((name, previous, current, round(change, 1)))
+    return regressions
+
+
+# Integrations that must only be imported on first use, never by django.setup()
+LAZY_MODULES = ('b2sdk', 'requests', 'mutagen', 'PIL', 'dotenv', 'numpy', 'scipy')
+
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss //= 1024
+print(json.dumps({
+    'setup_ms': elapsed * 1000,
+    'max_rss_kb': rss,
+    'loaded': [name for name in sys.argv[1:] if name in sys.modules],
+}))
+"""
+
+
+def measure_startup_once(modules=LAZY_MODULES):
+    """
+    Run ``django.setup()`` in a fresh interpreter, like a new worker.
+
+    Returns:
+        dict: ``setup_ms``, peak ``max_rss_kb`` and which of ``modules``
+        were imported
+    """
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'backend_admin.settings')
+    output = subprocess.run(
+        [sys.executable, '-c', STARTUP_SCRIPT, *modules],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_startup(runs=5):
+    """Median setup time and peak RSS over ``runs`` fresh processes"""
+    samples = [measure_startup_once() for _ in range(runs)]
+    return {
+        'runs': runs,
+        'setup_ms': round(statistics.median(sample['setup_ms'] for sample in samples), 1),
+        'max_rss_kb': statistics.median(sample['max_rss_kb'] for sample in samples),
+        'loaded': sorted({name for sample in samples for name in sample['loaded']}),
+    }
+
+
+def load_baseline(path):
+    with open(path) as fh:
+        return json.load(fh)['results']
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as fh:
+        json.dump({'unit': 'us_per_call', 'results': results}, fh, indent=2, sort_keys=True)
+        fh.write('\n')
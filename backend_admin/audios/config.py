@@ -1,27 +1,45 @@
 # Audio Upload Configuration
-# Load environment variables from .env file
+# Values from the .env file are read on first access, not at import
 import os
-from dotenv import dotenv_values
+from functools import lru_cache
 
-# Load environment variables from .env file
-config = dotenv_values()
-
-# ImgBB Configuration for cover images
-IMGBB_API_KEY = config.get('IMGBB_API_KEY', 'YOUR_IMGBB_API_KEY')
 IMGBB_URL = 'https://api.imgbb.com/1/upload'
-IMGBB_ALBUM_ID = config.get('IMGBB_ALBUM_ID', 'YOUR_IMGBB_ALBUM_ID')
-
-# Backblaze B2 Configuration for audio files
-B2_APPLICATION_KEY_ID = config.get('B2_APPLICATION_KEY_ID', 'YOUR_B2_APPLICATION_KEY_ID')
-B2_APPLICATION_KEY = config.get('B2_APPLICATION_KEY', 'YOUR_B2_APPLICATION_KEY')
-B2_BUCKET_NAME = config.get('B2_BUCKET_NAME', 'mcc-service-audios')
-
-# Audio file settings
-MAX_AUDIO_SIZE = int(config.get('MAX_AUDIO_SIZE', 100 * 1024 * 1024))  # 100MB default
-MAX_COVER_SIZE = int(config.get('MAX_COVER_SIZE', 5 * 1024 * 1024))    # 5MB default
 
 # Supported audio formats
 SUPPORTED_AUDIO_FORMATS = ['mp3', 'wav', 'm4a', 'aac', 'ogg']
 
 # Supported image formats
 SUPPORTED_IMAGE_FORMATS = ['jpg', 'jpeg', 'png', 'gif', 'webp']
+
+# Setting name -> default when missing from .env
+DEFAULTS = {
+    # ImgBB Configuration for cover images
+    'IMGBB_API_KEY': 'YOUR_IMGBB_API_KEY',
+    'IMGBB_ALBUM_ID': 'YOUR_IMGBB_ALBUM_ID',
+    # Backblaze B2 Configuration for audio files
+    'B2_APPLICATION_KEY_ID': 'YOUR_B2_APPLICATION_KEY_ID',
+    'B2_APPLICATION_KEY': 'YOUR_B2_APPLICATION_KEY',
+    'B2_BUCKET_NAME': 'mcc-service-audios',
+    # Audio file settings
+    'MAX_AUDIO_SIZE': 100 * 1024 * 1024,  # 100MB default
+    'MAX_COVER_SIZE': 5 * 1024 * 1024,    # 5MB default
+}
+
+INT_SETTINGS = ('MAX_AUDIO_SIZE', 'MAX_COVER_SIZE')
+
+
+@lru_cache(maxsize=None)
+def load_env():
+    """Parse the .env file once"""
+    from dotenv import dotenv_values
+    return dotenv_values()
+
+
+def __getattr__(name):
+    if name not in DEFAULTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = load_env().get(name, DEFAULTS[name])
+    if name in INT_SETTINGS:
+        value = int(value)
+    globals()[name] = value
+    return value
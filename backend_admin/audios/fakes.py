@@ -0,0 +1,51 @@
+"""
+Offline stand-ins for remote services.
+
+Used by the load test and the test suite so uploads can be exercised
+without network access or real credentials. Audio files go to the storage
+backend (in memory unless another one is passed); ImgBB is replaced by a
+fake ``http_post``.
+"""
+from contextlib import contextmanager
+from unittest import mock
+
+from django.test.utils import override_settings
+
+from .storage import get_storage
+
+
+class FakeImgBBResponse:
+    status_code = 200
+
+    def __init__(self, name):
+        self._name = name
+
+    def json(self):
+        return {
+            'success': True,
+            'data': {
+                'url': f"https://fake-imgbb.local/{self._name}.png",
+                'title': self._name,
+            },
+        }
+
+
+class FakeImgBB:
+    """Replacement for ``integrations.http_post`` against the ImgBB upload API"""
+
+    def __init__(self):
+        self.uploads = []
+
+    def post(self, url, files=None, data=None, **kwargs):
+        name = (data or {}).get('name', 'cover')
+        self.uploads.append(name)
+        return FakeImgBBResponse(name)
+
+
+@contextmanager
+def fake_remote_services(storage_backend='audios.storage.MemoryStorage', storage_options=None):
+    """Use a local storage backend and a fake ImgBB; yields ``(storage, imgbb)``"""
+    imgbb = FakeImgBB()
+    with override_settings(AUDIO_STORAGE_BACKEND=storage_backend, AUDIO_STORAGE_OPTIONS=storage_options or {}), \
+            mock.patch('audios.integrations.http_post', side_effect=imgbb.post):
+        yield get_storage(), imgbb
@@ -0,0 +1,71 @@
+"""
+Lazy facade over the heavy third-party integrations.
+
+requests and mutagen are imported on first use rather than when the app
+loads, so ``django.setup()`` in every worker, management command and test
+run does not pay for them. numpy and scipy are optional and only needed by
+the related audios job; brotli is only used by the static snapshots,
+which skip their .br copies without it. b2sdk is only loaded by
+``storage.B2Storage``, and Pillow is already imported lazily by the image
+fields. The rest of the app calls these functions (tests patch them here)
+instead of importing the libraries directly.
+"""
+
+
+def http_post(url, **kwargs):
+    """``requests.post``"""
+    import requests
+    return requests.post(url, **kwargs)
+
+
+def read_audio_file(path, extension):
+    """
+    Parse an audio file with mutagen
+
+    Args:
+        path: Local path to the audio file
+        extension: Lower-case file extension without the dot
+
+    Returns:
+        mutagen.FileType or None if the format is not recognised
+    """
+    import mutagen
+    if extension == 'mp3':
+        from mutagen.mp3 import MP3
+        return MP3(path)
+    if extension == 'wav':
+        from mutagen.wave import WAVE
+        return WAVE(path)
+    if extension == 'm4a':
+        from mutagen.mp4 import MP4
+        return MP4(path)
+    if extension == 'ogg':
+        from mutagen.oggvorbis import OggVorbis
+        return OggVorbis(path)
+    # Try generic mutagen
+    return mutagen.File(path)
+
+
+def brotli_compress(data):
+    """Brotli-compressed ``data``, or None when brotli is not installed"""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def sparse_math():
+    """
+    ``(numpy, scipy.sparse)`` for the related audios job
+
+    Raises:
+        ImproperlyConfigured: numpy or scipy is not installed
+    """
+    try:
+        import numpy
+        from scipy import sparse
+    except ImportError as e:
+        from django.core.exceptions import ImproperlyConfigured
+        raise ImproperlyConfigured(f"Related audios need numpy and scipy ({e}); pip install numpy scipy")
+    return numpy, sparse
@@ -0,0 +1,195 @@
+"""
+Live updates for dashboards: upload progress and catalogue changes.
+
+Any worker publishes events onto a small bus in the default cache: a
+sequence number (``live-events:seq``) plus one short-lived entry per event.
+The cache is the only thing workers share, so production sets
+``REDIS_URL``; with the local-memory cache events stay within one process,
+which is enough for ``runserver``.
+
+Dashboards read the bus through ``/api/admin/live/``, a server-sent events
+stream served by the ASGI application. Each ASGI process runs one
+``LiveBroadcaster`` that polls the bus every ``LIVE_POLL_INTERVAL``
+seconds while anyone is connected and copies new events into every
+connection's queue, so the cache sees one poller per process however many
+dashboards are open. A connection whose queue is full loses events rather
+than slowing the others down.
+
+Event types:
+
+- ``upload``: ``UploadProgress`` of one upload, sent only to its uploader
+- ``audios``: ``ids``, ``fields`` and ``deleted`` of an ``audios_changed``
+  batch, sent once the transaction commits to staff and to the uploaders
+  of those audios
+- ``events``: ``ids`` and ``deleted`` of saved or deleted events
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+SEQ_KEY = 'live-events:seq'
+EVENT_KEY = 'live-events:{}'
+PROGRESS_KEY = 'upload-progress:{}'
+UPLOAD_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def publish(kind, data, user_id=None, owners=None):
+    """
+    Put an event on the bus; ``user_id`` limits it to that user's streams,
+    ``owners`` (user ids) to staff and those users
+    """
+    cache.add(SEQ_KEY, 0, None)
+    seq = cache.incr(SEQ_KEY)
+    event = {'id': seq, 'type': kind, 'data': data, 'user_id': user_id,
+             'owners': None if owners is None else list(owners)}
+    cache.set(EVENT_KEY.format(seq), event, getattr(settings, 'LIVE_EVENT_TTL', 120))
+    return seq
+
+
+def current_seq():
+    return cache.get(SEQ_KEY, 0)
+
+
+def events_since(seq, skip_gap=False, limit=500):
+    """
+    Events published after ``seq``, oldest first
+
+    Stops at the first missing entry, which is usually an event whose
+    publisher has taken its sequence number but not stored it yet; with
+    ``skip_gap`` that entry is given up on.
+
+    Returns:
+        tuple: ``(events, new_seq, stalled)``
+    """
+    last = current_seq()
+    if last < seq:
+        # The cache was flushed and the sequence started over
+        return [], last, False
+    keys = [EVENT_KEY.format(n) for n in range(seq + 1, min(last, seq + limit) + 1)]
+    found = cache.get_many(keys)
+    events = []
+    for offset, key in enumerate(keys):
+        if key not in found:
+            if skip_gap and offset == 0:
+                seq += 1
+                continue
+            return events, seq, True
+        events.append(found[key])
+        seq += 1
+    return events, seq, False
+
+
+def visible_to(event, user_id, is_staff=False):
+    if event.get('user_id') is not None:
+        return event['user_id'] == user_id
+    owners = event.get('owners')
+    return owners is None or is_staff or user_id in owners
+
+
+def format_event(event):
+    """One server-sent events message"""
+    message = f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+    return f"id: {event['id']}\n{message}" if event.get('id') else message
+
+
+class UploadProgress:
+    """
+    Callable given to ``AudioStorage.put`` as ``progress(bytes_done, total)``
+
+    The latest state is kept under ``upload-progress:<id>`` and published
+    as an ``upload`` event at most every ``UPLOAD_PROGRESS_INTERVAL``
+    seconds. b2sdk may report from several upload threads at once.
+    """
+
+    def __init__(self, upload_id, user_id, total=None):
+        self.upload_id = upload_id
+        self.user_id = user_id
+        self.total = total
+        self.done = 0
+        self._reported = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, done, total=None):
+        with self._lock:
+            if total:
+                self.total = total
+            self.done = done
+            now = time.monotonic()
+            finished = self.total is not None and done >= self.total
+            if not finished and now - self._reported < getattr(settings, 'UPLOAD_PROGRESS_INTERVAL', 0.5):
+                return
+            self._reported = now
+        self.update('storing')
+
+    def update(self, state, **fields):
+        record = {'upload_id': self.upload_id, 'state': state, 'bytes': self.done, 'total': self.total, **fields}
+        cache.set(PROGRESS_KEY.format(self.upload_id), (self.user_id, record), 60 * 60)
+        publish('upload', record, user_id=self.user_id)
+
+    def finish(self, audio_id):
+        self.done = self.total or self.done
+        self.update('done', audio_id=audio_id)
+
+    def fail(self, error):
+        self.update('failed', error=error)
+
+
+def upload_progress(request, total=None):
+    """UploadProgress for the request's ``X-Upload-ID`` header, or None without one"""
+    upload_id = request.headers.get('X-Upload-ID', '') if request else ''
+    if not UPLOAD_ID.match(upload_id):
+        return None
+    return UploadProgress(upload_id, request.user.pk, total)
+
+
+def get_upload_progress(upload_id, user_id):
+    """Latest progress of ``upload_id`` if ``user_id`` uploaded it, else None"""
+    owner, record = cache.get(PROGRESS_KEY.format(upload_id), (None, None))
+    return record if owner is not None and owner == user_id else None
+
+
+class LiveBroadcaster:
+    """Per-process fan-out of bus events to the queues of connected streams"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self._task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=getattr(settings, 'LIVE_QUEUE_SIZE', 100))
+        self.subscribers.add(queue)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def deliver(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass
+
+    async def _run(self):
+        read = sync_to_async(events_since, thread_sensitive=False)
+        seq = await sync_to_async(current_seq, thread_sensitive=False)()
+        stalled = 0
+        while self.subscribers:
+            await asyncio.sleep(getattr(settings, 'LIVE_POLL_INTERVAL', 1.0))
+            # A gap that outlives a few polls belongs to a publisher that died
+            events, seq, gap = await read(seq, skip_gap=stalled >= 3)
+            stalled = stalled + 1 if gap and not events else 0
+            for event in events:
+                self.deliver(event)
+
+
+broadcaster = LiveBroadcaster()
@@ -0,0 +1,67 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from audios.benchmarks import BENCHMARKS, compare, load_baseline, payload_sizes, run_benchmarks, save_baseline
+
+
+class Command(BaseCommand):
+    help = 'Run offline microbenchmarks for hot-path functions and compare them with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Only run these benchmarks')
+        parser.add_argument(
+            '--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+            help='Baseline file to compare with or write to',
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument(
+            '--threshold', type=float, default=20.0,
+            help='Fail when a benchmark is slower than the baseline by more than this percentage',
+        )
+        parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per timing run')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--list', action='store_true', help='List available benchmarks')
+        parser.add_argument('--payload-sizes', action='store_true', help='Also report list payload sizes with ?fields=')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in BENCHMARKS:
+                self.stdout.write(name)
+            return
+
+        unknown = set(options['names']) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+        results = run_benchmarks(options['names'], min_time=options['min_time'], repeat=options['repeat'])
+        baseline = {}
+        if os.path.exists(options['baseline']) and not options['save_baseline']:
+            baseline = load_baseline(options['baseline'])
+
+        for name, current in results.items():
+            previous = baseline.get(name)
+            line = f"{name:<40} {current:>12.3f} us"
+            if previous:
+                line += f"   baseline {previous:>12.3f} us ({(current - previous) / previous * 100:+.1f}%)"
+            self.stdout.write(line)
+
+        if options['payload_sizes']:
+            sizes = payload_sizes()
+            self.stdout.write(
+                f"AudioListSerializer payload, {sizes['rows']} rows: {sizes['full_bytes']} bytes, "
+                f"{sizes['sparse_bytes']} bytes with ?fields= ({sizes['sparse_bytes'] / sizes['full_bytes']:.0%})"
+            )
+
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        regressions = compare(results, baseline, options['threshold'])
+        if regressions:
+            for name, previous, current, change in regressions:
+                self.stderr.write(f"REGRESSION {name}: {previous} us -> {current} us (+{change}%)")
+            raise CommandError(f"{len(regressions)} benchmark(s) regressed by more than {options['threshold']}%")
@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from audios.benchmarks import measure_startup
+
+
+class Command(BaseCommand):
+    help = 'Measure django.setup() time and peak RSS of a fresh worker process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes to measure')
+        parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+        parser.add_argument(
+            '--fail-on-eager', action='store_true',
+            help='Fail when a lazily loaded integration was imported during setup',
+        )
+
+    def handle(self, *args, **options):
+        result = measure_startup(options['runs'])
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.stdout.write(f"django.setup()   {result['setup_ms']:>8.1f} ms (median of {result['runs']})")
+            self.stdout.write(f"peak RSS         {result['max_rss_kb'] / 1024:>8.1f} MB")
+            self.stdout.write(f"eager imports    {', '.join(result['loaded']) or 'none'}")
+
+        if options['fail_on_eager'] and result['loaded']:
+            raise CommandError(f"Imported during setup: {', '.join(result['loaded'])}")
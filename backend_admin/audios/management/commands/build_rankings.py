@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from audios.rankings import build_rankings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the trending and popular audio lists from the hourly play rollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, help='Audios kept per list (default RANKING_TOP_K)')
+        parser.add_argument('--half-life-hours', type=float, help='Trending decay (default RANKING_HALF_LIFE_HOURS)')
+        parser.add_argument('--window-days', type=int, help='Trending look-back (default RANKING_WINDOW_DAYS)')
+
+    def handle(self, *args, **options):
+        written = build_rankings(
+            top_k_size=options['top_k'],
+            half_life_hours=options['half_life_hours'],
+            window_days=options['window_days'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {written['trending']} trending and {written['popular']} popular positions"
+        ))
@@ -0,0 +1,27 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from audios.recommendations import build_related
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the related audios lists from TF-IDF similarity of audio and event text'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only rank audios without neighbours yet and merge them into existing lists',
+        )
+        parser.add_argument('--top-k', type=int, help='Neighbours kept per audio (default RELATED_TOP_K)')
+        parser.add_argument('--block-size', type=int, help='Audios compared per block (default RELATED_BLOCK_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            written = build_related(
+                incremental=options['incremental'],
+                top_k=options['top_k'],
+                block_size=options['block_size'],
+            )
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Stored related audios for {written} audios"))
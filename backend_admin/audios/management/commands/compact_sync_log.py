@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from audios.sync import compact_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete delta sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Tombstones deleted per statement')
+
+    def handle(self, *args, **options):
+        deleted = compact_tombstones(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones"))
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from audios.fakes import fake_remote_services
+from audios.perf import run_load_test, seed_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Run the scripted load-test scenario mix and emit a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Total number of requests to issue')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--events', type=int, default=200)
+        parser.add_argument('--audios', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--storage', choices=['local', 'memory'], default='local',
+            help='Audio storage backend: files in a temporary directory, or in memory',
+        )
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument(
+            '--use-current-db', action='store_true',
+            help='Run against the configured database instead of a throwaway test database',
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = None
+        if not options['use_current_db']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root), \
+                    fake_remote_services(**self.storage_options(options['storage'], media_root)):
+                seeded = seed_catalogue(
+                    users=options['users'],
+                    events=options['events'],
+                    audios=options['audios'],
+                    seed=options['seed'],
+                )
+                report = run_load_test(total_requests=options['requests'], seed=options['seed'])
+                report['meta']['dataset'] = seeded
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report['meta']['storage'] = options['storage']
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def storage_options(self, storage, media_root):
+        if storage == 'memory':
+            return {'storage_backend': 'audios.storage.MemoryStorage'}
+        return {
+            'storage_backend': 'audios.storage.LocalStorage',
+            'storage_options': {'location': os.path.join(media_root, 'audios')},
+        }
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from audios.snapshots import publish_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Publish static JSON snapshots of the public audios and events (see audios.snapshots)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, help='Rows per page (default SNAPSHOT_PAGE_SIZE)')
+
+    def handle(self, *args, **options):
+        result = publish_snapshots(page_size=options['page_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {result['pages']} pages ({result['written']} new), deleted {result['deleted']} old files"
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from audios.storage import get_storage
+from audios.tiering import TieredStorage
+
+
+class Command(BaseCommand):
+    help = 'Demote hot audio files whose play count has decayed and enforce the hot tier capacity'
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        if not isinstance(storage, TieredStorage):
+            raise CommandError('AUDIO_STORAGE_BACKEND is not audios.tiering.TieredStorage')
+
+        report = storage.rebalance()
+        for name in report['demoted'] + report['evicted']:
+            if options['verbosity'] > 1:
+                self.stdout.write(f"removed hot copy of {name}")
+        megabytes = storage.hot_usage() / (1024 * 1024)
+        capacity = storage.capacity_bytes / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(
+            f"Demoted {len(report['demoted'])}, evicted {len(report['evicted'])}; "
+            f"hot tier holds {megabytes:.1f} of {capacity:.1f} MB"
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from audios.reconcile import reconcile
+from audios.storage import StorageError, get_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete stored audio files (Backblaze B2 or the configured backend) that no Audio row references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report orphans and reclaimable bytes')
+        parser.add_argument(
+            '--min-age-hours', type=float, default=24,
+            help='Leave files younger than this alone (uploads in progress)',
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Parallel delete threads')
+        parser.add_argument('--batch-size', type=int, default=100, help='Orphans per delete batch')
+        parser.add_argument('--page-size', type=int, default=1000, help='Files per list_file_names call')
+
+    def handle(self, *args, **options):
+        def on_orphan(b2_file):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"orphan {b2_file.name} ({b2_file.size} bytes)")
+
+        try:
+            report = reconcile(
+                get_storage(),
+                dry_run=options['dry_run'],
+                min_age_hours=options['min_age_hours'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                page_size=options['page_size'],
+                on_orphan=on_orphan,
+            )
+        except (RuntimeError, StorageError) as e:
+            raise CommandError(str(e))
+
+        megabytes = report['orphan_bytes'] / (1024 * 1024)
+        self.stdout.write(f"Scanned {report['scanned']} files, {report['orphans']} orphans ({megabytes:.1f} MB)")
+        if report['recent']:
+            self.stdout.write(f"Skipped {report['recent']} unreferenced files younger than {options['min_age_hours']}h")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run: {megabytes:.1f} MB would be reclaimed"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {report['deleted']} files"))
+        if report['failed']:
+            raise CommandError(f"{report['failed']} deletes failed")
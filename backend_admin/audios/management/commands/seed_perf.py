@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from audios.perf import clear_perf_data, seed_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, events and audios for performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--events', type=int, default=200)
+        parser.add_argument('--audios', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible data')
+        parser.add_argument('--max-links', type=int, default=3, help='Maximum related events per audio')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded data first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_perf_data()
+            self.stdout.write('Removed previous perf data')
+
+        created = seed_catalogue(
+            users=options['users'],
+            events=options['events'],
+            audios=options['audios'],
+            seed=options['seed'],
+            max_links=options['max_links'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Created {users} users, {events} events, {audios} audios and {links} event links'.format(**created)
+        ))
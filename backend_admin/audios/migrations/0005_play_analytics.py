@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audios', '0004_audio_b2_download_url_audio_b2_file_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayFlushBatch',
+            fields=[
+                ('batch_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('applied_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AudioPlayHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the hour, UTC')),
+                ('plays', models.PositiveIntegerField(default=0)),
+                ('listened_seconds', models.PositiveBigIntegerField(default=0)),
+                ('audio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_plays', to='audios.audio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='audios_play_hourly_hour')],
+                'constraints': [models.UniqueConstraint(fields=('audio', 'hour'), name='audios_play_hourly_audio_hour')],
+            },
+        ),
+    ]
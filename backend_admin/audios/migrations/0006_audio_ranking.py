@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audios', '0005_play_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('trending', 'Trending'), ('popular', 'Popular')], max_length=10)),
+                ('scope', models.CharField(choices=[('all', 'All audios'), ('genre', 'Genre'), ('event', 'Related event')], default='all', max_length=10)),
+                ('scope_key', models.CharField(blank=True, default='', help_text='Genre name or event ID', max_length=100)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('audio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='audios.audio')),
+            ],
+            options={
+                'ordering': ['kind', 'scope', 'scope_key', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'scope', 'scope_key', 'rank'), name='audios_ranking_position')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audios', '0006_audio_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField(help_text='Cosine similarity of the TF-IDF vectors')),
+                ('audio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='audios.audio')),
+                ('neighbour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='audios.audio')),
+            ],
+            options={
+                'ordering': ['audio', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('audio', 'rank'), name='audios_neighbour_position')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audios', '0007_audio_neighbour'),
+        ('events', '0006_admin_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audio',
+            index=models.Index(fields=['created_at'], name='audios_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audio',
+            index=models.Index(fields=['genre'], name='audios_genre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audio',
+            index=models.Index(fields=['year'], name='audios_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audio',
+            index=models.Index(fields=['format'], name='audios_format_idx'),
+        ),
+    ]
@@ -1,11 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 import os
-import requests
 import json
-from .config import IMGBB_API_KEY, IMGBB_URL, IMGBB_ALBUM_ID, B2_APPLICATION_KEY_ID, B2_APPLICATION_KEY, B2_BUCKET_NAME
-from .backblaze_upload import upload_audio_to_b2, delete_audio_from_b2
+from . import config, integrations
+from .backblaze_upload import build_b2_file_name
+from .storage import get_storage
 
 def audio_file_path(instance, filename):
     """Generate file path for uploaded audio files"""
@@ -15,6 +16,12 @@ def audio_file_path(instance, filename):
     filename = f"{slugify(instance.title)}_{instance.id}.{ext}"
     return os.path.join('audios', filename)
 
+class AudioQuerySet(models.QuerySet):
+    def published_public(self):
+        """Audios visible in the public API"""
+        return self.filter(is_public=True, published=True)
+
+
 class Audio(models.Model):
     AUDIO_FORMATS = [
         ('mp3', 'MP3'),
@@ -72,44 +79,71 @@ class Audio(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AudioQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Audio'
         verbose_name_plural = 'Audios'
+        # Default ordering and the admin's list filters
+        indexes = [
+            models.Index(fields=['created_at'], name='audios_created_idx'),
+            models.Index(fields=['genre'], name='audios_genre_idx'),
+            models.Index(fields=['year'], name='audios_year_idx'),
+            models.Index(fields=['format'], name='audios_format_idx'),
+            # Delta sync cursor (see audios.sync)
+            models.Index(fields=['updated_at', 'id'], name='audios_updated_idx'),
+        ]
     
     def __str__(self):
         return self.title
     
+    # Fields written by the upload helpers when called with commit=False.
+    # The b2_* fields hold the storage key, version ID and public URL of
+    # whichever storage backend is configured.
+    B2_UPLOAD_FIELDS = [
+        'b2_file_name', 'b2_file_id', 'b2_download_url', 'audio_file', 'duration', 'format', 'file_size',
+        'updated_at',
+    ]
+    COVER_UPLOAD_FIELDS = ['cover_image', 'cover_image_name', 'updated_at']
+    
     def save(self, *args, **kwargs):
-        # Auto-generate format from file extension
-        if self.audio_file and not self.format:
-            filename = self.audio_file.name
-            ext = filename.split('.')[-1].lower()
-            if ext in dict(self.AUDIO_FORMATS):
-                self.format = ext
-        
-        # Auto-calculate file size
-        if self.audio_file and not self.file_size:
-            try:
-                self.file_size = self.audio_file.size
-            except:
-                pass
+        # Derived fields are only filled on full saves; partial saves
+        # (update_fields) must not touch storage
+        if kwargs.get('update_fields') is None:
+            # Auto-generate format from file extension
+            if self.audio_file and not self.format:
+                filename = self.audio_file.name
+                ext = filename.split('.')[-1].lower()
+                if ext in dict(self.AUDIO_FORMATS):
+                    self.format = ext
+            
+            # Auto-calculate file size
+            if self.audio_file and not self.file_size:
+                try:
+                    self.file_size = self.audio_file.size
+                except:
+                    pass
         
         super().save(*args, **kwargs)
     
-    def upload_cover_to_imgbb(self, image_file):
-        """Upload cover image to ImgBB album and return URL"""
+    def upload_cover_to_imgbb(self, image_file, commit=True):
+        """Upload cover image to ImgBB album and return URL
+        
+        With commit=False the URL is only set on the instance; the caller
+        saves COVER_UPLOAD_FIELDS.
+        """
         try:
             # Prepare the image data
             files = {'image': image_file}
             data = {
-                'key': IMGBB_API_KEY,
+                'key': config.IMGBB_API_KEY,
                 'name': f"audio_cover_{slugify(self.title)}",
-                'album': IMGBB_ALBUM_ID  # Upload to specific album
+                'album': config.IMGBB_ALBUM_ID  # Upload to specific album
             }
             
             # Upload to ImgBB
-            response = requests.post(IMGBB_URL, files=files, data=data)
+            response = integrations.http_post(config.IMGBB_URL, files=files, data=data)
             
             if response.status_code == 200:
                 result = response.json()
@@ -117,7 +151,8 @@ class Audio(models.Model):
                     # Save the URL and filename
                     self.cover_image = result['data']['url']
                     self.cover_image_name = result['data']['title']
-                    self.save()
+                    if commit:
+                        self.save(update_fields=self.COVER_UPLOAD_FIELDS)
                     return True
             
             return False
@@ -125,65 +160,59 @@ class Audio(models.Model):
             print(f"Error uploading to ImgBB: {e}")
             return False
     
-    def upload_audio_to_backblaze(self, audio_file):
-        """Upload audio file to Backblaze B2 bucket"""
+    def store_audio_file(self, audio_file, commit=True, progress=None):
+        """Stream an uploaded audio file into the configured storage backend
+        
+        With commit=False the storage details are only set on the instance;
+        the caller saves B2_UPLOAD_FIELDS. ``progress`` is passed on to
+        ``AudioStorage.put``.
+        """
         try:
-            # Upload to Backblaze B2
-            result = upload_audio_to_b2(audio_file, self.title, self.id)
+            key, content_type = build_b2_file_name(audio_file.name, self.title, self.id)
+            stored = get_storage().put(key, audio_file.chunks(), content_type, progress=progress)
             
-            if result['success']:
-                # Save B2 information
-                self.b2_file_name = result['file_name']
-                self.b2_file_id = result['file_id']
-                self.b2_download_url = result['download_url']
-                
-                # Update audio_file field to point to B2 URL
-                self.audio_file = result['download_url']
-                
-                # Detect duration if not set
-                if not self.duration:
-                    self.detect_audio_duration(audio_file)
-                
-                self.save()
-                return True
-            else:
-                print(f"Backblaze B2 upload failed: {result['error']}")
-                return False
+            self.b2_file_name = stored.key
+            self.b2_file_id = stored.file_id
+            self.b2_download_url = stored.url
+            self.file_size = stored.size
+            
+            # audio_file keeps the public URL, or the storage key when the
+            # backend has no public URLs (served by the content endpoint)
+            self.audio_file = stored.url or stored.key
+            
+            ext = audio_file.name.split('.')[-1].lower()
+            if not self.format and ext in dict(self.AUDIO_FORMATS):
+                self.format = ext
+            
+            # Detect duration if not set
+            if not self.duration:
+                self.detect_audio_duration(audio_file)
+            
+            if commit:
+                self.save(update_fields=self.B2_UPLOAD_FIELDS)
+            return True
                 
         except Exception as e:
-            print(f"Error uploading to Backblaze B2: {e}")
+            print(f"Error storing audio file: {e}")
             return False
     
+    # Name kept for existing callers
+    upload_audio_to_backblaze = store_audio_file
+    
     def detect_audio_duration(self, audio_file):
         """Detect audio duration using mutagen library"""
         try:
-            import mutagen
-            from mutagen.mp3 import MP3
-            from mutagen.wave import WAVE
-            from mutagen.m4a import M4A
-            from mutagen.oggvorbis import OggVorbis
             from datetime import timedelta
             
             # Save file temporarily for duration detection
-            temp_path = f"/tmp/duration_check_{self.id}_{audio_file.name}"
+            temp_path = f"/tmp/duration_check_{self.id}_{os.path.basename(audio_file.name)}"
             with open(temp_path, 'wb+') as destination:
                 for chunk in audio_file.chunks():
                     destination.write(chunk)
             
             # Detect duration based on file format
             file_extension = audio_file.name.lower().split('.')[-1]
-            
-            if file_extension == 'mp3':
-                audio = MP3(temp_path)
-            elif file_extension == 'wav':
-                audio = WAVE(temp_path)
-            elif file_extension == 'm4a':
-                audio = M4A(temp_path)
-            elif file_extension == 'ogg':
-                audio = OggVorbis(temp_path)
-            else:
-                # Try generic mutagen
-                audio = mutagen.File(temp_path)
+            audio = integrations.read_audio_file(temp_path, file_extension)
             
             if audio and hasattr(audio, 'info') and hasattr(audio.info, 'length'):
                 duration_seconds = audio.info.length
@@ -199,23 +228,26 @@ class Audio(models.Model):
         except Exception as e:
             print(f"⚠️ Could not detect duration: {e}")
     
-    def delete_from_backblaze(self):
-        """Delete audio file from Backblaze B2 bucket"""
+    def delete_stored_file(self):
+        """Delete the audio file from the storage backend"""
         try:
             if self.b2_file_name:
-                success = delete_audio_from_b2(self.b2_file_name)
+                success = get_storage().delete(self.b2_file_name, self.b2_file_id)
                 if success:
-                    # Clear B2 fields
+                    # Clear storage fields
                     self.b2_file_name = None
                     self.b2_file_id = None
                     self.b2_download_url = None
-                    self.save()
+                    self.save(update_fields=['b2_file_name', 'b2_file_id', 'b2_download_url'])
                 return success
             return False
         except Exception as e:
-            print(f"Error deleting from Backblaze B2: {e}")
+            print(f"Error deleting stored audio file: {e}")
             return False
     
+    # Name kept for existing callers
+    delete_from_backblaze = delete_stored_file
+    
     @property
     def file_size_mb(self):
         """Return file size in MB"""
@@ -237,3 +269,89 @@ class Audio(models.Model):
             else:
                 return f"{minutes}:{seconds:02d}"
         return "Unknown"
+
+
+class AudioPlayHourly(models.Model):
+    """Plays and listened seconds of one audio in one hour (see audios.analytics)"""
+    audio = models.ForeignKey(Audio, on_delete=models.CASCADE, related_name='hourly_plays')
+    hour = models.DateTimeField(help_text="Start of the hour, UTC")
+    plays = models.PositiveIntegerField(default=0)
+    listened_seconds = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['audio', 'hour'], name='audios_play_hourly_audio_hour'),
+        ]
+        indexes = [models.Index(fields=['hour'], name='audios_play_hourly_hour')]
+
+    def __str__(self):
+        return f"{self.audio_id} @ {self.hour:%Y-%m-%d %H}:00"
+
+
+class PlayFlushBatch(models.Model):
+    """Play buffer batches already added to AudioPlayHourly; makes flush retries idempotent"""
+    batch_id = models.UUIDField(primary_key=True)
+    applied_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class AudioRanking(models.Model):
+    """Precomputed top-K lists, rebuilt by the build_rankings command (see audios.rankings)"""
+    TRENDING = 'trending'
+    POPULAR = 'popular'
+    KIND_CHOICES = [(TRENDING, 'Trending'), (POPULAR, 'Popular')]
+
+    ALL = 'all'
+    GENRE = 'genre'
+    EVENT = 'event'
+    SCOPE_CHOICES = [(ALL, 'All audios'), (GENRE, 'Genre'), (EVENT, 'Related event')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, default=ALL)
+    scope_key = models.CharField(max_length=100, blank=True, default='', help_text="Genre name or event ID")
+    rank = models.PositiveSmallIntegerField()
+    audio = models.ForeignKey(Audio, on_delete=models.CASCADE, related_name='rankings')
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['kind', 'scope', 'scope_key', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'scope', 'scope_key', 'rank'], name='audios_ranking_position'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.scope}:{self.scope_key} #{self.rank}"
+
+
+class AudioNeighbour(models.Model):
+    """Most similar audios of an audio by text, built by the build_related command (see audios.recommendations)"""
+    audio = models.ForeignKey(Audio, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(Audio, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(help_text="Cosine similarity of the TF-IDF vectors")
+
+    class Meta:
+        ordering = ['audio', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['audio', 'rank'], name='audios_neighbour_position'),
+        ]
+
+    def __str__(self):
+        return f"{self.audio_id} -> {self.neighbour_id} ({self.score:.2f})"
+
+
+class SyncTombstone(models.Model):
+    """A deleted Audio or Events row, kept for delta sync until compacted (see audios.sync)"""
+    AUDIO = 'audio'
+    EVENT = 'event'
+    KIND_CHOICES = [(AUDIO, 'Audio'), (EVENT, 'Event')]
+
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['deleted_at', 'id'], name='audios_tombstone_deleted_idx')]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,375 @@
+"""
+Synthetic data generation and load-test helpers.
+
+Everything here is deterministic for a given seed so reports produced by
+``manage.py loadtest`` can be diffed between releases.
+"""
+import math
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from events.models import Events, format_date_range
+from user.models import Role, UserProfile
+from .models import Audio
+from .signals import suppress_b2_deletes
+from .storage import get_storage
+
+User = get_user_model()
+
+PERF_USER_PREFIX = 'perf_user_'
+PERF_EVENT_AUTHOR = 'perf-seed'
+PERF_PASSWORD = 'perf-password'
+
+WORDS = [
+    'grace', 'faith', 'hope', 'love', 'light', 'glory', 'praise', 'word', 'spirit',
+    'kingdom', 'mercy', 'peace', 'power', 'healing', 'victory', 'harvest', 'revival',
+    'covenant', 'promise', 'worship', 'prayer', 'wisdom', 'joy', 'refuge', 'shepherd',
+]
+GENRES = ['Sermon', 'Worship', 'Gospel', 'Teaching', 'Testimony', 'Choir']
+ARTISTS = [f"Pastor {name}" for name in ('John', 'Grace', 'Peter', 'Ruth', 'Daniel', 'Esther', 'Paul', 'Mary')]
+LOCATIONS = ['Main Hall', 'Kampala Arena', 'Youth Centre', 'Online', 'Prayer Mountain']
+FORMATS = ['mp3', 'mp3', 'mp3', 'm4a', 'wav', 'ogg']
+ROLES = ['admin', 'editor', 'viewer']
+
+
+def _phrase(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).title()
+
+
+def clear_perf_data():
+    """Remove everything previously created by ``seed_catalogue``"""
+    # Audios cascade from their uploader; their B2 names are made up
+    with suppress_b2_deletes():
+        User.objects.filter(username__startswith=PERF_USER_PREFIX).delete()
+    Events.objects.filter(author=PERF_EVENT_AUTHOR).delete()
+
+
+def seed_catalogue(users=10, events=50, audios=200, seed=42, max_links=3, batch_size=1000):
+    """
+    Generate users, events and audios with realistic M2M links.
+
+    Event popularity follows a long tail so a handful of events (conferences,
+    crusades) own most of the linked audios, like the real catalogue.
+
+    Returns:
+        dict: Number of rows created per table
+    """
+    rng = random.Random(seed)
+    today = date.today()
+
+    with transaction.atomic():
+        roles = [Role.objects.get_or_create(name=name)[0] for name in ROLES]
+
+        # Hash once: PBKDF2 per user would dominate seeding time
+        password = make_password(PERF_PASSWORD)
+        user_objs = [
+            User(
+                username=f"{PERF_USER_PREFIX}{i}",
+                email=f"{PERF_USER_PREFIX}{i}@example.com",
+                first_name=rng.choice(WORDS).title(),
+                last_name=rng.choice(WORDS).title(),
+                password=password,
+                is_staff=i == 0,
+            )
+            for i in range(users)
+        ]
+        User.objects.bulk_create(user_objs, batch_size=batch_size)
+        user_ids = list(
+            User.objects.filter(username__startswith=PERF_USER_PREFIX)
+            .order_by('id').values_list('id', flat=True)
+        )
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=user_id, role=rng.choice(roles)) for user_id in user_ids],
+            batch_size=batch_size,
+        )
+
+        event_objs = []
+        for i in range(events):
+            start = today + timedelta(days=rng.randint(-730, 365))
+            end = start + timedelta(days=rng.choice([0, 0, 0, 1, 2, 6]))
+            title = f"{_phrase(rng, 2)} Conference {i}"
+            event_objs.append(Events(
+                title=title,
+                description=_phrase(rng, 20),
+                location=rng.choice(LOCATIONS),
+                start_date=start,
+                end_date=end,
+                # bulk_create skips Events.save()
+                date_display=format_date_range(start, end),
+                author=PERF_EVENT_AUTHOR,
+                slug=f"perf-event-{i}",
+                published=rng.random() < 0.8,
+            ))
+        Events.objects.bulk_create(event_objs, batch_size=batch_size)
+        event_ids = list(
+            Events.objects.filter(author=PERF_EVENT_AUTHOR).order_by('id').values_list('id', flat=True)
+        )
+
+        audio_objs = []
+        for i in range(audios):
+            fmt = rng.choice(FORMATS)
+            name = f"perf-audio_{i}.{fmt}"
+            audio_objs.append(Audio(
+                title=f"{_phrase(rng, 3)} {i}",
+                description=_phrase(rng, 40),
+                audio_file=f"audios/{name}",
+                b2_file_name=name,
+                b2_file_id=f"perf-{i}",
+                b2_download_url=f"https://fake-b2.local/file/test-bucket/{name}",
+                duration=timedelta(seconds=rng.randint(120, 5400)),
+                file_size=rng.randint(1, 90) * 1024 * 1024,
+                format=fmt,
+                artist=rng.choice(ARTISTS),
+                album=f"{_phrase(rng, 2)} Series",
+                genre=rng.choice(GENRES),
+                year=rng.randint(today.year - 5, today.year),
+                is_public=rng.random() < 0.9,
+                is_featured=rng.random() < 0.05,
+                published=rng.random() < 0.85,
+                uploaded_by_id=rng.choice(user_ids),
+            ))
+        Audio.objects.bulk_create(audio_objs, batch_size=batch_size)
+
+        links = []
+        if event_ids:
+            audio_ids = Audio.objects.filter(
+                uploaded_by_id__in=user_ids
+            ).order_by('id').values_list('id', flat=True)
+            weights = [1.0 / (rank + 1) for rank in range(len(event_ids))]
+            Through = Audio.related_events.through
+            for audio_id in audio_ids:
+                count = rng.randint(0, max_links)
+                chosen = set(rng.choices(event_ids, weights=weights, k=count))
+                links.extend(Through(audio_id=audio_id, events_id=event_id) for event_id in chosen)
+            Through.objects.bulk_create(links, batch_size=batch_size)
+
+    return {
+        'users': len(user_ids),
+        'events': len(event_ids),
+        'audios': len(audio_objs),
+        'links': len(links),
+    }
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an unsorted list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100.0 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, queries, errors, elapsed, transferred=0):
+    """Build the report block for one scenario"""
+    count = len(latencies)
+    block = {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p95': round(percentile(latencies, 95) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'mean': round(sum(latencies) / count * 1000, 3) if count else 0.0,
+            'max': round(max(latencies) * 1000, 3) if count else 0.0,
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / count, 2) if count else 0.0,
+            'max': max(queries) if queries else 0,
+        },
+    }
+    if transferred:
+        block['transfer_mb_per_s'] = round(transferred / (1024 * 1024) / elapsed, 2) if elapsed else 0.0
+    return block
+
+
+class LoadTestSession:
+    """A logged-in API client plus the ids the scenarios pick from"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.client = Client()
+        self.admin_client = Client()
+        self.usernames = list(
+            User.objects.filter(username__startswith=PERF_USER_PREFIX).values_list('username', flat=True)
+        )
+        self.public_audio_ids = list(
+            Audio.objects.filter(is_public=True, published=True).values_list('id', flat=True)
+        )
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        self.public_pages = max(1, min(5, math.ceil(len(self.public_audio_ids) / page_size)))
+        # Toggle only rows outside the public catalogue so streams keep resolving
+        self.admin_audio_ids = list(
+            Audio.objects.exclude(id__in=self.public_audio_ids).values_list('id', flat=True)[:500]
+        )
+        self.counter = 0
+        self.content_ids = self.store_content()
+        token = self.login(f"{PERF_USER_PREFIX}0").json()['access_token']
+        self.admin_client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+
+    def store_content(self):
+        """Put real bytes in storage for a few public audios so streams read them"""
+        storage = get_storage()
+        audios = Audio.objects.filter(id__in=self.public_audio_ids[:CONTENT_OBJECTS])
+        payload = bytes(range(256)) * (CONTENT_SIZE // 256)
+        for audio in audios:
+            storage.put(audio.b2_file_name, [payload[i:i + 65536] for i in range(0, CONTENT_SIZE, 65536)])
+        audios.update(file_size=CONTENT_SIZE)
+        return [audio.id for audio in audios]
+
+    def login(self, username=None):
+        username = username or self.rng.choice(self.usernames)
+        return self.client.post(
+            '/api/user/login/',
+            {'username': username, 'password': PERF_PASSWORD},
+            content_type='application/json',
+        )
+
+
+def scenario_login(session):
+    return session.login()
+
+
+def scenario_browse_audios(session):
+    page = session.rng.randint(1, session.public_pages)
+    return session.client.get('/api/public/audios/', {'page': page})
+
+
+def scenario_browse_events(session):
+    return session.client.get('/api/public/list/')
+
+
+def scenario_search(session):
+    return session.client.get('/api/public/audios/', {'search': session.rng.choice(WORDS)})
+
+
+def scenario_stream(session):
+    audio_id = session.rng.choice(session.public_audio_ids)
+    return session.client.get(f"/api/public/audios/{audio_id}/stream/")
+
+
+def scenario_content(session):
+    """Read audio bytes through the content endpoint, half of them as ranges"""
+    audio_id = session.rng.choice(session.content_ids)
+    headers = {}
+    if session.rng.random() < 0.5:
+        start = session.rng.randrange(0, CONTENT_SIZE - CONTENT_RANGE)
+        headers['HTTP_RANGE'] = f"bytes={start}-{start + CONTENT_RANGE - 1}"
+    response = session.client.get(f"/api/public/audios/{audio_id}/content/", **headers)
+    if response.streaming:
+        response.bytes_read = sum(len(chunk) for chunk in response.streaming_content)
+    return response
+
+
+def scenario_admin_list(session):
+    return session.admin_client.get('/api/admin/audios/', {'ordering': '-created_at'})
+
+
+def scenario_toggle(session):
+    audio_id = session.rng.choice(session.admin_audio_ids)
+    action = session.rng.choice(['toggle_featured', 'toggle_public', 'toggle_published'])
+    return session.admin_client.post(f"/api/admin/audios/{audio_id}/{action}/")
+
+
+def scenario_upload(session):
+    session.counter += 1
+    payload = {
+        'title': f"Load Test Upload {session.counter}",
+        'audio_file': SimpleUploadedFile('upload.mp3', b'\xff\xfb' * 2048, content_type='audio/mpeg'),
+        'cover_image_file': SimpleUploadedFile('cover.gif', TINY_GIF, content_type='image/gif'),
+        'published': 'true',
+    }
+    return session.admin_client.post('/api/admin/audios/', payload)
+
+
+# Objects written to storage for the content scenario
+CONTENT_OBJECTS = 20
+CONTENT_SIZE = 1024 * 1024
+CONTENT_RANGE = 256 * 1024
+
+# 1x1 transparent GIF, enough for ImageField validation
+TINY_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+# name -> (weight, callable)
+SCENARIOS = {
+    'login': (5, scenario_login),
+    'browse_audios': (30, scenario_browse_audios),
+    'browse_events': (10, scenario_browse_events),
+    'search': (15, scenario_search),
+    'stream': (15, scenario_stream),
+    'content': (5, scenario_content),
+    'admin_list': (10, scenario_admin_list),
+    'toggle': (5, scenario_toggle),
+    'upload': (5, scenario_upload),
+}
+
+
+def run_load_test(total_requests=500, seed=42, scenarios=None):
+    """
+    Run a weighted scenario mix against the current database.
+
+    The catalogue must already be seeded with ``seed_catalogue``. Requests are
+    issued in-process through the Django test client, so the numbers measure
+    the application stack (routing, auth, ORM, serialization) without network
+    noise.
+
+    Returns:
+        dict: JSON-serializable report
+    """
+    rng = random.Random(seed)
+    scenarios = scenarios or SCENARIOS
+    names = list(scenarios)
+    weights = [scenarios[name][0] for name in names]
+
+    session = LoadTestSession(rng)
+    latencies = defaultdict(list)
+    queries = defaultdict(list)
+    errors = defaultdict(int)
+    transferred = defaultdict(int)
+
+    started = time.perf_counter()
+    # Every request comes from one client, which throttling would cut off
+    with override_settings(THROTTLE_ENABLED=False):
+        for name in rng.choices(names, weights=weights, k=total_requests):
+            handler = scenarios[name][1]
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                response = handler(session)
+                latencies[name].append(time.perf_counter() - t0)
+            queries[name].append(len(ctx.captured_queries))
+            transferred[name] += getattr(response, 'bytes_read', 0)
+            if response.status_code >= 400:
+                errors[name] += 1
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'meta': {'seed': seed, 'requests': total_requests},
+        'overall': summarize(
+            [value for values in latencies.values() for value in values],
+            [value for values in queries.values() for value in values],
+            sum(errors.values()),
+            elapsed,
+        ),
+        'scenarios': {},
+    }
+    for name in names:
+        if latencies[name]:
+            busy = sum(latencies[name])
+            report['scenarios'][name] = summarize(
+                latencies[name], queries[name], errors[name], busy, transferred[name],
+            )
+    return report
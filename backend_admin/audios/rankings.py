@@ -0,0 +1,112 @@
+"""
+Trending and popular rankings.
+
+``build_rankings`` reads the hourly play rollup once and stores the top
+``RANKING_TOP_K`` published public audios of every list in
+``AudioRanking``:
+
+- trending: plays in the last ``RANKING_WINDOW_DAYS`` days, each weighted
+  by 0.5 ** (age / ``RANKING_HALF_LIFE_HOURS``)
+- popular: all-time plays
+
+for the whole catalogue, per genre and per related event. The public
+``trending`` and ``popular`` actions only read one list by its position
+index, so they cost the same however many audios or plays there are.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Audio, AudioPlayHourly, AudioRanking
+
+
+def ranking_settings():
+    return {
+        'top_k': getattr(settings, 'RANKING_TOP_K', 50),
+        'half_life_hours': getattr(settings, 'RANKING_HALF_LIFE_HOURS', 48),
+        'window_days': getattr(settings, 'RANKING_WINDOW_DAYS', 30),
+    }
+
+
+def trending_scores(now, half_life_hours, window_days):
+    """Time-decayed plays per audio ID"""
+    half_life = half_life_hours * 3600
+    scores = defaultdict(float)
+    rows = AudioPlayHourly.objects.filter(
+        hour__gte=now - timedelta(days=window_days), plays__gt=0,
+    ).values_list('audio_id', 'hour', 'plays')
+    for audio_id, hour, plays in rows.iterator(chunk_size=5000):
+        scores[audio_id] += plays * 0.5 ** (max((now - hour).total_seconds(), 0) / half_life)
+    return scores
+
+
+def popular_scores():
+    """All-time plays per audio ID"""
+    rows = AudioPlayHourly.objects.values('audio_id').annotate(total=Sum('plays')).filter(total__gt=0)
+    return {row['audio_id']: float(row['total']) for row in rows}
+
+
+def scope_members():
+    """{(scope, scope_key): [audio IDs]} for every published public audio"""
+    members = defaultdict(list)
+    visible = Audio.objects.published_public()
+    for audio_id, genre in visible.values_list('id', 'genre').iterator(chunk_size=5000):
+        members[(AudioRanking.ALL, '')].append(audio_id)
+        if genre:
+            members[(AudioRanking.GENRE, genre)].append(audio_id)
+    events = Audio.related_events.through.objects.filter(audio__in=visible).values_list('events_id', 'audio_id')
+    for event_id, audio_id in events.iterator(chunk_size=5000):
+        members[(AudioRanking.EVENT, str(event_id))].append(audio_id)
+    return members
+
+
+def top_k(scores, audio_ids, k):
+    # Ties go to the newer audio
+    ranked = ((scores[audio_id], audio_id) for audio_id in audio_ids if audio_id in scores)
+    return heapq.nlargest(k, ranked)
+
+
+def build_rankings(now=None, top_k_size=None, half_life_hours=None, window_days=None):
+    """Recompute every ranking list; returns the number of rows written per kind"""
+    options = ranking_settings()
+    now = now or timezone.now()
+    k = top_k_size or options['top_k']
+    scores = {
+        AudioRanking.TRENDING: trending_scores(
+            now, half_life_hours or options['half_life_hours'], window_days or options['window_days'],
+        ),
+        AudioRanking.POPULAR: popular_scores(),
+    }
+    members = scope_members()
+
+    rows = []
+    for kind, kind_scores in scores.items():
+        for (scope, scope_key), audio_ids in members.items():
+            for rank, (score, audio_id) in enumerate(top_k(kind_scores, audio_ids, k), start=1):
+                rows.append(AudioRanking(
+                    kind=kind, scope=scope, scope_key=scope_key, rank=rank,
+                    audio_id=audio_id, score=score, computed_at=now,
+                ))
+
+    # Readers see either the previous lists or the new ones
+    with transaction.atomic():
+        AudioRanking.objects.all().delete()
+        AudioRanking.objects.bulk_create(rows, batch_size=1000)
+    return {kind: sum(1 for row in rows if row.kind == kind) for kind in scores}
+
+
+def ranked_audios(kind, scope=AudioRanking.ALL, scope_key='', limit=None):
+    """Audios of one precomputed list, best first"""
+    rankings = AudioRanking.objects.filter(
+        kind=kind, scope=scope, scope_key=scope_key,
+        # Audios hidden since the last build drop out without a rebuild
+        audio__is_public=True, audio__published=True,
+    ).select_related('audio__uploaded_by').order_by('rank')
+    if limit:
+        rankings = rankings[:limit]
+    return [ranking.audio for ranking in rankings]
@@ -0,0 +1,174 @@
+"""
+Related audios.
+
+``build_related`` turns the text of every published public audio (title,
+description, artist, album, genre and the titles of its events) into a
+TF-IDF vector and stores each audio's ``RELATED_TOP_K`` nearest
+neighbours by cosine similarity in ``AudioNeighbour``. Similarities are
+computed for ``RELATED_BLOCK_SIZE`` audios at a time, so memory grows with
+block size times catalogue size rather than with the catalogue squared.
+
+With ``incremental=True`` only audios without neighbours yet (newly
+published) are ranked, and they are merged into the existing lists of the
+others. IDF weights are only refreshed by a full build, so run one now and
+then.
+
+numpy and scipy are optional dependencies, loaded through
+``integrations.sparse_math`` when the job runs.
+"""
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import integrations
+from .models import Audio, AudioNeighbour
+
+# Words of two or more letters, and numbers of three or more digits (years, verses)
+TOKEN = re.compile(r'[^\W\d_]{2,}|\d{3,}')
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from his in is it of on or our that the this to was we with you your'.split()
+)
+TEXT_FIELDS = ('title', 'description', 'artist', 'album', 'genre')
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.casefold()) if token not in STOP_WORDS]
+
+
+def audio_documents():
+    """IDs and token lists of every published public audio, by ID"""
+    visible = Audio.objects.published_public()
+    event_titles = defaultdict(list)
+    events = Audio.related_events.through.objects.filter(audio__in=visible).values_list('audio_id', 'events__title')
+    for audio_id, title in events.iterator(chunk_size=5000):
+        event_titles[audio_id].append(title)
+
+    ids, documents = [], []
+    for row in visible.order_by('pk').values_list('pk', *TEXT_FIELDS).iterator(chunk_size=2000):
+        ids.append(row[0])
+        documents.append(tokenize(' '.join(filter(None, row[1:] + tuple(event_titles[row[0]])))))
+    return ids, documents
+
+
+def tfidf_matrix(documents):
+    """CSR matrix with one L2-normalised row per document (sublinear TF, smoothed IDF)"""
+    numpy, sparse = integrations.sparse_math()
+    vocabulary = {}
+    indptr, indices, counts = [0], [], []
+    for tokens in documents:
+        for token, count in Counter(tokens).items():
+            indices.append(vocabulary.setdefault(token, len(vocabulary)))
+            counts.append(count)
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (numpy.array(counts, dtype=numpy.float64), indices, indptr),
+        shape=(len(documents), len(vocabulary)),
+    )
+    document_frequency = numpy.bincount(matrix.indices, minlength=len(vocabulary))
+    idf = numpy.log((1 + len(documents)) / (1 + document_frequency)) + 1
+    matrix.data = 1 + numpy.log(matrix.data)
+    matrix = sparse.csr_matrix(matrix.multiply(idf))
+    norms = numpy.sqrt(numpy.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def nearest(queries, query_ids, corpus, corpus_ids, k, block_size):
+    """
+    Yield ``(audio_id, [(score, neighbour_id), ...])`` with the ``k`` corpus
+    rows most similar to each query row, best first. An audio is never its
+    own neighbour and zero similarities are dropped.
+    """
+    numpy, sparse = integrations.sparse_math()
+    corpus_t = sparse.csc_matrix(corpus.T)
+    columns = numpy.array(corpus_ids)
+    position = {audio_id: column for column, audio_id in enumerate(corpus_ids)}
+
+    for start in range(0, queries.shape[0], block_size):
+        block = (queries[start:start + block_size] @ corpus_t).toarray()
+        for offset, scores in enumerate(block):
+            audio_id = query_ids[start + offset]
+            if audio_id in position:
+                scores[position[audio_id]] = 0
+            if len(scores) > k:
+                top = numpy.argpartition(-scores, k - 1)[:k]
+            else:
+                top = numpy.arange(len(scores))
+            top = top[numpy.argsort(-scores[top], kind='stable')]
+            yield audio_id, [(float(scores[column]), int(columns[column])) for column in top if scores[column] > 0]
+
+
+def store_neighbours(lists, replace_all=False):
+    rows = [
+        AudioNeighbour(audio_id=audio_id, neighbour_id=neighbour_id, rank=rank, score=score)
+        for audio_id, neighbours in lists.items()
+        for rank, (score, neighbour_id) in enumerate(neighbours, start=1)
+    ]
+    with transaction.atomic():
+        stale = AudioNeighbour.objects.all()
+        if not replace_all:
+            stale = stale.filter(audio_id__in=list(lists))
+        stale.delete()
+        AudioNeighbour.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def build_related(incremental=False, top_k=None, block_size=None):
+    """Recompute neighbour lists; returns the number of audios whose list was written"""
+    k = top_k or getattr(settings, 'RELATED_TOP_K', 10)
+    block_size = block_size or getattr(settings, 'RELATED_BLOCK_SIZE', 256)
+    ids, documents = audio_documents()
+    if not ids:
+        if not incremental:
+            AudioNeighbour.objects.all().delete()
+        return 0
+    matrix = tfidf_matrix(documents)
+
+    if not incremental:
+        lists = dict(nearest(matrix, ids, matrix, ids, k, block_size))
+        store_neighbours(lists, replace_all=True)
+        return len(lists)
+
+    ranked = set(AudioNeighbour.objects.values_list('audio_id', flat=True).distinct())
+    new_rows = [row for row, audio_id in enumerate(ids) if audio_id not in ranked]
+    old_rows = [row for row, audio_id in enumerate(ids) if audio_id in ranked]
+    if not new_rows:
+        return 0
+    new_ids = [ids[row] for row in new_rows]
+    lists = dict(nearest(matrix[new_rows], new_ids, matrix, ids, k, block_size))
+
+    # Existing audios only change where a new audio is among their closest
+    if old_rows:
+        old_ids = [ids[row] for row in old_rows]
+        candidates = {
+            audio_id: neighbours
+            for audio_id, neighbours in nearest(matrix[old_rows], old_ids, matrix[new_rows], new_ids, k, block_size)
+            if neighbours
+        }
+        current = defaultdict(list)
+        for audio_id, neighbour_id, score in AudioNeighbour.objects.filter(
+            audio_id__in=list(candidates),
+        ).order_by('audio_id', 'rank').values_list('audio_id', 'neighbour_id', 'score').iterator(chunk_size=5000):
+            current[audio_id].append((score, neighbour_id))
+        for audio_id, neighbours in candidates.items():
+            merged = sorted(current[audio_id] + neighbours, key=lambda item: -item[0])[:k]
+            if merged != current[audio_id]:
+                lists[audio_id] = merged
+
+    store_neighbours(lists)
+    return len(lists)
+
+
+def related_audios(audio_id, limit=None):
+    """Precomputed neighbours of a published public audio, most similar first"""
+    neighbours = AudioNeighbour.objects.filter(
+        audio_id=audio_id,
+        audio__is_public=True, audio__published=True,
+        neighbour__is_public=True, neighbour__published=True,
+    ).select_related('neighbour__uploaded_by').order_by('rank')
+    if limit:
+        neighbours = neighbours[:limit]
+    return [row.neighbour for row in neighbours]
@@ -0,0 +1,125 @@
+"""
+Find and delete stored objects that no Audio row references.
+
+The bucket listing and the database are both read in file name order and
+compared with a sorted merge, so memory use does not grow with the size
+of the bucket.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.db import connections
+from django.db.models.functions import Collate
+
+from .models import Audio
+
+
+def referenced_file_names(chunk_size=2000):
+    """
+    B2 file names referenced by Audio rows, sorted like the B2 listing
+
+    Reads keyset-paginated chunks rather than one cursor, since MySQL
+    drivers buffer a whole result set client side.
+    """
+    queryset = Audio.objects.exclude(b2_file_name__isnull=True).exclude(b2_file_name='')
+    order = 'b2_file_name'
+    if connections[queryset.db].vendor == 'mysql':
+        # B2 sorts by UTF-8 bytes; the default MySQL collation does not
+        queryset = queryset.annotate(b2_file_name_bin=Collate('b2_file_name', 'utf8mb4_bin'))
+        order = 'b2_file_name_bin'
+    queryset = queryset.order_by(order).values_list('b2_file_name', flat=True)
+
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(**{f"{order}__gt": last})
+        names = list(page[:chunk_size])
+        yield from names
+        if len(names) < chunk_size:
+            return
+        last = names[-1]
+
+
+def find_orphans(b2_files, file_names):
+    """
+    Sorted merge of a bucket listing against referenced file names
+
+    Args:
+        b2_files: B2File entries sorted by name
+        file_names: Referenced names, sorted the same way
+
+    Yields:
+        B2File entries whose name is not referenced
+    """
+    file_names = iter(file_names)
+    current = next(file_names, None)
+    for b2_file in b2_files:
+        while current is not None and current < b2_file.name:
+            current = next(file_names, None)
+        if current != b2_file.name:
+            yield b2_file
+
+
+def _delete_batch(storage, batch):
+    deleted = sum(1 for b2_file in batch if storage.delete(b2_file.name, b2_file.file_id))
+    return deleted, len(batch) - deleted
+
+
+def reconcile(storage, dry_run=True, min_age_hours=24, workers=4, batch_size=100, page_size=1000, on_orphan=None):
+    """
+    Compare the storage with the database and delete orphaned objects
+
+    Files uploaded less than ``min_age_hours`` ago are left alone, since an
+    upload is stored before its Audio row is updated.
+
+    Args:
+        storage: AudioStorage backend
+        dry_run: Only report what would be deleted
+        min_age_hours: Grace period for in-flight uploads
+        workers: Parallel delete threads
+        batch_size: Orphans handed to a thread at a time
+        page_size: Files per list_file_names call
+        on_orphan: Optional callback for every orphan found
+
+    Returns:
+        dict: Counts and the bytes reclaimed (or reclaimable when dry_run)
+    """
+    report = {'scanned': 0, 'orphans': 0, 'orphan_bytes': 0, 'recent': 0, 'deleted': 0, 'failed': 0}
+    cutoff = (time.time() - min_age_hours * 3600) * 1000
+
+    def scanned():
+        for b2_file in storage.iter_files(page_size=page_size):
+            report['scanned'] += 1
+            yield b2_file
+
+    def collect(done):
+        for future in done:
+            deleted, failed = future.result()
+            report['deleted'] += deleted
+            report['failed'] += failed
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        batch = []
+        for b2_file in find_orphans(scanned(), referenced_file_names()):
+            if b2_file.uploaded_at > cutoff:
+                report['recent'] += 1
+                continue
+            report['orphans'] += 1
+            report['orphan_bytes'] += b2_file.size
+            if on_orphan:
+                on_orphan(b2_file)
+            if dry_run:
+                continue
+            batch.append(b2_file)
+            if len(batch) >= batch_size:
+                pending.add(executor.submit(_delete_batch, storage, batch))
+                batch = []
+                # Bound the number of queued batches so memory stays flat
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+        if batch:
+            pending.add(executor.submit(_delete_batch, storage, batch))
+        collect(wait(pending).done)
+
+    return report
@@ -1,8 +1,36 @@
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
+from .live import upload_progress
 from .models import Audio
 from events.serializers import RegisterEventsSerializer
 from django.contrib.auth.models import User
 
+def audio_content_url(audio, request=None):
+    """URL of the content endpoint that streams the stored bytes"""
+    basename = 'public-audio' if audio.is_public and audio.published else 'admin-audio'
+    path = reverse(f"{basename}-content", args=[audio.pk])
+    return request.build_absolute_uri(path) if request else path
+
+def audio_file_url(audio, request=None):
+    """Public download URL if the storage has one, else the content endpoint"""
+    if audio.b2_download_url:
+        return audio.b2_download_url
+    if audio.b2_file_name:
+        return audio_content_url(audio, request)
+    if audio.audio_file:
+        # Rows stored before the storage backends existed
+        path = audio.audio_file.url
+        return request.build_absolute_uri(path) if request else path
+    return None
+
+# Columns read by computed fields, for ?fields= (see backend_admin.fieldsets)
+AUDIO_FIELD_COLUMNS = {
+    'audio_file': ('b2_download_url', 'b2_file_name', 'audio_file', 'is_public', 'published'),
+    'file_size_mb': ('file_size',),
+    'duration_formatted': ('duration',),
+}
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -13,15 +41,13 @@ class AudioSerializer(serializers.ModelSerializer):
     related_events = RegisterEventsSerializer(many=True, read_only=True)
     file_size_mb = serializers.ReadOnlyField()
     duration_formatted = serializers.ReadOnlyField()
+    FIELD_COLUMNS = AUDIO_FIELD_COLUMNS
     
     # Override audio_file to handle both FileField and URLField
     audio_file = serializers.SerializerMethodField()
     
     def get_audio_file(self, obj):
-        # Return B2 URL if available, otherwise return the file field
-        if obj.b2_download_url:
-            return obj.b2_download_url
-        return obj.audio_file.url if obj.audio_file else None
+        return audio_file_url(obj, self.context.get('request'))
     
     class Meta:
         model = Audio
@@ -47,31 +73,58 @@ class AudioCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Extract cover image file
         cover_image_file = validated_data.pop('cover_image_file', None)
+        related_events = validated_data.pop('related_events', None)
+        # The bytes go to the storage backend, never through the FileField
+        audio_file = validated_data.pop('audio_file', None)
         
         # Set the uploaded_by field to the current user
         validated_data['uploaded_by'] = self.context['request'].user
+        if audio_file:
+            # Known from the upload itself, no storage round trip needed
+            validated_data.setdefault('file_size', audio_file.size)
         
-        # Create the audio instance
-        audio = super().create(validated_data)
+        # Byte progress for the live stream when the client sent X-Upload-ID
+        progress = upload_progress(self.context['request'], audio_file.size) if audio_file else None
         
-        # Upload audio file to Backblaze B2
-        if audio.audio_file:
-            print(f"Uploading audio file '{audio.audio_file.name}' to Backblaze B2...")
-            success = audio.upload_audio_to_backblaze(audio.audio_file)
-            if success:
-                print(f"✅ Audio uploaded to B2 successfully!")
-            else:
-                print(f"❌ Audio upload to B2 failed!")
+        # INSERT for the id, then the uploads outside any transaction (they
+        # take as long as the network does), then one short UPDATE with every
+        # field they produced, updated_at included so delta sync sees the row
+        with transaction.atomic():
+            audio = Audio.objects.create(**validated_data)
+            if related_events:
+                audio.related_events.set(related_events)
+        update_fields = []
+        
+        # Stream the audio file into the storage backend
+        if audio_file:
+            print(f"Storing audio file '{audio_file.name}'...")
+            success = audio.store_audio_file(audio_file, commit=False, progress=progress)
+            if not success:
+                # Remove the row rather than keep an audio without a file
+                print(f"❌ Audio storage failed!")
+                audio.delete()
+                if progress:
+                    progress.fail('The audio file could not be stored.')
+                raise serializers.ValidationError({'audio_file': 'The audio file could not be stored.'})
+            update_fields += Audio.B2_UPLOAD_FIELDS
+            print(f"✅ Audio stored successfully!")
         
         # Upload cover image to ImgBB if provided
         if cover_image_file:
             print(f"Uploading cover image to ImgBB...")
-            success = audio.upload_cover_to_imgbb(cover_image_file)
+            success = audio.upload_cover_to_imgbb(cover_image_file, commit=False)
             if success:
+                update_fields += Audio.COVER_UPLOAD_FIELDS
                 print(f"✅ Cover image uploaded to ImgBB successfully!")
             else:
                 print(f"❌ Cover image upload to ImgBB failed!")
         
+        with transaction.atomic():
+            if update_fields:
+                audio.save(update_fields=update_fields)
+            if progress:
+                transaction.on_commit(lambda: progress.finish(audio.pk))
+        
         return audio
 
 class AudioUpdateSerializer(serializers.ModelSerializer):
@@ -88,28 +141,25 @@ class AudioUpdateSerializer(serializers.ModelSerializer):
         # Extract cover image file
         cover_image_file = validated_data.pop('cover_image_file', None)
         
-        # Update the instance
-        audio = super().update(instance, validated_data)
-        
-        # Upload new cover image to ImgBB if provided
+        # Upload new cover image to ImgBB first so the update below
+        # persists it in the same write
         if cover_image_file:
-            audio.upload_cover_to_imgbb(cover_image_file)
+            instance.upload_cover_to_imgbb(cover_image_file, commit=False)
         
-        return audio
+        # Update the instance
+        return super().update(instance, validated_data)
 
 class AudioListSerializer(serializers.ModelSerializer):
     uploaded_by = UserSerializer(read_only=True)
     file_size_mb = serializers.ReadOnlyField()
     duration_formatted = serializers.ReadOnlyField()
+    FIELD_COLUMNS = AUDIO_FIELD_COLUMNS
     
     # Override audio_file to handle both FileField and URLField
     audio_file = serializers.SerializerMethodField()
     
     def get_audio_file(self, obj):
-        # Return B2 URL if available, otherwise return the file field
-        if obj.b2_download_url:
-            return obj.b2_download_url
-        return obj.audio_file.url if obj.audio_file else None
+        return audio_file_url(obj, self.context.get('request'))
     
     class Meta:
         model = Audio
@@ -118,3 +168,25 @@ class AudioListSerializer(serializers.ModelSerializer):
             'b2_download_url', 'duration_formatted', 'file_size_mb', 'format', 'artist', 
             'is_public', 'is_featured', 'published', 'uploaded_by', 'created_at'
         ]
+
+class AudioBulkUpdateSerializer(serializers.Serializer):
+    """Validates a bulk status change: {"ids": [...], "changes": {"published": true}}"""
+    BULK_FIELDS = ['is_public', 'is_featured', 'published']
+
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=1000)
+    changes = serializers.DictField(child=serializers.BooleanField())
+
+    def validate_changes(self, value):
+        unknown = set(value) - set(self.BULK_FIELDS)
+        if unknown:
+            raise serializers.ValidationError(f"Unsupported fields: {', '.join(sorted(unknown))}")
+        if not value:
+            raise serializers.ValidationError("At least one change is required.")
+        return value
+
+class EventWithAudiosSerializer(RegisterEventsSerializer):
+    """Event plus its published public audios, read from a prefetch"""
+    audios = AudioListSerializer(source='public_audios', many=True, read_only=True)
+
+    class Meta(RegisterEventsSerializer.Meta):
+        fields = RegisterEventsSerializer.Meta.fields + ['audios']
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from backend_admin import singleflight
+from events.models import Events
+from . import background, live
+from .models import Audio, SyncTombstone
+from .storage import get_storage
+
+_b2_deletes_suppressed = ContextVar('b2_deletes_suppressed', default=False)
+
+# Sent once per bulk update by the views and admin actions that write with
+# QuerySet.update(), and once per row by audio_saved and audio_deleted
+# (including each row of a queryset delete), so receivers should defer
+# costly work to transaction.on_commit.
+# Arguments: ids (list of audio ids), fields (changed field names, or None
+# when unknown), deleted (True when the rows no longer exist), owners
+# (uploader ids of the rows, or None when the sender did not look them up)
+audios_changed = Signal()
+
+
+def send_audios_changed(ids, fields=None, deleted=False, owners=None):
+    audios_changed.send(sender=Audio, ids=list(ids), fields=fields, deleted=deleted, owners=owners)
+
+
+@receiver(post_save, sender=Audio)
+def audio_saved(sender, instance, update_fields=None, **kwargs):
+    send_audios_changed([instance.pk], fields=list(update_fields) if update_fields else None,
+                        owners=[instance.uploaded_by_id])
+
+
+def record_tombstones(kind, ids):
+    """Deletions for delta sync (see audios.sync)"""
+    SyncTombstone.objects.bulk_create(SyncTombstone(kind=kind, object_id=pk) for pk in ids)
+
+
+@receiver(audios_changed)
+def audios_deleted_for_sync(sender, ids, deleted=False, **kwargs):
+    if deleted:
+        record_tombstones(SyncTombstone.AUDIO, ids)
+
+
+@receiver(post_delete, sender=Events)
+def event_deleted(sender, instance, **kwargs):
+    record_tombstones(SyncTombstone.EVENT, [instance.pk])
+
+
+@receiver(audios_changed)
+def audios_changed_cache(sender, **kwargs):
+    # Cached featured, search and statistics responses (see backend_admin.singleflight)
+    transaction.on_commit(lambda: singleflight.expire('audios'))
+
+
+@receiver(audios_changed)
+def audios_changed_live(sender, ids, fields=None, deleted=False, owners=None, **kwargs):
+    data = {'ids': list(ids), 'fields': fields, 'deleted': deleted}
+
+    def publish():
+        # Only staff and the uploaders see the change; deleted rows whose
+        # uploaders are unknown go to staff alone
+        audience = owners
+        if audience is None:
+            audience = [] if deleted else Audio.objects.filter(pk__in=ids).values_list('uploaded_by_id', flat=True).distinct()
+        live.publish('audios', data, owners=audience)
+
+    transaction.on_commit(publish)
+
+
+@receiver(post_save, sender=Events)
+@receiver(post_delete, sender=Events)
+def events_changed_live(sender, instance, **kwargs):
+    data = {'ids': [instance.pk], 'deleted': 'created' not in kwargs}
+    transaction.on_commit(lambda: live.publish('events', data))
+
+
+def _publish_snapshots():
+    # Imported here: snapshots loads the serializers, which startup avoids
+    from .snapshots import request_publish
+    request_publish()
+
+
+def queue_snapshot_publish():
+    """Republish the static snapshots once the transaction commits, with SNAPSHOT_ON_CHANGE"""
+    if getattr(settings, 'SNAPSHOT_ON_CHANGE', False):
+        transaction.on_commit(lambda: background.submit(_publish_snapshots))
+
+
+@receiver(audios_changed)
+def audios_changed_snapshots(sender, **kwargs):
+    queue_snapshot_publish()
+
+
+@receiver(post_save, sender=Events)
+@receiver(post_delete, sender=Events)
+def events_changed_snapshots(sender, **kwargs):
+    queue_snapshot_publish()
+
+
+@contextmanager
+def suppress_b2_deletes():
+    """Delete Audio rows without removing their B2 objects, e.g. fixtures"""
+    token = _b2_deletes_suppressed.set(True)
+    try:
+        yield
+    finally:
+        _b2_deletes_suppressed.reset(token)
+
+
+def queue_storage_delete(key, file_id=None):
+    """Delete a stored audio file on the background pool once the transaction commits"""
+    transaction.on_commit(lambda: background.submit(get_storage().delete, key, file_id))
+
+
+@receiver(post_delete, sender=Audio)
+def audio_deleted(sender, instance, **kwargs):
+    send_audios_changed([instance.pk], deleted=True, owners=[instance.uploaded_by_id])
+    if instance.b2_file_name and not _b2_deletes_suppressed.get():
+        queue_storage_delete(instance.b2_file_name, instance.b2_file_id)
@@ -0,0 +1,163 @@
+"""
+Static JSON snapshots of the public catalogue.
+
+Most public reads are the same few pages: the latest and featured audios
+and the published events. ``publish_snapshots()`` renders those
+collections, plus every published public audio, in pages of
+``SNAPSHOT_PAGE_SIZE`` rows of the JSON the API returns, into the snapshot
+storage (any ``AudioStorage`` backend chosen with
+``SNAPSHOT_STORAGE_BACKEND``; ``MEDIA_ROOT/snapshots`` by default), for a
+web server or CDN to serve without the application.
+
+Pages are named after their content, ``<collection>-<page>.<hash>.json``,
+so they can be cached forever, and are stored next to ``.gz`` and, when
+brotli is installed, ``.br`` copies (nginx ``gzip_static`` and
+``brotli_static`` serve those as is). ``manifest.json`` names the current
+pages of each collection and is written only after every page it names,
+each file by itself atomically, so readers never see a half-written
+snapshot: they keep getting the previous manifest and its pages until the
+new manifest lands. Pages of the previous manifest are kept for readers
+that fetched it just before; older ones are deleted.
+
+Publishing runs from ``manage.py publish_snapshots`` (e.g. from cron) and,
+with ``SNAPSHOT_ON_CHANGE``, on the background pool after audios or events
+change (see audios.signals). ``request_publish`` lets one worker publish at
+a time; changes made meanwhile make it publish once more when done.
+"""
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+from events.models import Events
+from events.serializers import RegisterEventsSerializer
+from .integrations import brotli_compress
+from .models import Audio
+from .serializers import AudioListSerializer
+
+MANIFEST = 'manifest.json'
+PAGE_NAME = re.compile(r'^[a-z-]+-\d+\.[0-9a-f]{12}\.json(\.gz|\.br)?$')
+LOCK_KEY = 'snapshots:publishing'
+PENDING_KEY = 'snapshots:pending'
+
+
+@lru_cache(maxsize=None)
+def snapshot_storage():
+    """The configured snapshot backend; one instance per process"""
+    backend = import_string(getattr(settings, 'SNAPSHOT_STORAGE_BACKEND', 'audios.storage.LocalStorage'))
+    options = getattr(settings, 'SNAPSHOT_STORAGE_OPTIONS', None)
+    if options is None:
+        options = {'location': os.path.join(settings.MEDIA_ROOT, 'snapshots')}
+    return backend(**options)
+
+
+@receiver(setting_changed)
+def reset_snapshot_storage(setting, **kwargs):
+    if setting in ('SNAPSHOT_STORAGE_BACKEND', 'SNAPSHOT_STORAGE_OPTIONS', 'MEDIA_ROOT'):
+        snapshot_storage.cache_clear()
+
+
+def collections():
+    """Name -> (queryset, serializer class, row limit or None)"""
+    audios = Audio.objects.published_public().select_related('uploaded_by').order_by('-created_at', '-pk')
+    return {
+        'audios': (audios, AudioListSerializer, None),
+        'audios-latest': (audios, AudioListSerializer, 10),
+        'audios-featured': (audios.filter(is_featured=True), AudioListSerializer, None),
+        'events': (Events.objects.filter(published=True).order_by('start_date', 'pk'), RegisterEventsSerializer, None),
+    }
+
+
+def store(storage, name, content):
+    """Store ``content`` under ``name`` after its precompressed copies"""
+    storage.put(f"{name}.gz", [gzip.compress(content, 9, mtime=0)], 'application/gzip')
+    compressed = brotli_compress(content)
+    if compressed is not None:
+        storage.put(f"{name}.br", [compressed], 'application/x-brotli')
+    # Last, so a page that exists has its copies too
+    storage.put(name, [content], 'application/json')
+
+
+def read_manifest(storage):
+    try:
+        return json.loads(b''.join(storage.get(MANIFEST)))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def manifest_files(manifest):
+    names = set()
+    for collection in (manifest or {}).get('collections', {}).values():
+        for page in collection['pages']:
+            names.update((page, f"{page}.gz", f"{page}.br"))
+    return names
+
+
+def publish_snapshots(storage=None, page_size=None):
+    """
+    Render every collection and publish a new manifest
+
+    Returns:
+        dict: ``pages`` in the manifest, ``written`` new pages, ``deleted`` files
+    """
+    storage = storage or snapshot_storage()
+    page_size = page_size or getattr(settings, 'SNAPSHOT_PAGE_SIZE', 100)
+    existing = {b2_file.name for b2_file in storage.iter_files()}
+    previous = read_manifest(storage) if MANIFEST in existing else None
+    renderer = JSONRenderer()
+
+    manifest = {'generated_at': timezone.now().isoformat(), 'page_size': page_size, 'collections': {}}
+    written = 0
+    for name, (queryset, serializer_class, limit) in collections().items():
+        rows = queryset[:limit] if limit else queryset
+        count = rows.count()
+        pages = max(math.ceil(count / page_size), 1)
+        names = []
+        for number in range(1, pages + 1):
+            results = rows[(number - 1) * page_size:number * page_size]
+            content = renderer.render({
+                'count': count,
+                'page': number,
+                'pages': pages,
+                'results': serializer_class(results, many=True, context={}).data,
+            })
+            page = f"{name}-{number}.{hashlib.sha256(content).hexdigest()[:12]}.json"
+            if page not in existing:
+                store(storage, page, content)
+                written += 1
+            names.append(page)
+        manifest['collections'][name] = {'count': count, 'pages': names}
+
+    store(storage, MANIFEST, renderer.render(manifest))
+
+    keep = manifest_files(manifest) | manifest_files(previous)
+    deleted = 0
+    for name in existing - keep:
+        if PAGE_NAME.match(name) and storage.delete(name):
+            deleted += 1
+    pages = sum(len(collection['pages']) for collection in manifest['collections'].values())
+    return {'pages': pages, 'written': written, 'deleted': deleted}
+
+
+def request_publish():
+    """Publish unless another worker is publishing; that one then publishes again"""
+    cache.set(PENDING_KEY, True, None)
+    if not cache.add(LOCK_KEY, True, getattr(settings, 'SNAPSHOT_LOCK_SECONDS', 300)):
+        return
+    try:
+        while cache.get(PENDING_KEY):
+            cache.delete(PENDING_KEY)
+            publish_snapshots()
+    finally:
+        cache.delete(LOCK_KEY)
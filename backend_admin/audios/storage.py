@@ -0,0 +1,289 @@
+"""
+Audio file storage.
+
+Every read and write of audio bytes goes through an ``AudioStorage``
+backend, chosen with ``settings.AUDIO_STORAGE_BACKEND`` and built with
+``settings.AUDIO_STORAGE_OPTIONS``:
+
+- ``B2Storage``: Backblaze B2, for production
+- ``LocalStorage``: a directory on disk, for development and load tests
+- ``MemoryStorage``: a dict, for tests
+- ``tiering.TieredStorage``: hot local copies in front of any of the above
+
+Keys are flat object names such as ``sunday-service_42.mp3`` (see
+``build_b2_file_name``). Reads are streamed in ``CHUNK_SIZE`` pieces and
+ranges are inclusive, like HTTP ``Range`` headers.
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .backblaze_upload import B2File
+
+CHUNK_SIZE = 64 * 1024
+
+# Result of put(); url is a public download URL when the backend has one
+StoredObject = namedtuple('StoredObject', ['key', 'file_id', 'size', 'url'])
+
+
+class StorageError(Exception):
+    """A backend operation failed"""
+
+
+class AudioStorage:
+    """Interface every storage backend implements"""
+
+    def put(self, key, chunks, content_type='application/octet-stream', progress=None):
+        """
+        Store an iterable of byte chunks under ``key`` and return a StoredObject
+
+        ``progress(bytes_done, total)`` is called as bytes are stored, with
+        ``total`` None while the size is not known yet.
+        """
+        raise NotImplementedError
+
+    def get_range(self, key, start=0, end=None):
+        """Yield the bytes of ``key`` from ``start`` to ``end`` (inclusive, None for EOF)"""
+        raise NotImplementedError
+
+    def get(self, key):
+        """Yield all bytes of ``key``"""
+        return self.get_range(key)
+
+    def size(self, key):
+        """Size of ``key`` in bytes; raises FileNotFoundError when missing"""
+        raise NotImplementedError
+
+    def delete(self, key, file_id=None):
+        """Delete ``key``, by version ID when known. Returns success"""
+        raise NotImplementedError
+
+    def presign(self, key, expires=3600):
+        """Time-limited URL clients can download ``key`` from, or None"""
+        return None
+
+    def iter_files(self, page_size=1000):
+        """Yield a B2File for every stored object, sorted by name"""
+        raise NotImplementedError
+
+    def record_access(self, key):
+        """Hook called once per play; tiered backends use it to track heat"""
+
+    def is_hot(self, key):
+        """Whether ``key`` is served by this app rather than by a download URL"""
+        return False
+
+
+def _write_chunks(fh, chunks, progress=None):
+    size = 0
+    for chunk in chunks:
+        fh.write(chunk)
+        size += len(chunk)
+        if progress:
+            progress(size)
+    return size
+
+
+class LocalStorage(AudioStorage):
+    """Files in one directory, ``MEDIA_ROOT/audios`` by default"""
+
+    def __init__(self, location=None):
+        self.location = location or os.path.join(settings.MEDIA_ROOT, 'audios')
+
+    def path(self, key):
+        if os.path.basename(key) != key or key.startswith('.'):
+            raise StorageError(f"Invalid key {key!r}")
+        return os.path.join(self.location, key)
+
+    def put(self, key, chunks, content_type='application/octet-stream', progress=None):
+        path = self.path(key)
+        os.makedirs(self.location, exist_ok=True)
+        # Write next to the target and rename, so readers never see half a file
+        fd, temp_path = tempfile.mkstemp(dir=self.location, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                size = _write_chunks(fh, chunks, progress)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return StoredObject(key, None, size, None)
+
+    def get_range(self, key, start=0, end=None):
+        with open(self.path(key), 'rb') as fh:
+            fh.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = fh.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def size(self, key):
+        return os.path.getsize(self.path(key))
+
+    def touch(self, key):
+        """Mark ``key`` as just used; mtime is the LRU clock of the hot tier"""
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, key, file_id=None):
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_files(self, page_size=1000):
+        try:
+            entries = sorted(os.scandir(self.location), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                yield B2File(entry.name, None, stat.st_size, int(stat.st_mtime * 1000))
+
+
+class MemoryStorage(AudioStorage):
+    """Objects kept in a dict; ``files`` maps key -> B2File plus its bytes"""
+
+    def __init__(self):
+        self.files = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def put(self, key, chunks, content_type='application/octet-stream', progress=None):
+        buffer = io.BytesIO()
+        _write_chunks(buffer, chunks, progress)
+        data = buffer.getvalue()
+        with self._lock:
+            self._next_id += 1
+            file_id = f"mem-{self._next_id}"
+            self.files[key] = (B2File(key, file_id, len(data), int(time.time() * 1000)), data)
+        return StoredObject(key, file_id, len(data), None)
+
+    def _data(self, key):
+        try:
+            return self.files[key][1]
+        except KeyError:
+            raise FileNotFoundError(key)
+
+    def get_range(self, key, start=0, end=None):
+        data = self._data(key)
+        stop = len(data) if end is None else min(end + 1, len(data))
+        for offset in range(start, stop, CHUNK_SIZE):
+            yield data[offset:min(offset + CHUNK_SIZE, stop)]
+
+    def size(self, key):
+        return len(self._data(key))
+
+    def delete(self, key, file_id=None):
+        with self._lock:
+            stored = self.files.get(key)
+            if stored is None or (file_id and stored[0].file_id != file_id):
+                return False
+            del self.files[key]
+            return True
+
+    def iter_files(self, page_size=1000):
+        with self._lock:
+            listing = sorted(self.files)
+        for key in listing:
+            stored = self.files.get(key)
+            if stored:
+                yield stored[0]
+
+
+class B2Storage(AudioStorage):
+    """Backblaze B2 bucket from the audios config; b2sdk loads on first use"""
+
+    def __init__(self):
+        self._uploader = None
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    @property
+    def uploader(self):
+        if self._uploader is None:
+            from .backblaze_upload import BackblazeB2Uploader
+            self._uploader = BackblazeB2Uploader()
+        return self._uploader
+
+    @property
+    def bucket(self):
+        """Authorized bucket, shared by every request of this process"""
+        with self._lock:
+            if self._bucket is None:
+                if not self.uploader.authenticate():
+                    raise StorageError("Backblaze B2 authentication failed")
+                self._bucket = self.uploader.b2_api.get_bucket_by_name(self.uploader.bucket_name)
+            return self._bucket
+
+    def put(self, key, chunks, content_type='application/octet-stream', progress=None):
+        # b2sdk uploads large files in parts from a seekable local file;
+        # progress counts bytes sent to B2, not the copy to disk
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(key)[1]) as fh:
+            _write_chunks(fh, chunks)
+            fh.flush()
+            result = self.uploader.upload_audio_file(fh.name, key, content_type, progress=progress)
+        if not result['success']:
+            raise StorageError(result['error'])
+        return StoredObject(key, result['file_id'], result['content_length'], result['download_url'])
+
+    def get_range(self, key, start=0, end=None):
+        if end is None and start:
+            end = self.size(key) - 1
+        range_ = (start, end) if end is not None else None
+        downloaded = self.bucket.download_file_by_name(key, range_=range_)
+        try:
+            yield from downloaded.response.iter_content(CHUNK_SIZE)
+        finally:
+            downloaded.response.close()
+
+    def size(self, key):
+        from b2sdk.v2.exception import FileNotPresent
+        try:
+            return self.bucket.get_file_info_by_name(key).size
+        except FileNotPresent:
+            raise FileNotFoundError(key)
+
+    def delete(self, key, file_id=None):
+        if file_id:
+            return self.uploader.authenticate() and self.uploader.delete_file_version(file_id, key)
+        return self.uploader.delete_audio_file(key)
+
+    def presign(self, key, expires=3600):
+        token = self.bucket.get_download_authorization(key, expires)
+        url = self.uploader.b2_api.get_download_url_for_file_name(self.uploader.bucket_name, key)
+        return f"{url}?Authorization={token}"
+
+    def iter_files(self, page_size=1000):
+        return self.uploader.iter_files(page_size=page_size)
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    """The configured backend; one instance per process"""
+    backend = import_string(getattr(settings, 'AUDIO_STORAGE_BACKEND', 'audios.storage.B2Storage'))
+    return backend(**getattr(settings, 'AUDIO_STORAGE_OPTIONS', {}))
+
+
+@receiver(setting_changed)
+def reset_storage(setting, **kwargs):
+    if setting in ('AUDIO_STORAGE_BACKEND', 'AUDIO_STORAGE_OPTIONS', 'MEDIA_ROOT'):
+        get_storage.cache_clear()
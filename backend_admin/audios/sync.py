@@ -0,0 +1,154 @@
+"""
+Delta sync of the public catalogue for offline clients.
+
+``GET /api/public/sync/`` without ``since`` pages through every published
+public audio and published event. Each response carries ``next``, an
+opaque token to send back as ``?since=``; from then on only changes are
+returned: rows created or updated (``updated``), and the IDs of rows that
+were deleted, unpublished or made private (``removed``). ``has_more``
+means the client should ask again straight away.
+
+Changed rows are read in ``(updated_at, id)`` order through the
+``audios_updated_idx`` and ``events_updated_idx`` indexes, so a sync costs
+what changed rather than the catalogue size. Deletions leave a
+``SyncTombstone`` (written by signals, see audios.signals) that is read
+the same way by ``(deleted_at, id)``.
+
+A row saved by a transaction that commits late carries an ``updated_at``
+older than rows that are already visible, so each response only covers
+changes up to ``SYNC_SETTLE_SECONDS`` ago and the next token resumes from
+there. Reads go to the primary: replica lag would break that assumption.
+
+``manage.py compact_sync_log`` deletes tombstones older than
+``SYNC_TOMBSTONE_RETENTION_DAYS``; a token older than that is refused and
+the client starts over with a full sync.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from events.models import Events
+from events.serializers import RegisterEventsSerializer
+from .models import Audio, SyncTombstone
+from .serializers import AudioListSerializer
+
+TOKEN_SALT = 'audios.sync'
+
+# Response key, token key, queryset, lookups of rows the public API shows, serializer
+STREAMS = (
+    ('audios', 'a', lambda: Audio.objects.select_related('uploaded_by'), {'is_public': True, 'published': True},
+     AudioListSerializer),
+    ('events', 'e', Events.objects.all, {'published': True}, RegisterEventsSerializer),
+)
+
+
+class SyncTokenError(ValueError):
+    """The ``since`` token is malformed or was not issued by this server"""
+
+
+class SyncTokenExpired(SyncTokenError):
+    """The ``since`` token is older than the tombstones still kept"""
+
+
+def retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def make_token(cursors):
+    return signing.dumps(cursors, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    """Cursors in ``token``: ``{'a': ..., 'e': ..., 't': ...}`` of ``[timestamp, id or None]``"""
+    try:
+        cursors = signing.loads(token, salt=TOKEN_SALT)
+        for key in ('a', 'e', 't'):
+            moment, _ = cursors[key]
+            datetime.fromisoformat(moment)
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise SyncTokenError(token)
+    oldest = min(datetime.fromisoformat(cursors[key][0]) for key in ('a', 'e', 't'))
+    if oldest < timezone.now() - retention():
+        raise SyncTokenExpired(token)
+    return cursors
+
+
+def after(cursor, field):
+    """Q for rows past ``cursor`` in ``(field, id)`` order"""
+    if cursor is None:
+        return Q()
+    moment, pk = datetime.fromisoformat(cursor[0]), cursor[1]
+    if pk is None:
+        return Q(**{f"{field}__gt": moment})
+    return Q(**{f"{field}__gt": moment}) | Q(**{field: moment, 'pk__gt': pk})
+
+
+def read_changes(queryset, field, cursor, horizon, limit):
+    """
+    Up to ``limit`` rows of ``queryset`` changed after ``cursor`` and no
+    later than ``horizon``
+
+    Returns:
+        tuple: ``(rows, next_cursor, has_more)``
+    """
+    rows = list(queryset.filter(after(cursor, field), **{f"{field}__lte": horizon}).order_by(field, 'pk')[:limit + 1])
+    if len(rows) <= limit:
+        if cursor is not None and datetime.fromisoformat(cursor[0]) >= horizon:
+            # Never move back, e.g. when SYNC_SETTLE_SECONDS was raised
+            return rows, cursor, False
+        return rows, [horizon.isoformat(), None], False
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, [getattr(last, field).isoformat(), last.pk], True
+
+
+def sync_changes(since=None, context=None, now=None):
+    """The sync response for token ``since`` (None for a full sync)"""
+    now = now or timezone.now()
+    horizon = now - timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 5))
+    limit = getattr(settings, 'SYNC_PAGE_SIZE', 500)
+    if since:
+        cursors = read_token(since)
+    else:
+        # A new client has nothing to remove: skip hidden rows and older tombstones
+        cursors = {'a': None, 'e': None, 't': [horizon.isoformat(), None]}
+
+    data, next_cursors, has_more = {}, {}, False
+    for name, key, queryset, visible, serializer_class in STREAMS:
+        queryset = queryset()
+        if cursors[key] is None:
+            queryset = queryset.filter(**visible)
+        rows, next_cursors[key], more = read_changes(queryset, 'updated_at', cursors[key], horizon, limit)
+        has_more |= more
+        shown, removed = [], []
+        for row in rows:
+            if all(getattr(row, field) == value for field, value in visible.items()):
+                shown.append(row)
+            else:
+                removed.append(row.pk)
+        data[name] = {
+            'updated': serializer_class(shown, many=True, context=context).data,
+            'removed': removed,
+        }
+
+    tombstones, next_cursors['t'], more = read_changes(SyncTombstone.objects.all(), 'deleted_at', cursors['t'], horizon, limit)
+    has_more |= more
+    for tombstone in tombstones:
+        name = 'audios' if tombstone.kind == SyncTombstone.AUDIO else 'events'
+        data[name]['removed'].append(tombstone.object_id)
+
+    return {**data, 'next': make_token(next_cursors), 'has_more': has_more}
+
+
+def compact_tombstones(now=None, batch_size=5000):
+    """Delete tombstones past the retention period in batches; returns how many were deleted"""
+    cutoff = (now or timezone.now()) - retention()
+    deleted = 0
+    while True:
+        ids = list(SyncTombstone.objects.filter(deleted_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += SyncTombstone.objects.filter(pk__in=ids).delete()[0]
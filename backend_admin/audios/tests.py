@@ -1,3 +1,1277 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from backend_admin import batch, db_router, singleflight
+from backend_admin.exports import iter_rows
+from backend_admin.db_router import PIN_COOKIE
+from backend_admin.paginators import EstimatedCountPaginator, estimated_row_count
+from events.models import Events
+from .admin import AudioAdmin
+from .backblaze_upload import B2File, progress_listener
+from . import live
+from .views import live_stream
+from .analytics import apply_batch, flush_plays, hour_of, play_buffer, record_play
+from .models import Audio, AudioNeighbour, AudioPlayHourly, AudioRanking, SyncTombstone
+from .rankings import build_rankings
+from .recommendations import build_related, tokenize
+from .benchmarks import BENCHMARKS, compare, measure, measure_startup_once
+from .perf import PERF_USER_PREFIX, TINY_GIF, clear_perf_data, percentile, run_load_test, seed_catalogue
+from .fakes import fake_remote_services
+from .reconcile import find_orphans, reconcile, referenced_file_names
+from .signals import audios_changed, send_audios_changed
+from .snapshots import MANIFEST, publish_snapshots
+from .sync import compact_tombstones, make_token
+from .storage import LocalStorage, MemoryStorage
+from .tiering import TieredStorage
+
+User = get_user_model()
+
+
+def make_audio(uploader, title='Sermon', **kwargs):
+    kwargs.setdefault('file_size', 1024)
+    return Audio.objects.create(title=title, audio_file=f"audios/{title}.mp3", uploaded_by=uploader, **kwargs)
+
+
+class SeedPerfTests(TestCase):
+    def test_seed_creates_linked_catalogue(self):
+        created = seed_catalogue(users=3, events=5, audios=20, seed=1)
+
+        self.assertEqual(created['users'], 3)
+        self.assertEqual(User.objects.filter(username__startswith=PERF_USER_PREFIX).count(), 3)
+        self.assertEqual(Events.objects.count(), 5)
+        self.assertEqual(Audio.objects.count(), 20)
+        self.assertEqual(Audio.related_events.through.objects.count(), created['links'])
+        self.assertGreater(created['links'], 0)
+
+    def test_seed_is_reproducible(self):
+        seed_catalogue(users=2, events=3, audios=10, seed=7)
+        first = list(Audio.objects.order_by('id').values_list('title', 'genre', 'published'))
+        clear_perf_data()
+        self.assertFalse(Audio.objects.exists())
+
+        seed_catalogue(users=2, events=3, audios=10, seed=7)
+        second = list(Audio.objects.order_by('id').values_list('title', 'genre', 'published'))
+        self.assertEqual(first, second)
+
+
+class LoadTestTests(TestCase):
+    def test_percentile_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_report_covers_every_scenario(self):
+        seed_catalogue(users=2, events=3, audios=15, seed=3)
+        with self.settings(MEDIA_ROOT=self._media_root()), fake_remote_services():
+            report = run_load_test(total_requests=60, seed=3)
+
+        self.assertEqual(report['overall']['requests'], 60)
+        self.assertEqual(report['overall']['errors'], 0, report['scenarios'])
+        for block in report['scenarios'].values():
+            self.assertIn('p99', block['latency_ms'])
+            self.assertGreaterEqual(block['queries_per_request']['mean'], 0)
+
+    def _media_root(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return directory.name
+
+
+class BenchmarkTests(TestCase):
+    def test_compare_flags_only_regressions_over_threshold(self):
+        baseline = {'fast': 10.0, 'slow': 10.0, 'new': None}
+        results = {'fast': 11.0, 'slow': 13.0, 'new': 5.0, 'unknown': 1.0}
+
+        self.assertEqual(compare(results, baseline, threshold=20), [('slow', 10.0, 13.0, 30.0)])
+
+    def test_benchmarks_run_offline(self):
+        with self.assertNumQueries(0):
+            for name in ('events.get_date_range_display', 'AudioSerializer[10]', 'PublicAudioViewSet.query'):
+                self.assertGreater(measure(BENCHMARKS[name], min_time=0.001, repeat=1), 0)
+
+    def test_setup_does_not_import_heavy_integrations(self):
+        result = measure_startup_once()
+        self.assertEqual(result['loaded'], [])
+        self.assertGreater(result['setup_ms'], 0)
+
+
+class AudioStatusUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        cls.editor = User.objects.create_user('editor', password='secret')
+        cls.own = make_audio(cls.editor, 'own')
+        cls.other = make_audio(cls.staff, 'other')
+
+    def setUp(self):
+        self.batches = []
+        handler = lambda sender, **kwargs: self.batches.append(kwargs['ids'])
+        audios_changed.connect(handler, weak=False)
+        self.addCleanup(audios_changed.disconnect, handler)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_toggle_is_a_conditional_update(self):
+        client = self.client_for(self.editor)
+        # SAVEPOINT, conditional UPDATE, read back, RELEASE; no SELECT-then-save
+        with self.assertNumQueries(4):
+            response = client.post(f"/api/admin/audios/{self.own.pk}/toggle_featured/")
+        self.assertEqual(response.data['is_featured'], True)
+        self.assertEqual(client.post(f"/api/admin/audios/{self.own.pk}/toggle_featured/").data['is_featured'], False)
+        self.assertEqual(self.batches, [[self.own.pk], [self.own.pk]])
+
+    def test_toggle_is_scoped_to_permitted_rows(self):
+        response = self.client_for(self.editor).post(f"/api/admin/audios/{self.other.pk}/toggle_published/")
+        self.assertEqual(response.status_code, 404)
+        self.other.refresh_from_db()
+        self.assertFalse(self.other.published)
+
+    def test_bulk_update_uses_one_update_and_one_signal(self):
+        extra = make_audio(self.editor, 'extra')
+        self.batches.clear()
+        response = self.client_for(self.editor).post(
+            '/api/admin/audios/bulk_update/',
+            {'ids': [self.own.pk, extra.pk, self.other.pk], 'changes': {'published': True, 'is_featured': True}},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertCountEqual(
+            Audio.objects.filter(published=True, is_featured=True).values_list('id', flat=True),
+            [self.own.pk, extra.pk],
+        )
+        self.assertEqual(len(self.batches), 1)
+        self.assertCountEqual(self.batches[0], [self.own.pk, extra.pk])
+
+    def test_admin_action_selects_and_updates_in_one_transaction(self):
+        audio_admin = AudioAdmin(Audio, admin.site)
+        with CaptureQueriesContext(connection) as ctx:
+            updated = audio_admin.update_status(Audio.objects.filter(title='own'), published=True)
+
+        self.assertEqual(updated, 1)
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries]
+        self.assertEqual(statements, ['SAVEPOINT', 'SELECT', 'UPDATE', 'RELEASE'])
+        self.assertEqual(self.batches, [[self.own.pk]])
+
+    def test_bulk_update_rejects_unknown_fields(self):
+        response = self.client_for(self.staff).post(
+            '/api/admin/audios/bulk_update/', {'ids': [self.own.pk], 'changes': {'title': 'x'}}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class AudioUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('uploader', password='secret'))
+
+    def upload(self, title='Sunday Service'):
+        payload = {
+            'title': title,
+            'audio_file': SimpleUploadedFile('service.mp3', b'\xff\xfb' * 1024, content_type='audio/mpeg'),
+            'cover_image_file': SimpleUploadedFile('cover.gif', TINY_GIF, content_type='image/gif'),
+        }
+        with fake_remote_services() as (storage, imgbb), CaptureQueriesContext(connection) as ctx:
+            put = storage.put
+            depth = len(connection.atomic_blocks)
+
+            def put_outside_transaction(*args, **kwargs):
+                self.assertEqual(len(connection.atomic_blocks), depth)
+                return put(*args, **kwargs)
+
+            with mock.patch.object(storage, 'put', side_effect=put_outside_transaction):
+                response = self.client.post('/api/admin/audios/', payload)
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        return response, writes, storage
+
+    def test_create_writes_audio_row_at_most_twice(self):
+        response, writes, storage = self.upload()
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertLessEqual(len(writes), 2, writes)
+        # The final UPDATE moves updated_at past the upload, for delta sync
+        self.assertIn('"updated_at"', writes[-1])
+        audio = Audio.objects.get()
+        self.assertEqual(audio.file_size, 2048)
+        self.assertEqual(audio.format, 'mp3')
+        self.assertIn(audio.b2_file_name, storage.files)
+        self.assertFalse(audio.audio_file.storage.exists('audios/service.mp3'))
+        self.assertTrue(audio.cover_image.startswith('https://fake-imgbb.local/'))
+
+    def test_title_is_slugified_into_the_storage_key(self):
+        response, _, storage = self.upload('Faith / Hope')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        audio = Audio.objects.get()
+        self.assertEqual(audio.b2_file_name, f"faith-hope_{audio.pk}.mp3")
+        self.assertIn(audio.b2_file_name, storage.files)
+
+    def test_update_with_cover_writes_once(self):
+        audio = make_audio(User.objects.get(username='uploader'), 'old')
+        with fake_remote_services(), CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(f"/api/admin/audios/{audio.pk}/", {
+                'title': 'new',
+                'cover_image_file': SimpleUploadedFile('cover.gif', TINY_GIF, content_type='image/gif'),
+            })
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class ReadReplicaRoutingTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        # The test databases do not replicate, so each one gets its own row
+        cls.editor = User.objects.create_user('editor', password='secret')
+        make_audio(cls.editor, 'on-primary', published=True, is_public=True)
+        replica_user = User.objects.using('replica').create(username='editor')
+        Audio.objects.using('replica').create(
+            title='on-replica', audio_file='audios/on-replica.mp3', file_size=1,
+            uploaded_by=replica_user, published=True, is_public=True,
+        )
+
+    def titles(self, client):
+        return [row['title'] for row in client.get('/api/public/audios/').data['results']]
+
+    def test_public_reads_use_replica(self):
+        self.assertEqual(self.titles(APIClient()), ['on-replica'])
+
+    def test_admin_reads_use_primary(self):
+        client = APIClient()
+        client.force_authenticate(self.editor)
+        response = client.get('/api/admin/audios/')
+        self.assertEqual([row['title'] for row in response.data['results']], ['on-primary'])
+
+    def test_writer_is_pinned_to_primary(self):
+        client = APIClient()
+        client.force_authenticate(self.editor)
+        audio = Audio.objects.get(title='on-primary')
+        response = client.post(f"/api/admin/audios/{audio.pk}/toggle_featured/")
+
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.titles(client), ['on-primary'])
+        self.assertEqual(self.titles(APIClient()), ['on-replica'])
+
+    @override_settings(DATABASE_REPLICA_ALIAS='')
+    def test_routing_disabled_without_alias(self):
+        self.assertEqual(self.titles(APIClient()), ['on-primary'])
+
+
+class B2ReconcileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.uploader = User.objects.create_user('uploader', password='secret')
+        for name in ('b.mp3', 'd.mp3', 'd.mp3', 'f.mp3'):
+            make_audio(cls.uploader, name, b2_file_name=name)
+        make_audio(cls.uploader, 'not-uploaded')
+
+    def test_find_orphans_is_a_sorted_merge(self):
+        listing = [B2File(name, name, 1, 0) for name in ('a', 'b', 'c', 'd', 'e', 'g')]
+        orphans = find_orphans(listing, iter(['b', 'd', 'd', 'f']))
+        self.assertEqual([b2_file.name for b2_file in orphans], ['a', 'c', 'e', 'g'])
+
+    def test_referenced_names_are_paged_in_order(self):
+        self.assertEqual(list(referenced_file_names(chunk_size=2)), ['b.mp3', 'd.mp3', 'f.mp3'])
+
+    def stock(self, storage):
+        for name, size, age_hours in (('a.mp3', 10, 48), ('b.mp3', 20, 48), ('c.mp3', 30, 48),
+                                      ('d.mp3', 40, 48), ('partial.mp3', 50, 1)):
+            uploaded_at = int((time.time() - age_hours * 3600) * 1000)
+            storage.files[name] = (B2File(name, f"id-{name}", size, uploaded_at), b'x' * size)
+
+    def test_dry_run_reports_reclaimable_bytes(self):
+        with fake_remote_services() as (storage, _):
+            self.stock(storage)
+            report = reconcile(storage, dry_run=True)
+        self.assertEqual((report['scanned'], report['orphans'], report['orphan_bytes']), (5, 2, 40))
+        self.assertEqual(report['recent'], 1)
+        self.assertEqual(len(storage.files), 5)
+
+    def test_deletes_orphans_in_parallel_batches(self):
+        with fake_remote_services() as (storage, _):
+            self.stock(storage)
+            report = reconcile(storage, dry_run=False, workers=2, batch_size=1)
+        self.assertEqual((report['deleted'], report['failed']), (2, 0))
+        self.assertEqual(sorted(storage.files), ['b.mp3', 'd.mp3', 'partial.mp3'])
+
+    def test_deleting_audio_queues_b2_delete_after_commit(self):
+        audio = make_audio(self.uploader, 'gone', b2_file_name='gone.mp3', b2_file_id='id-gone')
+        with fake_remote_services() as (storage, _), mock.patch('audios.background.submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                audio.delete()
+                submit.assert_not_called()
+        submit.assert_called_once_with(storage.delete, 'gone.mp3', 'id-gone')
+
+
+class StorageBackendTests(TestCase):
+    def backends(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        return [LocalStorage(location.name), MemoryStorage()]
+
+    def test_put_get_range_delete(self):
+        data = bytes(range(256)) * 1024
+        for storage in self.backends():
+            with self.subTest(storage=type(storage).__name__):
+                stored = storage.put('b.mp3', (data[i:i + 1000] for i in range(0, len(data), 1000)))
+                storage.put('a.mp3', [b'x'])
+                self.assertEqual(stored.size, len(data))
+                self.assertEqual(b''.join(storage.get('b.mp3')), data)
+                self.assertEqual(b''.join(storage.get_range('b.mp3', 100, 70000)), data[100:70001])
+                self.assertEqual(storage.size('b.mp3'), len(data))
+                self.assertEqual([b2_file.name for b2_file in storage.iter_files()], ['a.mp3', 'b.mp3'])
+
+                self.assertTrue(storage.delete('b.mp3'))
+                self.assertFalse(storage.delete('b.mp3'))
+                with self.assertRaises(FileNotFoundError):
+                    storage.size('b.mp3')
+
+
+class AudioContentTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('uploader', password='secret'))
+        self.data = bytes(range(256)) * 40
+        services = fake_remote_services()
+        self.storage, _ = services.__enter__()
+        self.addCleanup(services.__exit__, None, None, None)
+
+        response = self.client.post('/api/admin/audios/', {
+            'title': 'Sunday Service',
+            'audio_file': SimpleUploadedFile('service.mp3', self.data, content_type='audio/mpeg'),
+            'published': 'true',
+            'is_public': 'true',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.audio = Audio.objects.get()
+        self.url = f"/api/public/audios/{self.audio.pk}/content/"
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_serializers_point_at_content_endpoint(self):
+        response = APIClient().get('/api/public/audios/')
+        self.assertTrue(response.data['results'][0]['audio_file'].endswith(self.url))
+        stream = APIClient().get(f"/api/public/audios/{self.audio.pk}/stream/")
+        self.assertTrue(stream.data['stream_url'].endswith(self.url))
+
+    def test_full_and_range_requests(self):
+        client = APIClient()
+        response = client.get(self.url, HTTP_ACCEPT='audio/mpeg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'audio/mpeg')
+        self.assertEqual(self.read(response), self.data)
+
+        response = client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f"bytes 100-199/{len(self.data)}")
+        self.assertEqual(self.read(response), self.data[100:200])
+
+        response = client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(self.read(response), self.data[-10:])
+
+        response = client.get(self.url, HTTP_RANGE=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_private_audio_only_through_admin(self):
+        Audio.objects.filter(pk=self.audio.pk).update(is_public=False)
+        self.assertEqual(APIClient().get(self.url).status_code, 404)
+        response = self.client.get(f"/api/admin/audios/{self.audio.pk}/content/")
+        self.assertEqual(self.read(response), self.data)
+
+
+def run_inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+@mock.patch('audios.background.submit', run_inline)
+class TieredStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.storage = TieredStorage(
+            cold='audios.storage.MemoryStorage', hot_location=location.name,
+            capacity_bytes=250, promote_score=3, half_life_hours=1,
+        )
+
+    def age(self, key, seconds):
+        stamp = time.time() - seconds
+        os.utime(self.storage.hot.path(key), (stamp, stamp))
+
+    def test_uploads_land_in_both_tiers(self):
+        self.storage.put('new.mp3', [b'x' * 100])
+        self.assertTrue(self.storage.is_hot('new.mp3'))
+        self.assertIn('new.mp3', self.storage.cold.files)
+        self.assertEqual(b''.join(self.storage.get_range('new.mp3', 10, 19)), b'x' * 10)
+
+        self.storage.delete('new.mp3')
+        self.assertFalse(self.storage.is_hot('new.mp3'))
+        self.assertEqual(self.storage.cold.files, {})
+
+    def test_nested_keys_are_held_under_a_flat_name(self):
+        self.storage.put('audios/2024/sermon.mp3', [b'x' * 100])
+        name = self.storage.hot_name('audios/2024/sermon.mp3')
+        self.assertTrue(name.endswith('.mp3') and '/' not in name)
+        self.assertTrue(self.storage.is_hot('audios/2024/sermon.mp3'))
+        self.assertIn('audios/2024/sermon.mp3', self.storage.cold.files)
+        self.assertEqual(self.storage.size('audios/2024/sermon.mp3'), 100)
+
+        self.storage.cold.put('audios/old.mp3', [b'y' * 10])
+        now = time.time()
+        for _ in range(3):
+            self.storage.record_access('audios/old.mp3', now=now)
+        self.assertTrue(self.storage.is_hot('audios/old.mp3'))
+        self.assertEqual(b''.join(self.storage.get_range('audios/old.mp3', 0, 3)), b'y' * 4)
+
+    def test_capacity_evicts_least_recently_used(self):
+        for age, key in ((30, 'a.mp3'), (20, 'b.mp3')):
+            self.storage.put(key, [b'x' * 100])
+            self.age(key, age)
+        self.storage.record_access('a.mp3')  # a is now the most recently used
+        self.storage.put('c.mp3', [b'x' * 100])
+
+        self.assertEqual([b2_file.name for b2_file in self.storage.hot.iter_files()], ['a.mp3', 'c.mp3'])
+        self.assertEqual(len(self.storage.cold.files), 3)
+        self.assertEqual(b''.join(self.storage.get('b.mp3')), b'x' * 100)
+
+    def test_heat_decays_and_promotes(self):
+        self.storage.cold.put('old.mp3', [b'y' * 100])
+        now = time.time()
+        self.storage.record_access('old.mp3', now=now - 7200)
+        self.storage.record_access('old.mp3', now=now - 7200)
+        # Two plays two half-lives ago are worth half a play now
+        self.assertAlmostEqual(self.storage.heat('old.mp3', now), 0.5)
+
+        self.storage.record_access('old.mp3', now=now)
+        self.assertFalse(self.storage.is_hot('old.mp3'))
+        self.storage.record_access('old.mp3', now=now)
+        self.storage.record_access('old.mp3', now=now)
+        self.assertTrue(self.storage.is_hot('old.mp3'))
+        self.assertEqual(self.storage.size('old.mp3'), 100)
+
+    def test_rebalance_demotes_cooled_files(self):
+        self.storage.put('cold.mp3', [b'x' * 10])
+        self.storage.put('recent.mp3', [b'x' * 10])
+        self.age('cold.mp3', 7200)
+
+        report = self.storage.rebalance()
+        self.assertEqual(report['demoted'], ['cold.mp3'])
+        self.assertTrue(self.storage.is_hot('recent.mp3'))
+        self.assertIn('cold.mp3', self.storage.cold.files)
+
+    def test_stream_resolves_to_current_tier(self):
+        uploader = User.objects.create_user('uploader', password='secret')
+        audio = make_audio(uploader, published=True, is_public=True, b2_file_name='sermon.mp3')
+        self.storage.cold.put('sermon.mp3', [b'z' * 100])
+        self.storage.cold.presign = lambda key, expires=3600: f"https://cold.example/{key}"
+
+        with mock.patch('audios.views.get_storage', return_value=self.storage):
+            def stream_url():
+                return APIClient().get(f"/api/public/audios/{audio.pk}/stream/").data['stream_url']
+
+            self.assertEqual(stream_url(), 'https://cold.example/sermon.mp3')
+            # Scores decay continuously, so the third play lands just under the threshold
+            for _ in range(3):
+                stream_url()
+            self.assertTrue(self.storage.is_hot('sermon.mp3'))
+            self.assertTrue(stream_url().endswith(f"/api/public/audios/{audio.pk}/content/"))
+
+
+@override_settings(PLAY_FLUSH_INTERVAL=3600)
+class PlayAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', password='secret', is_staff=True)
+        cls.sermon = make_audio(cls.admin, 'Sermon', published=True, is_public=True, b2_download_url='https://f.example/s.mp3')
+        cls.hymn = make_audio(cls.admin, 'Hymn', published=True, is_public=True, b2_download_url='https://f.example/h.mp3')
+        cls.event = Events.objects.create(title='Crusade', published=True)
+        cls.sermon.related_events.add(cls.event)
+
+    def setUp(self):
+        play_buffer.clear()
+        self.addCleanup(play_buffer.clear)
+
+    def totals(self, audio):
+        row = AudioPlayHourly.objects.get(audio=audio)
+        return row.plays, row.listened_seconds
+
+    def test_flush_adds_to_existing_rows_in_one_statement(self):
+        record_play(self.sermon.pk)
+        record_play(self.sermon.pk, plays=0, seconds=30)
+        flush_plays()
+        for _ in range(3):
+            record_play(self.sermon.pk)
+        record_play(self.hymn.pk, seconds=5)
+
+        with CaptureQueriesContext(connection) as queries:
+            flush_plays()
+        self.assertEqual(len([q for q in queries if 'INSERT INTO' in q['sql'] and 'play' in q['sql']]), 2)
+        self.assertEqual(self.totals(self.sermon), (4, 30))
+        self.assertEqual(self.totals(self.hymn), (1, 5))
+
+    def test_batches_apply_at_most_once(self):
+        counts = {(self.sermon.pk, hour_of(timezone.now())): [2, 10]}
+        self.assertTrue(apply_batch('4b6a1ad0-2c6e-4df4-9a42-3c8bcd57c1a5', counts))
+        self.assertFalse(apply_batch('4b6a1ad0-2c6e-4df4-9a42-3c8bcd57c1a5', counts))
+        self.assertEqual(self.totals(self.sermon), (2, 10))
+
+    def test_failed_flush_is_retried_with_the_same_batch(self):
+        record_play(self.sermon.pk)
+        with mock.patch('audios.analytics.apply_batch', side_effect=DatabaseError('gone away')), \
+                self.assertLogs('audios.analytics', 'ERROR'):
+            self.assertEqual(flush_plays(), 0)
+        record_play(self.sermon.pk)
+        self.assertEqual(flush_plays(), 2)
+        self.assertEqual(self.totals(self.sermon), (2, 0))
+
+    def test_counts_of_deleted_audios_are_dropped(self):
+        doomed = make_audio(self.admin, 'Doomed')
+        record_play(doomed.pk)
+        record_play(self.hymn.pk)
+        Audio.objects.filter(pk=doomed.pk).delete()
+        flush_plays()
+        self.assertEqual(list(AudioPlayHourly.objects.values_list('audio_id', flat=True)), [self.hymn.pk])
+
+    @override_settings(PLAY_FLUSH_INTERVAL=0)
+    def test_due_flush_runs_on_the_background_pool(self):
+        with mock.patch('audios.background.submit') as submit:
+            record_play(self.sermon.pk)
+            record_play(self.sermon.pk)
+        # Queued once, and nothing written in the listener's request
+        submit.assert_called_once_with(play_buffer._queued_flush)
+        self.assertFalse(AudioPlayHourly.objects.exists())
+        submit.call_args.args[0]()
+        self.assertEqual(self.totals(self.sermon), (2, 0))
+
+    def test_stream_play_and_analytics_endpoints(self):
+        public = APIClient()
+        for audio, streams in ((self.sermon, 3), (self.hymn, 1)):
+            for _ in range(streams):
+                self.assertEqual(public.get(f"/api/public/audios/{audio.pk}/stream/").status_code, 200)
+        response = public.post(f"/api/public/audios/{self.sermon.pk}/play/", {'seconds': 95.5}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(public.post(f"/api/public/audios/{self.sermon.pk}/play/", {'seconds': -1}, format='json').status_code, 400)
+
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        response = admin.get('/api/admin/audios/analytics/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['totals'], {'plays': 4, 'listened_seconds': 96})
+        self.assertEqual([(row['title'], row['plays']) for row in response.data['results']], [('Sermon', 3), ('Hymn', 1)])
+
+        response = admin.get('/api/admin/audios/analytics/', {'by': 'event'})
+        self.assertEqual(response.data['results'], [
+            {'id': self.event.pk, 'title': 'Crusade', 'plays': 3, 'listened_seconds': 96},
+        ])
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        response = admin.get('/api/admin/audios/analytics/', {'since': tomorrow.isoformat()})
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(admin.get('/api/admin/audios/analytics/', {'since': 'soon'}).status_code, 400)
+
+        staff_only = APIClient()
+        staff_only.force_authenticate(User.objects.create_user('editor', password='secret'))
+        self.assertEqual(staff_only.get('/api/admin/audios/analytics/').status_code, 403)
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class PlayAnalyticsReplicaTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def test_flush_checks_audios_on_the_primary(self):
+        # The replica has not caught up with this audio yet
+        audio = make_audio(User.objects.create_user('admin', password='secret'), 'New')
+        token = db_router._use_replica.set(True)
+        try:
+            apply_batch('0b8e5c1e-5a43-4a47-8d1c-0c7a3f6d9b21', {(audio.pk, hour_of(timezone.now())): [1, 0]})
+        finally:
+            db_router._use_replica.reset(token)
+        self.assertEqual(AudioPlayHourly.objects.using('default').get().plays, 1)
+
+
+class RankingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', password='secret')
+        cls.now = hour_of(timezone.now())
+        cls.event = Events.objects.create(title='Crusade', published=True)
+
+        def audio(title, genre, plays):
+            item = make_audio(cls.user, title, genre=genre, published=True, is_public=True)
+            AudioPlayHourly.objects.bulk_create(
+                AudioPlayHourly(audio=item, hour=cls.now - timedelta(hours=age), plays=count)
+                for age, count in plays
+            )
+            return item
+
+        # Classic: many plays long ago; fresh: fewer plays this week
+        cls.classic = audio('Classic', 'Gospel', [(24 * 60, 500)])
+        cls.fresh = audio('Fresh', 'Gospel', [(2, 40), (30, 20)])
+        cls.steady = audio('Steady', 'Teaching', [(24 * 10, 100), (5, 5)])
+        cls.hidden = audio('Hidden', 'Gospel', [(1, 1000)])
+        Audio.objects.filter(pk=cls.hidden.pk).update(published=False)
+        cls.fresh.related_events.add(cls.event)
+        cls.steady.related_events.add(cls.event)
+
+    def titles(self, action, **params):
+        response = APIClient().get(f"/api/public/audios/{action}/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['title'] for row in response.data]
+
+    def test_trending_decays_and_popular_uses_totals(self):
+        build_rankings(now=self.now)
+        self.assertEqual(self.titles('trending'), ['Fresh', 'Steady'])
+        self.assertEqual(self.titles('popular'), ['Classic', 'Steady', 'Fresh'])
+        self.assertEqual(self.titles('popular', limit=1), ['Classic'])
+
+    def test_breakdowns_by_genre_and_event(self):
+        build_rankings(now=self.now)
+        self.assertEqual(self.titles('popular', genre='Gospel'), ['Classic', 'Fresh'])
+        self.assertEqual(self.titles('trending', event=self.event.pk), ['Fresh', 'Steady'])
+        self.assertEqual(self.titles('popular', genre='Unknown'), [])
+
+    def test_reads_are_one_query_and_honour_visibility(self):
+        build_rankings(now=self.now, top_k_size=2)
+        self.assertEqual(AudioRanking.objects.filter(kind='popular', scope='all').count(), 2)
+        with self.assertNumQueries(1):
+            self.titles('popular')
+
+        Audio.objects.filter(pk=self.classic.pk).update(is_public=False)
+        self.assertEqual(self.titles('popular'), ['Steady'])
+
+    def test_rebuild_replaces_lists(self):
+        build_rankings(now=self.now)
+        AudioPlayHourly.objects.create(audio=self.classic, hour=self.now, plays=1000)
+        build_rankings(now=self.now)
+        self.assertEqual(self.titles('trending')[0], 'Classic')
+        self.assertFalse(AudioRanking.objects.filter(audio=self.hidden).exists())
+
+
+@skipUnless(importlib.util.find_spec('numpy') and importlib.util.find_spec('scipy'), 'numpy and scipy are optional')
+class RelatedAudiosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', password='secret')
+        cls.retreat = Events.objects.create(title='Youth Prayer Retreat', published=True)
+
+        def audio(title, **kwargs):
+            return make_audio(cls.user, title, published=True, is_public=True, **kwargs)
+
+        cls.faith = audio('Faith that moves mountains', description='Faith and prayer', genre='Teaching')
+        cls.faith_2 = audio('Faith in hard times', description='Keeping faith', genre='Teaching')
+        cls.praise = audio('Sunday praise', genre='Worship', artist='Choir')
+        cls.hymns = audio('Evening hymns', genre='Worship', artist='Choir')
+        cls.prayer = audio('Night vigil')
+        cls.prayer.related_events.add(cls.retreat)
+        cls.draft = audio('Faith draft', description='Faith faith faith')
+        Audio.objects.filter(pk=cls.draft.pk).update(published=False)
+
+    def related(self, audio, **params):
+        response = APIClient().get(f"/api/public/audios/{audio.pk}/related/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['title'] for row in response.data]
+
+    def test_tokenize_drops_stop_words_and_short_tokens(self):
+        self.assertEqual(tokenize("The Book of Ruth, 2024 (part 2)"), ['book', 'ruth', '2024', 'part'])
+
+    def test_neighbours_by_text_and_event_titles(self):
+        self.assertEqual(build_related(top_k=3, block_size=2), 5)
+        self.assertEqual(self.related(self.faith)[0], 'Faith in hard times')
+        self.assertEqual(self.related(self.praise), ['Evening hymns'])
+        # Only the retreat title links the vigil to the sermon on prayer
+        self.assertEqual(self.related(self.prayer), ['Faith that moves mountains'])
+        self.assertNotIn('Faith draft', self.related(self.faith_2))
+        self.assertEqual(self.related(self.faith, limit=1), ['Faith in hard times'])
+
+    def test_endpoint_is_one_query(self):
+        build_related()
+        with self.assertNumQueries(1):
+            self.related(self.faith)
+        self.assertEqual(self.related(self.draft), [])
+
+    def test_incremental_ranks_new_audios_and_updates_old_lists(self):
+        build_related(top_k=3)
+        Audio.objects.filter(pk=self.draft.pk).update(published=True)
+        before = list(AudioNeighbour.objects.filter(audio=self.hymns).values_list('neighbour_id', 'rank'))
+
+        written = build_related(incremental=True, top_k=3)
+        self.assertIn('Faith draft', self.related(self.faith))
+        self.assertEqual(self.related(self.draft)[0], 'Faith that moves mountains')
+        self.assertLess(written, 5)
+        self.assertEqual(list(AudioNeighbour.objects.filter(audio=self.hymns).values_list('neighbour_id', 'rank')), before)
+        self.assertEqual(build_related(incremental=True), 0)
+
+
+class AdminScalabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_is_constant(self):
+        for model_url, add in (
+            ('/admin/audios/audio/', lambda n: make_audio(User.objects.create(username=f"u{n}"), f"Audio {n}")),
+            ('/admin/events/events/', lambda n: Events.objects.create(title=f"Event {n}", author=f"Author {n}")),
+        ):
+            add(0)
+            few = self.changelist_queries(model_url)
+            for n in range(1, 8):
+                add(n)
+            self.assertEqual(self.changelist_queries(model_url), few, model_url)
+
+    def test_unfiltered_counts_use_table_statistics(self):
+        make_audio(self.admin)
+        # SQLite keeps no statistics, so counts stay exact
+        self.assertIsNone(estimated_row_count(Audio))
+        with mock.patch('backend_admin.paginators.estimated_row_count', return_value=250000) as estimate:
+            self.assertEqual(EstimatedCountPaginator(Audio.objects.all(), 10).count, 250000)
+            self.assertEqual(EstimatedCountPaginator(Audio.objects.filter(published=True), 10).count, 0)
+        estimate.assert_called_once()
+
+        with mock.patch('backend_admin.paginators.estimated_row_count', return_value=5):
+            self.assertEqual(EstimatedCountPaginator(Audio.objects.all(), 10).count, 1)
+
+    def test_relations_use_autocomplete_widgets(self):
+        Events.objects.bulk_create(Events(title=f"Event {n}") for n in range(50))
+        response = self.client.get('/admin/audios/audio/add/')
+        self.assertContains(response, 'data-field-name="uploaded_by"')
+        self.assertContains(response, 'data-field-name="related_events"')
+        self.assertNotContains(response, 'Event 49')
+
+
+DASHBOARD_BATCH = {'requests': [
+    {'path': '/api/admin/audios/statistics/'},
+    {'path': '/api/admin/audios/my_uploads/'},
+    {'path': '/api/dashboard/list/'},
+    {'path': '/api/user/list/?summary=true'},
+    {'path': '/api/user/verify/'},
+]}
+
+
+@override_settings(BATCH_WORKERS=1, THROTTLE_ENABLED=False)
+class BatchRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='dashboard', is_staff=True)
+        make_audio(cls.user, b2_file_name='audios/sermon.mp3')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, payload):
+        return self.client.post('/api/batch/', payload, format='json')
+
+    def test_dashboard_loads_in_one_request_authenticated_once(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        with mock.patch.object(JWTAuthentication, 'get_validated_token', autospec=True,
+                               side_effect=JWTAuthentication.get_validated_token) as decode:
+            response = client.post('/api/batch/', DASHBOARD_BATCH, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(decode.call_count, 1)
+        responses = response.json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200] * 5)
+        self.assertEqual(responses[0]['body']['total_audios'], 1)
+        self.assertEqual(responses[4]['body']['username'], 'dashboard')
+
+    def test_writes_are_ordered_between_reads(self):
+        audio = Audio.objects.get()
+        url = f"/api/admin/audios/{audio.pk}/"
+        responses = self.post({'requests': [
+            {'path': url},
+            {'method': 'patch', 'path': url, 'body': {'title': 'Renamed'}},
+            {'path': url},
+        ]}).json()['responses']
+        self.assertEqual([item['status'] for item in responses], [200, 200, 200])
+        self.assertEqual(responses[0]['body']['title'], 'Sermon')
+        self.assertEqual(responses[2]['body']['title'], 'Renamed')
+
+    def test_sub_requests_keep_their_own_status(self):
+        with fake_remote_services() as (storage, _):
+            storage.put('audios/sermon.mp3', [b'audio'])
+            responses = self.post({'requests': [
+                {'path': '/api/admin/audios/999999/'},
+                {'path': '/api/nothing-here/'},
+                {'path': f"/api/admin/audios/{Audio.objects.get().pk}/content/"},
+                {'path': '/api/admin/live/'},
+                {'path': '/api/user/verify/'},
+            ]}).json()['responses']
+        self.assertEqual([item['status'] for item in responses], [404, 404, 400, 400, 200])
+
+    def test_invalid_batches_are_rejected(self):
+        for payload in (
+            {'requests': []},
+            {'requests': [{'path': '/api/batch/'}]},
+            {'requests': [{'path': '/admin/'}]},
+            {'requests': [{'method': 'TRACE', 'path': '/api/user/list/'}]},
+            {'requests': [{'path': '/api/user/list/'}] * 21},
+        ):
+            self.assertEqual(self.post(payload).status_code, 400, payload)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.post(DASHBOARD_BATCH).status_code, 401)
+
+
+@override_settings(BATCH_WORKERS=4, THROTTLE_ENABLED=False)
+class ConcurrentBatchTests(TransactionTestCase):
+    def test_reads_run_on_the_batch_pool(self):
+        user = User.objects.create(username='dashboard', is_staff=True)
+        make_audio(user)
+        client = APIClient()
+        client.force_authenticate(user)
+        threads = []
+
+        def dispatch(parent, item):
+            threads.append(threading.current_thread().name)
+            return real_dispatch(parent, item)
+
+        real_dispatch = batch.dispatch
+        with mock.patch('backend_admin.batch.dispatch', side_effect=dispatch):
+            response = client.post('/api/batch/', DASHBOARD_BATCH, format='json')
+        self.assertEqual([item['status'] for item in response.json()['responses']], [200] * 5)
+        self.assertEqual(len(threads), 5)
+        self.assertTrue(all(name.startswith('api-batch') for name in threads))
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='uploader', is_staff=True)
+        for n in range(3):
+            make_audio(cls.user, f"Sermon {n}", description='Notes ' * 50, published=True, is_public=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fields_trim_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/public/audios/', {'fields': 'id,title'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        page_sql = queries[-1]['sql']
+        self.assertNotIn('description', page_sql)
+        self.assertNotIn('auth_user', page_sql)
+
+        full = self.client.get('/api/public/audios/')
+        self.assertLess(len(response.content) * 5, len(full.content))
+
+    def test_exclude_and_computed_fields(self):
+        with self.assertNumQueries(2):  # count, page
+            response = self.client.get('/api/admin/audios/', {'exclude': 'description,uploaded_by', 'ordering': 'title'})
+        row = response.data['results'][0]
+        self.assertNotIn('description', row)
+        self.assertTrue(row['audio_file'].endswith('Sermon%200.mp3'))
+        self.assertEqual(row['file_size_mb'], 0.0)
+
+        with self.assertNumQueries(1):  # uploader joined
+            response = self.client.get('/api/admin/audios/my_uploads/', {'fields': 'title,uploaded_by'})
+        self.assertEqual(response.data[0]['uploaded_by']['username'], 'uploader')
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/public/audios/', {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', str(response.data['fields']))
+        self.assertEqual(self.client.get('/api/public/audios/', {'exclude': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/public/audios/', {'fields': ''}).status_code, 400)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0, THROTTLE_ENABLED=False)
+class DeltaSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='uploader')
+        cls.audios = [make_audio(cls.user, f"Sermon {n}", published=True, is_public=True) for n in range(3)]
+        make_audio(cls.user, 'Draft')
+        cls.event = Events.objects.create(title='Crusade', published=True)
+
+    def sync(self, since=None):
+        response = APIClient().get('/api/public/sync/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_full_sync_then_only_changes(self):
+        data = self.sync()
+        self.assertEqual({row['title'] for row in data['audios']['updated']}, {'Sermon 0', 'Sermon 1', 'Sermon 2'})
+        self.assertEqual([row['title'] for row in data['events']['updated']], ['Crusade'])
+        self.assertFalse(data['has_more'])
+        token = data['next']
+        self.assertEqual(self.sync(token)['audios'], {'updated': [], 'removed': []})
+
+        first, second, third = self.audios
+        removed = [second.pk, third.pk]
+        event_id = self.event.pk
+        first.title = 'Renamed'
+        first.save()
+        Audio.objects.filter(pk=second.pk).update(published=False, updated_at=timezone.now())
+        third.delete()
+        self.event.delete()
+
+        data = self.sync(token)
+        self.assertEqual([row['title'] for row in data['audios']['updated']], ['Renamed'])
+        self.assertEqual(sorted(data['audios']['removed']), removed)
+        self.assertEqual(data['events'], {'updated': [], 'removed': [event_id]})
+        self.assertEqual(self.sync(data['next'])['audios'], {'updated': [], 'removed': []})
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pages_follow_continuation_token(self):
+        titles, token, pages = [], None, 0
+        while True:
+            data = self.sync(token)
+            titles += [row['title'] for row in data['audios']['updated']]
+            token, pages = data['next'], pages + 1
+            if not data['has_more']:
+                break
+        self.assertEqual(sorted(titles), ['Sermon 0', 'Sermon 1', 'Sermon 2'])
+        self.assertEqual(pages, 2)
+
+    def test_recent_changes_wait_for_the_settle_window(self):
+        token = self.sync()['next']
+        self.audios[0].save()
+        with override_settings(SYNC_SETTLE_SECONDS=60):
+            data = APIClient().get('/api/public/sync/', {'since': token}).data
+        self.assertEqual(data['audios']['updated'], [])
+        self.assertEqual(len(self.sync(data['next'])['audios']['updated']), 1)
+
+    def test_bad_and_expired_tokens(self):
+        self.assertEqual(APIClient().get('/api/public/sync/', {'since': 'nonsense'}).status_code, 400)
+        old = (timezone.now() - timedelta(days=60)).isoformat()
+        token = make_token({'a': [old, None], 'e': [old, None], 't': [old, None]})
+        self.assertEqual(APIClient().get('/api/public/sync/', {'since': token}).status_code, 410)
+
+    def test_compaction_drops_old_tombstones(self):
+        audio_id = self.audios[0].pk
+        self.audios[0].delete()
+        SyncTombstone.objects.create(kind=SyncTombstone.EVENT, object_id=99, deleted_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(compact_tombstones(batch_size=1), 1)
+        self.assertEqual(list(SyncTombstone.objects.values_list('object_id', flat=True)), [audio_id])
+
+
+@override_settings(LIVE_POLL_INTERVAL=0.01, UPLOAD_PROGRESS_INTERVAL=0)
+class LiveUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', password='secret')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_upload_progress_is_published_to_the_uploader(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with fake_remote_services(), self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/admin/audios/', {
+                'title': 'Sunday Service',
+                'audio_file': SimpleUploadedFile('service.mp3', b'\xff\xfb' * 1024, content_type='audio/mpeg'),
+            }, HTTP_X_UPLOAD_ID='upload-0001')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        audio = Audio.objects.get()
+        progress = live.get_upload_progress('upload-0001', self.user.pk)
+        self.assertEqual(progress['state'], 'done')
+        self.assertEqual((progress['bytes'], progress['total'], progress['audio_id']), (2048, 2048, audio.pk))
+        self.assertIsNone(live.get_upload_progress('upload-0001', self.user.pk + 1))
+
+        events, _, _ = live.events_since(0)
+        uploads = [event for event in events if event['type'] == 'upload']
+        self.assertEqual([event['data']['state'] for event in uploads][-1], 'done')
+        self.assertIn('storing', [event['data']['state'] for event in uploads])
+        self.assertTrue(all(event['user_id'] == self.user.pk for event in uploads))
+        self.assertIn(audio.pk, [pk for event in events if event['type'] == 'audios' for pk in event['data']['ids']])
+
+    def test_storage_and_b2_listener_report_bytes(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        for storage in (LocalStorage(location.name), MemoryStorage()):
+            calls = []
+            storage.put('a.mp3', [b'x' * 10, b'y' * 5], progress=lambda done, total=None: calls.append(done))
+            self.assertEqual(calls, [10, 15])
+
+        calls = []
+        listener = progress_listener(lambda done, total: calls.append((done, total)))
+        listener.set_total_bytes(100)
+        listener.bytes_completed(40)
+        listener.close()
+        self.assertEqual(calls, [(0, 100), (40, 100)])
+
+    def test_one_poller_fans_out_to_every_stream(self):
+        async def scenario():
+            mine, other = live_stream(self.user.pk), live_stream(self.user.pk + 1)
+            await mine.__anext__()
+            await other.__anext__()
+            self.assertEqual(len(live.broadcaster.subscribers), 2)
+            await asyncio.sleep(0.05)
+
+            live.publish('upload', {'upload_id': 'upload-0001', 'state': 'storing'}, user_id=self.user.pk)
+            live.publish('audios', {'ids': [1], 'fields': None, 'deleted': False}, owners=[self.user.pk])
+            live.publish('events', {'ids': [1], 'deleted': False})
+            received = [await asyncio.wait_for(mine.__anext__(), 2) for _ in range(3)]
+            other_received = await asyncio.wait_for(other.__anext__(), 2)
+            await mine.aclose()
+            await other.aclose()
+            return received, other_received
+
+        received, other_received = asyncio.run(scenario())
+        self.assertTrue(received[0].startswith('id: 1\nevent: upload\n'))
+        self.assertTrue(received[1].startswith('id: 2\nevent: audios\n'))
+        self.assertTrue(received[2].startswith('id: 3\nevent: events\n'))
+        # Neither the upload nor the change to someone else's audio
+        self.assertTrue(other_received.startswith('id: 3\nevent: events\n'))
+        self.assertEqual(live.broadcaster.subscribers, set())
+
+    async def test_stream_endpoint(self):
+        self.assertEqual((await self.async_client.get('/api/admin/live/')).status_code, 401)
+        response = await self.async_client.get('/api/admin/live/', {'token': 'nonsense'})
+        self.assertEqual(response.status_code, 401)
+
+        token = str(RefreshToken.for_user(self.user).access_token)
+        response = await self.async_client.get('/api/admin/live/', {'token': token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+        self.assertTrue((await anext(content)).startswith(b'retry: '))
+        await asyncio.sleep(0.05)
+        live.publish('audios', {'ids': [7], 'fields': None, 'deleted': True})
+        message = await asyncio.wait_for(anext(content), 2)
+        self.assertIn(b'"deleted": true', message)
+        await content.aclose()
+
+    def test_audio_changes_reach_staff_and_uploaders_only(self):
+        audio = make_audio(self.user, 'Mine')
+        with self.captureOnCommitCallbacks(execute=True):
+            Audio.objects.filter(pk=audio.pk).update(published=True)
+            send_audios_changed([audio.pk], fields=['published'])
+        event = live.events_since(0)[0][-1]
+        self.assertEqual(event['owners'], [self.user.pk])
+        self.assertTrue(live.visible_to(event, self.user.pk))
+        self.assertTrue(live.visible_to(event, self.user.pk + 1, is_staff=True))
+        self.assertFalse(live.visible_to(event, self.user.pk + 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            audio.delete()
+        self.assertEqual(live.events_since(0)[0][-1]['owners'], [self.user.pk])
+
+    def test_wsgi_requests_are_refused(self):
+        self.assertEqual(self.client.get('/api/admin/live/').status_code, 501)
+
+
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='uploader')
+        cls.audios = [make_audio(cls.user, f"Sermon {n}", published=True, is_public=True) for n in range(3)]
+        make_audio(cls.user, 'Private', published=True, is_public=False)
+        Events.objects.create(title='Crusade', published=True)
+
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.storage = LocalStorage(location.name)
+
+    def read(self, name):
+        return json.loads(b''.join(self.storage.get(name)))
+
+    def test_publishes_hashed_pages_and_manifest(self):
+        result = publish_snapshots(self.storage, page_size=2)
+
+        manifest = self.read(MANIFEST)
+        audios = manifest['collections']['audios']
+        self.assertEqual((audios['count'], len(audios['pages'])), (3, 2))
+        self.assertEqual(manifest['collections']['events']['count'], 1)
+        self.assertEqual(result, {'pages': 6, 'written': 6, 'deleted': 0})
+
+        first = audios['pages'][0]
+        self.assertRegex(first, r'^audios-1\.[0-9a-f]{12}\.json$')
+        page = self.read(first)
+        self.assertEqual([row['title'] for row in page['results']], ['Sermon 2', 'Sermon 1'])
+        self.assertEqual((page['page'], page['pages']), (1, 2))
+        self.assertEqual(gzip.decompress(b''.join(self.storage.get(f"{first}.gz"))), b''.join(self.storage.get(first)))
+
+    def test_republishing_rewrites_only_changed_pages(self):
+        first = publish_snapshots(self.storage, page_size=2)
+        self.assertEqual(publish_snapshots(self.storage, page_size=2)['written'], 0)
+        old_pages = self.read(MANIFEST)['collections']['audios']['pages']
+
+        self.audios[2].title = 'Renamed'
+        self.audios[2].save()
+        result = publish_snapshots(self.storage, page_size=2)
+        self.assertEqual(result['deleted'], 0)
+        new_pages = self.read(MANIFEST)['collections']['audios']['pages']
+        self.assertNotEqual(new_pages[0], old_pages[0])
+        self.assertEqual(new_pages[1], old_pages[1])
+        # Pages of the previous manifest stay for readers that just fetched it
+        self.storage.size(old_pages[0])
+
+        result = publish_snapshots(self.storage, page_size=2)
+        self.assertGreater(result['deleted'], 0)
+        with self.assertRaises(FileNotFoundError):
+            self.storage.size(old_pages[0])
+        self.assertEqual(first['pages'], result['pages'])
+
+    def test_changes_trigger_a_publish(self):
+        with override_settings(SNAPSHOT_ON_CHANGE=True, SNAPSHOT_STORAGE_BACKEND='audios.storage.LocalStorage',
+                               SNAPSHOT_STORAGE_OPTIONS={'location': self.storage.location}), \
+                mock.patch('audios.background.submit', side_effect=lambda func, *args: func(*args)), \
+                self.captureOnCommitCallbacks(execute=True):
+            cache.clear()
+            Audio.objects.filter(pk=self.audios[0].pk).update(published=False)
+            self.audios[1].save()
+        self.assertEqual(self.read(MANIFEST)['collections']['audios']['count'], 2)
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        barrier = threading.Barrier(200)
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'total': 42}
+
+        def read():
+            barrier.wait()
+            results.append(singleflight.cached('stress', 'featured', compute))
+
+        threads = [threading.Thread(target=read) for _ in range(200)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'total': 42}] * 200)
+
+    def test_stale_value_is_served_while_one_caller_refreshes(self):
+        singleflight.cached('stress', 'featured', lambda: 'old')
+        singleflight.expire('stress')
+        started, release = threading.Event(), threading.Event()
+
+        def slow_refresh():
+            started.set()
+            release.wait(5)
+            return 'new'
+
+        refresher = threading.Thread(target=singleflight.cached, args=('stress', 'featured', slow_refresh))
+        refresher.start()
+        started.wait(5)
+        self.assertEqual(singleflight.cached('stress', 'featured', lambda: self.fail('computed twice')), 'old')
+        release.set()
+        refresher.join()
+        self.assertEqual(singleflight.cached('stress', 'featured', lambda: 'newer'), 'new')
+
+    def test_waits_for_another_process_holding_the_lock(self):
+        # Another process is computing the entry
+        cache.add('singleflight:stress:featured:lock', True, 10)
+        entry = ('theirs', time.time() + 60, 0)
+        threading.Timer(0.1, cache.set, args=('singleflight:stress:featured', entry)).start()
+        self.assertEqual(singleflight.cached('stress', 'featured', lambda: 'ours'), 'theirs')
+
+    def test_statistics_are_cached_until_audios_change(self):
+        staff = User.objects.create_user('admin', password='secret', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        make_audio(staff, 'First')
+        self.assertEqual(client.get('/api/admin/audios/statistics/').data['total_audios'], 1)
+
+        Audio.objects.filter(pk=Audio.objects.get().pk).update(title='Quiet')
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get('/api/admin/audios/statistics/').data['total_audios'], 1)
+        self.assertFalse([q for q in ctx.captured_queries if 'audios_audio' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_audio(staff, 'Second')
+        self.assertEqual(client.get('/api/admin/audios/statistics/').data['total_audios'], 2)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('admin', password='secret', is_staff=True)
+        make_audio(cls.staff, 'Sunday Service', published=True, duration=timedelta(minutes=2))
+        make_audio(cls.staff, '=HYPERLINK("x")', published=True)
+        make_audio(cls.staff, 'Draft Service')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def export(self, **params):
+        response = self.client.get('/api/admin/audios/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_honours_filters_and_search(self):
+        response, content = self.export(published='true', search='Service')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="audios-', response['Content-Disposition'])
+        lines = content.decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,title,artist,'))
+        self.assertEqual(len(lines), 2)
+        self.assertIn(',Sunday Service,', lines[1])
+        self.assertIn(',120.0,', lines[1])
+
+    def test_ndjson_gzip_and_formula_escaping(self):
+        response, content = self.export(**{'as': 'ndjson', 'gzip': '1', 'ordering': 'title'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = [json.loads(line) for line in gzip.decompress(content).decode().splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Sunday Service', '=HYPERLINK("x")', 'Draft Service'])
+        self.assertEqual(rows[0]['uploaded_by'], 'admin')
+
+        _, content = self.export(search='HYPERLINK')
+        self.assertIn('\'=HYPERLINK', content.decode())
+        self.assertEqual(self.client.get('/api/admin/audios/export/', {'as': 'xml'}).status_code, 400)
+
+    def test_keyset_chunks_where_the_driver_buffers_results(self):
+        expected = list(Audio.objects.order_by('pk').values_list('title'))
+        with mock.patch.object(connection, 'vendor', 'mysql'), CaptureQueriesContext(connection) as ctx:
+            rows = list(iter_rows(Audio.objects.all(), ['title'], chunk_size=2))
+        self.assertEqual(rows, expected)
+        self.assertEqual(len(ctx.captured_queries), 2)
@@ -0,0 +1,165 @@
+"""
+Hot/cold tiered audio storage.
+
+``TieredStorage`` keeps every file in a durable cold backend (B2 in
+production) and a bounded working set on a fast local volume:
+
+- new uploads are written to both tiers, since recent sermons get most plays
+- each play bumps an access score that decays exponentially; a cold file
+  whose score reaches ``promote_score`` is copied to the hot tier in the
+  background
+- the hot tier never grows past ``capacity_bytes``; least recently used
+  files are evicted first, and ``rebalance()`` demotes files whose score
+  has decayed below ``demote_score``
+
+The hot directory itself is the index (file mtime is the LRU clock), so
+several worker processes can share one volume. Keys that are not a bare
+file name (e.g. ``audios/sermon.mp3``) are stored there under the SHA-1 of
+the key, see ``hot_name``. Scores live in the Django cache, by hot name,
+and are approximate by design.
+"""
+import os
+import time
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from . import background
+from .storage import AudioStorage, LocalStorage
+
+HEAT_KEY = 'audio-heat:{}'
+PROMOTE_LOCK_KEY = 'audio-promote:{}'
+
+
+class TieredStorage(AudioStorage):
+    def __init__(self, cold='audios.storage.B2Storage', cold_options=None, hot_location=None,
+                 capacity_bytes=10 * 1024 ** 3, promote_score=3.0, demote_score=0.5, half_life_hours=72):
+        self.cold = import_string(cold)(**(cold_options or {}))
+        self.hot = LocalStorage(hot_location or os.path.join(settings.MEDIA_ROOT, 'audios-hot'))
+        self.capacity_bytes = capacity_bytes
+        self.promote_score = promote_score
+        self.demote_score = demote_score
+        self.half_life = half_life_hours * 3600
+
+    def hot_name(self, key):
+        """File name of ``key`` in the hot tier, which holds bare file names only"""
+        if key and os.path.basename(key) == key and not key.startswith('.'):
+            return key
+        return sha1(key.encode()).hexdigest() + os.path.splitext(os.path.basename(key))[1]
+
+    # Access frequency
+
+    def heat(self, key, now=None):
+        """Decayed access score of ``key``"""
+        return self._heat(self.hot_name(key), now or time.time())
+
+    def _heat(self, name, now):
+        score, updated = cache.get(HEAT_KEY.format(name), (0.0, 0.0))
+        return self._decay(score, updated, now)
+
+    def _decay(self, score, updated, now):
+        return score * 0.5 ** (max(now - updated, 0) / self.half_life)
+
+    def record_access(self, key, now=None):
+        """Count one play; schedules promotion once the score is high enough"""
+        now = now or time.time()
+        score = self.heat(key, now) + 1
+        cache.set(HEAT_KEY.format(self.hot_name(key)), (score, now), int(self.half_life * 10))
+        if self.is_hot(key):
+            self.hot.touch(self.hot_name(key))
+        elif score >= self.promote_score and cache.add(PROMOTE_LOCK_KEY.format(key), True, 300):
+            background.submit(self.promote, key)
+        return score
+
+    # Tier movement
+
+    def is_hot(self, key):
+        return os.path.exists(self.hot.path(self.hot_name(key)))
+
+    def hot_usage(self):
+        return sum(b2_file.size for b2_file in self.hot.iter_files())
+
+    def evict(self, needed=0):
+        """Delete least recently used hot files until ``needed`` more bytes fit"""
+        files = sorted(self.hot.iter_files(), key=lambda b2_file: b2_file.uploaded_at)
+        used = sum(b2_file.size for b2_file in files)
+        evicted = []
+        for b2_file in files:
+            if used + needed <= self.capacity_bytes:
+                break
+            if self.hot.delete(b2_file.name):
+                used -= b2_file.size
+                evicted.append(b2_file.name)
+        return evicted
+
+    def promote(self, key):
+        """Copy ``key`` from the cold tier into the hot tier"""
+        try:
+            if self.is_hot(key):
+                return False
+            size = self.cold.size(key)
+            if size > self.capacity_bytes:
+                return False
+            self.evict(needed=size)
+            self.hot.put(self.hot_name(key), self.cold.get(key))
+            return True
+        finally:
+            cache.delete(PROMOTE_LOCK_KEY.format(key))
+
+    def rebalance(self, now=None):
+        """Demote hot files whose access score has decayed, then enforce capacity"""
+        now = now or time.time()
+        demoted = []
+        for b2_file in self.hot.iter_files():
+            idle = now - b2_file.uploaded_at / 1000
+            # Files touched within one half-life are kept regardless of score
+            if idle > self.half_life and self._heat(b2_file.name, now) < self.demote_score:
+                if self.hot.delete(b2_file.name):
+                    demoted.append(b2_file.name)
+        return {'demoted': demoted, 'evicted': self.evict()}
+
+    # AudioStorage
+
+    def put(self, key, chunks, content_type='application/octet-stream', progress=None):
+        # Land on local disk first, then stream the local copy to the cold
+        # tier; progress follows the cold upload, the slow part
+        name = self.hot_name(key)
+        self.hot.put(name, chunks, content_type)
+        try:
+            stored = self.cold.put(key, self.hot.get(name), content_type, progress=progress)
+        except BaseException:
+            self.hot.delete(name)
+            raise
+        self.evict()
+        return stored
+
+    def get_range(self, key, start=0, end=None):
+        if self.is_hot(key):
+            try:
+                yield from self.hot.get_range(self.hot_name(key), start, end)
+                return
+            except FileNotFoundError:
+                # Evicted between the check and the read
+                pass
+        yield from self.cold.get_range(key, start, end)
+
+    def size(self, key):
+        try:
+            return self.hot.size(self.hot_name(key))
+        except FileNotFoundError:
+            return self.cold.size(key)
+
+    def delete(self, key, file_id=None):
+        self.hot.delete(self.hot_name(key))
+        return self.cold.delete(key, file_id)
+
+    def presign(self, key, expires=3600):
+        if self.is_hot(key):
+            return None
+        return self.cold.presign(key, expires)
+
+    def iter_files(self, page_size=1000):
+        # The cold tier holds everything
+        return self.cold.iter_files(page_size)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PublicAudioViewSet, AdminAudioViewSet
+from .views import PublicAudioViewSet, AdminAudioViewSet, PublicSyncView, live_events
 
 # Public API router (read-only)
 public_router = DefaultRouter()
@@ -11,6 +11,8 @@ admin_router = DefaultRouter()
 admin_router.register(r'admin/audios', AdminAudioViewSet, basename='admin-audio')
 
 urlpatterns = [
+    path('public/sync/', PublicSyncView.as_view(), name='public-sync'),
+    path('admin/live/', live_events, name='admin-live'),
     # Include both routers
     path('', include(public_router.urls)),
     path('', include(admin_router.urls)),
@@ -1,26 +1,196 @@
+import asyncio
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from asgiref.sync import sync_to_async
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
-from django.db import models
-from .models import Audio
+from django.db import models, transaction
+from django.db.models import Case, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from backend_admin.exports import ExportMixin
+from backend_admin.fieldsets import SparseFieldsetMixin
+from backend_admin.singleflight import cached, request_key
+from . import live
+from .backblaze_upload import CONTENT_TYPE_MAP
+from .models import Audio, AudioPlayHourly, AudioRanking
+from .storage import get_storage
 from .serializers import (
     AudioSerializer, 
     AudioCreateSerializer, 
     AudioUpdateSerializer, 
     AudioListSerializer,
-    UserSerializer
+    AudioBulkUpdateSerializer,
+    UserSerializer,
+    audio_content_url,
+    audio_file_url,
 )
+from .signals import send_audios_changed
+from .analytics import flush_plays, record_play
+from .rankings import ranked_audios
+from .recommendations import related_audios
+from .sync import SyncTokenError, SyncTokenExpired, sync_changes
+
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+# ?by= of the analytics action: grouping id and title lookups on AudioPlayHourly
+ANALYTICS_GROUPS = {
+    'audio': ('audio_id', 'audio__title'),
+    'event': ('audio__related_events__id', 'audio__related_events__title'),
+}
+# Cap for one listening report when the audio's duration is unknown
+MAX_REPORTED_SECONDS = 6 * 60 * 60
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header
+
+    Returns:
+        tuple: inclusive ``(start, end)``, or None to send the whole file
+        (no header, unsupported or multiple ranges)
+
+    Raises:
+        ValueError: when the range cannot be satisfied
+    """
+    match = RANGE_HEADER.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def query_date(params, name):
+    """Optional YYYY-MM-DD query parameter; raises ValueError when malformed"""
+    value = params.get(name)
+    if value is None:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(name)
+    return parsed
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def public_cache_times():
+    return {
+        'timeout': getattr(settings, 'PUBLIC_CACHE_SECONDS', 60),
+        'stale': getattr(settings, 'CACHE_STALE_SECONDS', 300),
+    }
+
+
+def audio_statistics():
+    """Counts and recent uploads for the admin dashboard"""
+    # Recent uploads
+    recent_uploads = Audio.objects.order_by('-created_at')[:5]
+    return {
+        'total_audios': Audio.objects.count(),
+        'published_audios': Audio.objects.filter(published=True).count(),
+        'featured_audios': Audio.objects.filter(is_featured=True).count(),
+        'public_audios': Audio.objects.filter(is_public=True).count(),
+        'recent_uploads': AudioListSerializer(recent_uploads, many=True).data,
+    }
+
+
+def stream_url(audio, request):
+    """
+    URL a player should fetch, from whichever tier holds the file.
+
+    Counts one play towards the file's heat. Hot files are served by the
+    content endpoint; cold ones by their public or presigned storage URL.
+    """
+    if audio.b2_file_name:
+        storage = get_storage()
+        storage.record_access(audio.b2_file_name)
+        if storage.is_hot(audio.b2_file_name):
+            return audio_content_url(audio, request)
+        if not audio.b2_download_url:
+            presigned = storage.presign(audio.b2_file_name)
+            if presigned:
+                return presigned
+    return audio_file_url(audio, request)
+
+
+class AudioContentRenderer(BaseRenderer):
+    """Accepts any Accept header for audio bytes; only error bodies are rendered"""
+    media_type = '*/*'
+    format = 'audio'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class AudioContentMixin:
+    """Streams the stored audio bytes, honouring HTTP Range requests"""
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, AudioContentRenderer])
+    def content(self, request, pk=None):
+        """Audio file bytes"""
+        audio = self.get_object()
+        if not audio.b2_file_name:
+            return Response({'error': 'No audio file available'}, status=status.HTTP_404_NOT_FOUND)
+        storage = get_storage()
+        try:
+            size = audio.file_size or storage.size(audio.b2_file_name)
+        except FileNotFoundError:
+            return Response({'error': 'No audio file available'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f"bytes */{size}"
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        extension = os.path.splitext(audio.b2_file_name)[1].lower()
+        response = StreamingHttpResponse(
+            storage.get_range(audio.b2_file_name, start, end),
+            status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+            content_type=CONTENT_TYPE_MAP.get(extension, 'application/octet-stream'),
+        )
+        response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range:
+            response['Content-Range'] = f"bytes {start}-{end}/{size}"
+        return response
 
-class PublicAudioViewSet(viewsets.ReadOnlyModelViewSet):
+class PublicAudioViewSet(SparseFieldsetMixin, AudioContentMixin, viewsets.ReadOnlyModelViewSet):
     """
     Public API for published audios - read-only access
     """
-    queryset = Audio.objects.filter(is_public=True, published=True)
+    queryset = Audio.objects.published_public()
     serializer_class = AudioListSerializer
     permission_classes = [AllowAny]
+    use_read_replica = True
+    throttle_scope = 'public_audios'
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['genre', 'artist', 'year', 'is_featured']
     search_fields = ['title', 'description', 'artist', 'album']
@@ -31,18 +201,43 @@ class PublicAudioViewSet(viewsets.ReadOnlyModelViewSet):
     def stream(self, request, pk=None):
         """Stream audio file"""
         audio = self.get_object()
-        if audio.b2_download_url:
-            return Response({'stream_url': audio.b2_download_url})
-        elif audio.audio_file:
-            return Response({'stream_url': request.build_absolute_uri(audio.audio_file.url)})
+        url = stream_url(audio, request)
+        if url:
+            record_play(audio.pk)
+            return Response({'stream_url': url})
         return Response({'error': 'No audio file available'}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(detail=True, methods=['post'])
+    def play(self, request, pk=None):
+        """Report seconds listened since the last report of a play started with stream"""
+        audio = self.get_object()
+        try:
+            seconds = float(request.data.get('seconds', 0))
+        except (TypeError, ValueError):
+            seconds = -1
+        if not 0 <= seconds < float('inf'):
+            return Response({'error': 'seconds must be a non-negative number'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = audio.duration.total_seconds() if audio.duration else MAX_REPORTED_SECONDS
+        record_play(audio.pk, plays=0, seconds=min(seconds, limit))
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('search'):
+            return super().list(request, *args, **kwargs)
+        # Popular searches are computed once however many clients ask
+        data = cached('audios', request_key('search', request),
+                      lambda: super(PublicAudioViewSet, self).list(request, *args, **kwargs).data,
+                      **public_cache_times())
+        return Response(data)
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Get featured audios"""
-        featured_audios = self.queryset.filter(is_featured=True)
-        serializer = self.get_serializer(featured_audios, many=True)
-        return Response(serializer.data)
+        def compute():
+            featured_audios = self.queryset.filter(is_featured=True)
+            return self.get_serializer(featured_audios, many=True).data
+
+        return Response(cached('audios', request_key('featured', request), compute, **public_cache_times()))
 
     @action(detail=False, methods=['get'])
     def latest(self, request):
@@ -51,7 +246,44 @@ class PublicAudioViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = self.get_serializer(latest_audios, many=True)
         return Response(serializer.data)
 
-class AdminAudioViewSet(viewsets.ModelViewSet):
+    def ranking_response(self, kind):
+        """One precomputed ranking list; ?genre= or ?event= selects a breakdown"""
+        params = self.request.query_params
+        scope, scope_key = AudioRanking.ALL, ''
+        if params.get('genre'):
+            scope, scope_key = AudioRanking.GENRE, params['genre']
+        elif params.get('event'):
+            scope, scope_key = AudioRanking.EVENT, params['event']
+        try:
+            limit = max(int(params.get('limit', 10)), 1)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        audios = ranked_audios(kind, scope, scope_key, limit)
+        serializer = self.get_serializer(audios, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """Audios with similar titles, descriptions, artists and events"""
+        try:
+            audio_id = int(pk)
+            limit = max(int(request.query_params.get('limit', 10)), 1)
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid audio id or limit'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(related_audios(audio_id, limit), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Most played audios lately, recent plays weighing most"""
+        return self.ranking_response(AudioRanking.TRENDING)
+
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """Most played audios of all time"""
+        return self.ranking_response(AudioRanking.POPULAR)
+
+class AdminAudioViewSet(SparseFieldsetMixin, ExportMixin, AudioContentMixin, viewsets.ModelViewSet):
     """
     Admin API for audio management - full CRUD access
     """
@@ -62,6 +294,14 @@ class AdminAudioViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'description', 'artist', 'album']
     ordering_fields = ['created_at', 'title', 'artist', 'year']
     ordering = ['-created_at']
+    export_name = 'audios'
+    export_fields = (
+        ('id', 'id'), ('title', 'title'), ('artist', 'artist'), ('album', 'album'), ('genre', 'genre'),
+        ('year', 'year'), ('duration_seconds', 'duration'), ('file_size', 'file_size'), ('format', 'format'),
+        ('is_public', 'is_public'), ('is_featured', 'is_featured'), ('published', 'published'),
+        ('uploaded_by', 'uploaded_by__username'), ('storage_key', 'b2_file_name'),
+        ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
 
     def get_queryset(self):
         """Return audios based on user permissions"""
@@ -86,11 +326,9 @@ class AdminAudioViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """Get download URL for audio"""
-        audio = self.get_object()
-        if audio.b2_download_url:
-            return Response({'download_url': audio.b2_download_url})
-        elif audio.audio_file:
-            return Response({'download_url': request.build_absolute_uri(audio.audio_file.url)})
+        url = stream_url(self.get_object(), request)
+        if url:
+            return Response({'download_url': url})
         return Response({'error': 'No audio file available'}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=False, methods=['get'])
@@ -100,61 +338,205 @@ class AdminAudioViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(my_audios, many=True)
         return Response(serializer.data)
 
+    def toggle_field(self, field):
+        """Atomically flip a boolean field with a conditional UPDATE and return the new value"""
+        try:
+            pk = int(self.kwargs['pk'])
+        except (TypeError, ValueError):
+            raise Http404
+        queryset = self.get_queryset().filter(pk=pk)
+        with transaction.atomic():
+            updated = queryset.update(**{
+                field: Case(When(**{field: True}, then=Value(False)), default=Value(True)),
+                'updated_at': timezone.now(),
+            })
+            if not updated:
+                raise Http404
+            value = queryset.values_list(field, flat=True).get()
+        send_audios_changed([pk], fields=[field, 'updated_at'])
+        return pk, value
+
     @action(detail=True, methods=['post'])
     def toggle_featured(self, request, pk=None):
         """Toggle featured status"""
-        audio = self.get_object()
-        audio.is_featured = not audio.is_featured
-        audio.save()
+        pk, is_featured = self.toggle_field('is_featured')
         return Response({
-            'id': audio.id,
-            'is_featured': audio.is_featured,
-            'message': f"Audio {'featured' if audio.is_featured else 'unfeatured'} successfully"
+            'id': pk,
+            'is_featured': is_featured,
+            'message': f"Audio {'featured' if is_featured else 'unfeatured'} successfully"
         })
 
     @action(detail=True, methods=['post'])
     def toggle_public(self, request, pk=None):
         """Toggle public status"""
-        audio = self.get_object()
-        audio.is_public = not audio.is_public
-        audio.save()
+        pk, is_public = self.toggle_field('is_public')
         return Response({
-            'id': audio.id,
-            'is_public': audio.is_public,
-            'message': f"Audio {'made public' if audio.is_public else 'made private'} successfully"
+            'id': pk,
+            'is_public': is_public,
+            'message': f"Audio {'made public' if is_public else 'made private'} successfully"
         })
 
     @action(detail=True, methods=['post'])
     def toggle_published(self, request, pk=None):
         """Toggle published status"""
-        audio = self.get_object()
-        audio.published = not audio.published
-        audio.save()
+        pk, published = self.toggle_field('published')
         return Response({
-            'id': audio.id,
-            'published': audio.published,
-            'message': f"Audio {'published' if audio.published else 'unpublished'} successfully"
+            'id': pk,
+            'published': published,
+            'message': f"Audio {'published' if published else 'unpublished'} successfully"
         })
 
+    @action(detail=False, methods=['post'])
+    def bulk_update(self, request):
+        """Apply status changes to many audios with a single UPDATE"""
+        serializer = AudioBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = serializer.validated_data['changes']
+
+        with transaction.atomic():
+            # Scope to what the caller may edit, then write in one statement
+            ids = list(
+                self.get_queryset().filter(id__in=serializer.validated_data['ids']).values_list('id', flat=True)
+            )
+            updated = Audio.objects.filter(id__in=ids).update(**changes, updated_at=timezone.now()) if ids else 0
+        if ids:
+            send_audios_changed(ids, fields=list(changes) + ['updated_at'])
+
+        return Response({
+            'updated': updated,
+            'ids': ids,
+            'changes': changes,
+        })
+
+    @action(detail=False, methods=['get'], throttle_scope='export')
+    def export(self, request):
+        """Stream every audio matching the list filters as CSV or NDJSON (see backend_admin.exports)"""
+        return self.export_response(request)
+
     @action(detail=False, methods=['get'])
     def statistics(self, request):
         """Get audio statistics for admin dashboard"""
         if not request.user.is_staff:
             return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        total_audios = Audio.objects.count()
-        published_audios = Audio.objects.filter(published=True).count()
-        featured_audios = Audio.objects.filter(is_featured=True).count()
-        public_audios = Audio.objects.filter(is_public=True).count()
-        
-        # Recent uploads
-        recent_uploads = Audio.objects.order_by('-created_at')[:5]
-        recent_serializer = AudioListSerializer(recent_uploads, many=True)
-        
+        timeout = getattr(settings, 'STATISTICS_CACHE_SECONDS', 30)
+        return Response(cached('audios', 'statistics', audio_statistics, timeout=timeout,
+                               stale=getattr(settings, 'CACHE_STALE_SECONDS', 300)))
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """Plays and listened seconds per audio, or per event with ?by=event"""
+        if not request.user.is_staff:
+            return Response({'error': 'Access denied'}, status=status.HTTP_403_FORBIDDEN)
+
+        params = request.query_params
+        by = params.get('by', 'audio')
+        try:
+            since, until = query_date(params, 'since'), query_date(params, 'until')
+            limit = min(int(params.get('limit', 50)), 500)
+        except ValueError:
+            by = None
+        if by not in ANALYTICS_GROUPS:
+            return Response({'error': 'Expected by=audio|event, since/until=YYYY-MM-DD and a numeric limit'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Make this process's buffered plays visible
+        flush_plays()
+        rows = AudioPlayHourly.objects.all()
+        # Bounds on the raw column keep the hour index usable
+        if since:
+            rows = rows.filter(hour__gte=start_of_day(since))
+        if until:
+            rows = rows.filter(hour__lt=start_of_day(until + timedelta(days=1)))
+        totals = rows.aggregate(plays=Coalesce(Sum('plays'), 0), listened_seconds=Coalesce(Sum('listened_seconds'), 0))
+
+        id_field, title_field = ANALYTICS_GROUPS[by]
+        results = rows.filter(**{f"{id_field}__isnull": False}).values(id_field, title_field).annotate(
+            plays=Sum('plays'), listened_seconds=Sum('listened_seconds'),
+        ).order_by('-plays', id_field)[:limit]
+
         return Response({
-            'total_audios': total_audios,
-            'published_audios': published_audios,
-            'featured_audios': featured_audios,
-            'public_audios': public_audios,
-            'recent_uploads': recent_serializer.data
+            'by': by,
+            'since': since,
+            'until': until,
+            'totals': totals,
+            'results': [
+                {'id': row[id_field], 'title': row[title_field],
+                 'plays': row['plays'], 'listened_seconds': row['listened_seconds']}
+                for row in results
+            ],
         })
+
+
+class PublicSyncView(APIView):
+    """Published public audios and published events changed since ``?since=`` (see audios.sync)"""
+    permission_classes = [AllowAny]
+    throttle_scope = 'public_sync'
+
+    def get(self, request):
+        try:
+            data = sync_changes(request.query_params.get('since'), context={'request': request})
+        except SyncTokenExpired:
+            return Response({'error': 'Sync token expired, start over without since'}, status=status.HTTP_410_GONE)
+        except SyncTokenError:
+            return Response({'error': 'Invalid sync token'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+
+def stream_user(request):
+    """
+    User of a live stream: a JWT from ``?token=`` (EventSource cannot set
+    headers) or the Authorization header, else the session user
+    """
+    authenticator = JWTAuthentication()
+    token = request.GET.get('token')
+    if token:
+        return authenticator.get_user(authenticator.get_validated_token(token))
+    result = authenticator.authenticate(request)
+    if result:
+        return result[0]
+    return request.user if request.user.is_authenticated else None
+
+
+async def live_stream(user_id, upload_id=None, is_staff=False):
+    queue = live.broadcaster.subscribe()
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 15)
+    try:
+        yield f"retry: {getattr(settings, 'LIVE_RETRY_MS', 3000)}\n\n"
+        if upload_id:
+            current = await sync_to_async(live.get_upload_progress, thread_sensitive=False)(upload_id, user_id)
+            if current:
+                yield live.format_event({'type': 'upload', 'data': current})
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ': ping\n\n'
+                continue
+            if live.visible_to(event, user_id, is_staff):
+                yield live.format_event(event)
+    finally:
+        live.broadcaster.unsubscribe(queue)
+
+
+async def live_events(request):
+    """
+    Server-sent events of upload progress and audio/event changes for
+    dashboards (see audios.live); ``?upload=<X-Upload-ID>`` starts with that
+    upload's latest progress
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Live updates are only served by the ASGI application'}, status=501)
+    try:
+        user = await sync_to_async(stream_user)(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return JsonResponse({'error': 'Invalid or expired token'}, status=401)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided'}, status=401)
+    stream = live_stream(user.pk, request.GET.get('upload'), user.is_staff)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -3,6 +3,12 @@ ASGI config for backend_admin project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The API works under either WSGI or ASGI, but the live update stream
+(``/api/admin/live/``) holds a connection open per dashboard and is only
+served here, as the Dockerfile does with ``gunicorn -k
+uvicorn.workers.UvicornWorker backend_admin.asgi:application``. Under WSGI
+it answers 501.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,179 @@
+"""
+Batch requests.
+
+``POST /api/batch/`` takes ``{"requests": [{"method": "GET", "path":
+"/api/..."}, ...]}`` and answers ``{"responses": [{"status": ..., "headers":
+{...}, "body": ...}, ...]}`` in the same order, so the admin dashboard
+loads its statistics, lists and token check in one round trip.
+
+The batch request is authenticated once; each sub-request is dispatched
+straight to the view its path resolves to, with that user forced onto it
+(no second JWT decode or user lookup). Sub-requests keep their own
+permissions and throttles but skip middleware, which has already run for
+the batch, so they read from the primary database.
+
+Runs of consecutive GETs are dispatched concurrently on a process-wide
+pool of ``BATCH_WORKERS`` threads; any other method waits for the
+requests before it and blocks the ones after it, so a batch can read its
+own writes. Async views (live updates) and streaming responses (audio
+content, exports) cannot be batched.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Parts of the batch request's environ passed on to sub-requests. The
+# Authorization header is not: sub-requests are already authenticated.
+FORWARDED_META = (
+    'REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL', 'wsgi.url_scheme',
+    'HTTP_HOST', 'HTTP_X_FORWARDED_FOR', 'HTTP_X_FORWARDED_PROTO', 'HTTP_USER_AGENT', 'HTTP_ACCEPT_LANGUAGE',
+)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BATCH_WORKERS', 4),
+                    thread_name_prefix='api-batch',
+                )
+    return _executor
+
+
+def validate(payload):
+    """The list of sub-requests in ``payload``; raises ValueError with a message for the client"""
+    items = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError('requests must be a non-empty list')
+    limit = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+    if len(items) > limit:
+        raise ValueError(f'A batch can hold at most {limit} requests')
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            raise ValueError(f'requests[{index}] must be an object with a path')
+        item['method'] = str(item.get('method', 'GET')).upper()
+        if item['method'] not in METHODS:
+            raise ValueError(f"requests[{index}]: method must be one of {', '.join(METHODS)}")
+        path = urlsplit(item['path']).path
+        if not path.startswith('/api/') or path.rstrip('/') == '/api/batch':
+            raise ValueError(f'requests[{index}]: only /api/ endpoints other than /api/batch/ can be batched')
+    return items
+
+
+def build_request(parent, item):
+    """A plain HttpRequest for ``item``, authenticated as ``parent``'s user"""
+    url = urlsplit(item['path'])
+    request = HttpRequest()
+    request.method = item['method']
+    request.path = request.path_info = url.path
+    request.META = {key: parent.META[key] for key in FORWARDED_META if key in parent.META}
+    request.META.update(REQUEST_METHOD=item['method'], PATH_INFO=url.path, QUERY_STRING=url.query)
+    request.GET = QueryDict(url.query)
+    body = json.dumps(item['body']).encode() if item.get('body') is not None else b''
+    request.META.update(CONTENT_TYPE='application/json', CONTENT_LENGTH=str(len(body)))
+    request._body = body
+    request._stream = BytesIO(body)
+    request._read_started = False
+    request.user = parent.user
+    # Read by rest_framework.request.Request in place of its authenticators
+    request._force_auth_user = parent.user
+    request._force_auth_token = parent.auth
+    return request
+
+
+def dispatch(parent, item):
+    """Run one sub-request; returns its entry in the batch response"""
+    request = build_request(parent, item)
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return {'status': status.HTTP_404_NOT_FOUND, 'headers': {}, 'body': {'error': 'Not found'}}
+    request.resolver_match = match
+    if iscoroutinefunction(match.func) or getattr(match.func, 'view_is_async', False):
+        body = {'error': 'Async views cannot be batched'}
+        return {'status': status.HTTP_400_BAD_REQUEST, 'headers': {}, 'body': body}
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+        if response.streaming:
+            body = {'error': 'Streaming responses cannot be batched'}
+            return {'status': status.HTTP_400_BAD_REQUEST, 'headers': {}, 'body': body}
+        headers = {name: value for name, value in response.items() if name != 'Content-Type'}
+        if hasattr(response, 'data'):
+            # The batch response is rendered once; sub-responses are not rendered on their own
+            body = response.data
+        else:
+            content = response.content.decode(response.charset or 'utf-8', errors='replace')
+            try:
+                body = json.loads(content) if 'json' in response.get('Content-Type', '') else content
+            except ValueError:
+                body = content
+    except Exception:
+        logger.exception(f"Batch sub-request {item['method']} {item['path']} failed")
+        return {'status': status.HTTP_500_INTERNAL_SERVER_ERROR, 'headers': {}, 'body': {'error': 'Internal server error'}}
+    return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def _dispatch_in_thread(parent, item):
+    close_old_connections()
+    try:
+        return dispatch(parent, item)
+    finally:
+        close_old_connections()
+
+
+def run_batch(parent, items):
+    """Responses to ``items`` in order; consecutive GETs run concurrently"""
+    responses = [None] * len(items)
+    concurrent = getattr(settings, 'BATCH_WORKERS', 4) > 1
+
+    def run_reads(indexes):
+        if len(indexes) > 1 and concurrent:
+            futures = {index: get_executor().submit(_dispatch_in_thread, parent, items[index]) for index in indexes}
+            for index, future in futures.items():
+                responses[index] = future.result()
+        else:
+            for index in indexes:
+                responses[index] = dispatch(parent, items[index])
+
+    reads = []
+    for index, item in enumerate(items):
+        if item['method'] == 'GET':
+            reads.append(index)
+            continue
+        run_reads(reads)
+        reads = []
+        responses[index] = dispatch(parent, item)
+    run_reads(reads)
+    return responses
+
+
+class BatchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'batch'
+
+    def post(self, request):
+        try:
+            items = validate(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'responses': run_batch(request, items)})
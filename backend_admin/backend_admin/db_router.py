@@ -0,0 +1,90 @@
+"""
+Primary/replica database routing.
+
+Views opt in with ``use_read_replica = True``. For safe requests to those
+views ``ReplicaRoutingMiddleware`` flags the current context and
+``PrimaryReplicaRouter`` sends reads to ``settings.DATABASE_REPLICA_ALIAS``.
+Writes always go to the primary. A client that has just written is pinned
+to the primary for ``REPLICA_STICKY_SECONDS`` (cookie, plus a cache entry
+keyed by its Authorization header for token clients) so it reads its own
+writes.
+"""
+import hashlib
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_pin_primary'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_alias():
+    """Configured replica alias, or None when routing is disabled"""
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+    if alias and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same data
+        return True
+
+
+def _pin_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return 'db-pin:' + hashlib.sha1(authorization.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                _use_replica.reset(request._replica_token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_alias():
+            self.pin_to_primary(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if (
+            request.method in SAFE_METHODS
+            and getattr(view_class, 'use_read_replica', False)
+            and replica_alias()
+            and not self.is_pinned(request)
+        ):
+            request._replica_token = _use_replica.set(True)
+
+    def is_pinned(self, request):
+        if PIN_COOKIE in request.COOKIES:
+            return True
+        key = _pin_key(request)
+        return bool(key and cache.get(key))
+
+    def pin_to_primary(self, request, response):
+        seconds = settings.REPLICA_STICKY_SECONDS
+        response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+        key = _pin_key(request)
+        if key:
+            cache.set(key, True, seconds)
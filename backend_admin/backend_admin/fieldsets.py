@@ -0,0 +1,197 @@
+"""
+Sparse fieldsets.
+
+``?fields=id,title`` keeps only the named top-level fields of a response
+and ``?exclude=description,uploaded_by`` drops the named ones. Names are
+checked against the serializer's readable fields, so an unknown or
+write-only name is a 400 rather than being silently ignored.
+
+``SparseFieldsetMixin`` also trims the query behind the response: the
+queryset is limited with ``only()`` to the columns the remaining fields
+read, nested serializers of forward and one-to-one relations become the
+only ``select_related`` joins, and prefetches of dropped relations are
+skipped. Computed fields name the columns they read in their serializer's
+``FIELD_COLUMNS``; a field whose columns cannot be worked out leaves the
+columns unrestricted (joins and prefetches are still trimmed).
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, QuerySet
+from django.db.models.query import ModelIterable
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def split_names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def readable_fields(serializer):
+    return [name for name, field in serializer.fields.items() if not field.write_only]
+
+
+def requested_fields(params, allowed):
+    """
+    Field names to keep, in serializer order, or None when neither
+    ``fields`` nor ``exclude`` is given
+
+    Raises:
+        ValidationError: for names not in ``allowed``, or when nothing is left
+    """
+    fields, exclude = params.get('fields'), params.get('exclude')
+    if fields is None and exclude is None:
+        return None
+    keep = split_names(fields) if fields is not None else list(allowed)
+    drop = split_names(exclude or '')
+
+    errors = {}
+    for param, names in (('fields', keep), ('exclude', drop)):
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            errors[param] = f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}."
+    if errors:
+        raise ValidationError(errors)
+    names = [name for name in allowed if name in keep and name not in drop]
+    if not names:
+        raise ValidationError({'fields': 'At least one field must be left.'})
+    return names
+
+
+def item_serializer(serializer):
+    return serializer.child if isinstance(serializer, serializers.ListSerializer) else serializer
+
+
+def prune(serializer, names):
+    fields = item_serializer(serializer).fields
+    for name in list(fields):
+        if name not in names:
+            fields.pop(name)
+
+
+def column_plan(serializer, names, prefix=''):
+    """
+    What ``names`` of a model serializer read: ``(columns, joins, relations, attrs)``
+
+    ``columns`` are ``only()`` paths, ``joins`` ``select_related()`` paths,
+    ``relations`` the many-valued relations and ``attrs`` the top-level
+    attributes that are not model fields (``Prefetch`` ``to_attr`` names,
+    or properties). ``columns`` is None when some field's columns are
+    unknown.
+    """
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None:
+        return None, set(), set(), set()
+    computed = getattr(serializer, 'FIELD_COLUMNS', {})
+    columns, joins, relations, attrs = set(), set(), set(), set()
+    known = True
+
+    for name in names:
+        field = serializer.fields[name]
+        if name in computed:
+            columns.update(prefix + column for column in computed[name])
+            continue
+        if field.source == '*':
+            known = False
+            continue
+        attr = field.source.split('.')[0]
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            if prefix:
+                known = False
+            else:
+                attrs.add(attr)
+            continue
+        if model_field.many_to_many or model_field.one_to_many:
+            relations.add(prefix + attr)
+            continue
+        if model_field.concrete:
+            columns.add(prefix + attr)
+        if model_field.is_relation and isinstance(field, serializers.Serializer):
+            nested_columns, nested_joins, nested_relations, nested_attrs = column_plan(
+                field, readable_fields(field), f"{prefix}{attr}__",
+            )
+            joins.add(prefix + attr)
+            joins.update(nested_joins)
+            relations.update(nested_relations)
+            if nested_columns is None or nested_attrs:
+                known = False
+            else:
+                columns.update(nested_columns)
+        elif not model_field.concrete:
+            # Reverse one-to-one read without a nested serializer
+            known = False
+
+    return (columns if known else None), joins, relations, attrs
+
+
+def prefetch_to(lookup):
+    return lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+
+
+def restrict_queryset(queryset, serializer, names, required_columns=()):
+    """``queryset`` loading only what ``names`` of ``serializer`` read"""
+    if not isinstance(queryset, QuerySet) or queryset._iterable_class is not ModelIterable:
+        return queryset
+    columns, joins, relations, attrs = column_plan(item_serializer(serializer), names)
+    prefetches = [
+        lookup for lookup in queryset._prefetch_related_lookups
+        if prefetch_to(lookup).split('__')[0] in relations | attrs
+    ]
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if joins:
+        queryset = queryset.select_related(*joins)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+
+    # Attributes filled by a kept prefetch need no columns; anything else might
+    prefetched = {prefetch_to(lookup).split('__')[0] for lookup in prefetches}
+    if columns is not None and attrs <= prefetched:
+        queryset = queryset.only(*(columns | set(required_columns) or {'pk'}))
+    return queryset
+
+
+class SparseFieldsetMixin:
+    """
+    ``?fields=`` and ``?exclude=`` for generic views and viewsets.
+
+    Applies to GET requests of views and actions that serialize a queryset.
+    ``sparse_required_columns`` are loaded whatever fields are requested,
+    for views that read them outside the serializer.
+    """
+    sparse_required_columns = ()
+    sparse_actions = ('list', 'retrieve')
+
+    def is_sparse(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return False
+        params = self.request.query_params
+        return 'fields' in params or 'exclude' in params
+
+    def sparse_fields(self, serializer):
+        """Requested field names of ``serializer``, or None for all of them"""
+        if not self.is_sparse():
+            return None
+        return requested_fields(self.request.query_params, readable_fields(item_serializer(serializer)))
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        names = self.sparse_fields(serializer)
+        if names is not None:
+            prune(serializer, names)
+            instance = serializer.instance
+            if isinstance(instance, QuerySet) and instance._result_cache is None:
+                # Actions that pass their own queryset, e.g. featured or my_uploads
+                serializer.instance = restrict_queryset(instance, serializer, names, self.sparse_required_columns)
+        return serializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not self.is_sparse() or getattr(self, 'action', None) not in (None, *self.sparse_actions):
+            return queryset
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        names = self.sparse_fields(serializer)
+        if names is None:
+            return queryset
+        return restrict_queryset(queryset, serializer, names, self.sparse_required_columns)
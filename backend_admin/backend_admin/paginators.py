@@ -0,0 +1,46 @@
+"""
+Admin paginator that avoids COUNT(*) on large tables.
+
+An unfiltered changelist only needs a page count, so
+``EstimatedCountPaginator`` reads the row count the database already keeps
+in its table statistics (``information_schema.TABLES`` on MySQL,
+``pg_class`` on PostgreSQL). Filtered or searched changelists, small tables
+and databases without statistics (SQLite) still use an exact count.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+ESTIMATE_SQL = {
+    'mysql': (
+        "SELECT TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    ),
+    'postgresql': "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+}
+
+
+def estimated_row_count(model, using='default'):
+    """Row count of ``model``'s table from database statistics, or None"""
+    connection = connections[using]
+    sql = ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [model._meta.db_table])
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is not None and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000):
+                return estimate
+        return super().count
@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend_admin.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,27 +80,80 @@ WSGI_APPLICATION = 'backend_admin.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': os.environ['MYSQL_DATABASE'],
-        'USER': os.environ['MYSQL_USER'],
-        'PASSWORD': os.environ['MYSQL_PASSWORD'],
-        'HOST': os.environ['MYSQL_HOST'],
-        'PORT': os.environ.get('MYSQL_PORT', '3306'),
-        # Development setup (uncomment for local development)
-        # 'NAME': 'rkm_events_dashboard_new',
-        # 'USER': 'root',
-        # 'PASSWORD': '',
-        # 'HOST': 'localhost',
-        # 'PORT': '3306', 
-        'OPTIONS': {
-            'charset': 'utf8mb4',
-        } if not DEBUG else {
-            'unix_socket': '/Applications/XAMPP/xamppfiles/var/mysql/mysql.sock',
+DB_ENGINE = os.environ.get('DB_ENGINE', 'mysql')
+
+if DB_ENGINE == 'sqlite':
+    # Local stand-in: two SQLite files play primary and read replica.
+    # Nothing replicates between them; load the replica with
+    # `manage.py migrate --database replica` plus fixtures when needed.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db_replica.sqlite3',
         },
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.environ['MYSQL_DATABASE'],
+            'USER': os.environ['MYSQL_USER'],
+            'PASSWORD': os.environ['MYSQL_PASSWORD'],
+            'HOST': os.environ['MYSQL_HOST'],
+            'PORT': os.environ.get('MYSQL_PORT', '3306'),
+            # Development setup (uncomment for local development)
+            # 'NAME': 'rkm_events_dashboard_new',
+            # 'USER': 'root',
+            # 'PASSWORD': '',
+            # 'HOST': 'localhost',
+            # 'PORT': '3306', 
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+            } if not DEBUG else {
+                'unix_socket': '/Applications/XAMPP/xamppfiles/var/mysql/mysql.sock',
+            },
+        }
+    }
+    if os.environ.get('MYSQL_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ['MYSQL_REPLICA_HOST'],
+            'PORT': os.environ.get('MYSQL_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# Persistent connections, checked before reuse so a dropped connection
+# is replaced instead of failing the request
+for _database in DATABASES.values():
+    _database['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+    _database['CONN_HEALTH_CHECKS'] = True
+
+DATABASE_ROUTERS = ['backend_admin.db_router.PrimaryReplicaRouter']
+
+# Alias that safe reads of public views are sent to; empty disables routing.
+# Defaults to 'replica' when a MySQL replica host is configured.
+DATABASE_REPLICA_ALIAS = os.environ.get(
+    'DATABASE_REPLICA_ALIAS', 'replica' if os.environ.get('MYSQL_REPLICA_HOST') else ''
+)
+
+# After a successful write, the client reads from the primary for this many
+# seconds so it sees its own changes despite replication lag
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Cache shared by every worker process: throttle buckets, single-flight
+# entries and the live event bus (see audios.live) only work across workers
+# through it. REDIS_URL (e.g. redis://redis:6379/0) selects Redis; without
+# it each process has its own local-memory cache, which is only enough for
+# development and a single worker.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
 
 
 # Password validation
@@ -138,6 +192,25 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Where audio files are stored: audios.storage.B2Storage (production),
+# LocalStorage (files under MEDIA_ROOT/audios) or MemoryStorage (tests)
+AUDIO_STORAGE_BACKEND = os.environ.get('AUDIO_STORAGE_BACKEND', 'audios.storage.B2Storage')
+AUDIO_STORAGE_OPTIONS = {}
+if AUDIO_STORAGE_BACKEND == 'audios.tiering.TieredStorage':
+    # Recent and frequently played audio on a local volume, everything in the cold backend
+    AUDIO_STORAGE_OPTIONS = {
+        'cold': os.environ.get('AUDIO_COLD_STORAGE_BACKEND', 'audios.storage.B2Storage'),
+        'hot_location': os.environ.get('AUDIO_HOT_TIER_LOCATION') or None,
+        'capacity_bytes': int(os.environ.get('AUDIO_HOT_TIER_BYTES', 10 * 1024 ** 3)),
+        'promote_score': float(os.environ.get('AUDIO_HOT_PROMOTE_SCORE', 3)),
+        'demote_score': float(os.environ.get('AUDIO_HOT_DEMOTE_SCORE', 0.5)),
+        'half_life_hours': float(os.environ.get('AUDIO_HOT_HALF_LIFE_HOURS', 72)),
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -154,6 +227,13 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    # Views opt in with throttle_scope; rates are in THROTTLE_RATES below
+    'DEFAULT_THROTTLE_CLASSES': [
+        'backend_admin.throttling.ScopedTokenBucketThrottle',
+    ],
+    # Reverse proxies in front of the app; throttles take the client IP from
+    # X-Forwarded-For only that many hops back, and from REMOTE_ADDR with 0
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': [
@@ -228,3 +308,101 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Throttling (backend_admin/throttling.py): token buckets per client IP, or
+# per user when authenticated, kept in the THROTTLE_CACHE cache. Use a
+# cache shared by all workers (memcached, Redis) in production.
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', 'True') == 'True'
+THROTTLE_CACHE = 'default'
+THROTTLE_RATES = {
+    'login': os.environ.get('THROTTLE_LOGIN_RATE', '20/min'),
+    'token_refresh': '30/min',
+    'public_audios': os.environ.get('THROTTLE_PUBLIC_RATE', '600/min'),
+    'public_events': os.environ.get('THROTTLE_PUBLIC_RATE', '600/min'),
+    'public_sync': os.environ.get('THROTTLE_PUBLIC_RATE', '600/min'),
+    'batch': '120/min',
+    'export': '10/min',
+}
+# Failed logins per username and client IP: 5 at once, then one more every
+# 3 minutes
+LOGIN_FAILURE_RATE = '5/15m'
+
+# Admin changelists of tables with at least this many rows (by table
+# statistics) show an estimated total instead of running COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Share of user list requests logged at DEBUG level (logger "user.views")
+USER_LIST_LOG_SAMPLE_RATE = float(os.environ.get('USER_LIST_LOG_SAMPLE_RATE', 0.01))
+
+# Recurring events
+# How far ahead ?upcoming=true expands recurring series, and how long an
+# expanded (series, window) stays cached
+EVENT_RECURRENCE_HORIZON_DAYS = 365
+EVENT_OCCURRENCE_CACHE_TIMEOUT = 60 * 60
+
+# Threads for fire-and-forget work such as deleting B2 objects of deleted audios
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 2))
+
+# /api/batch/: most sub-requests per batch, and threads running a batch's
+# GETs concurrently (1 runs them one after another)
+BATCH_MAX_REQUESTS = 20
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 4))
+
+# Play analytics: each process buffers play counts and adds them to the
+# hourly rollup at most every PLAY_FLUSH_INTERVAL seconds (or sooner once
+# PLAY_BUFFER_MAX_KEYS audio/hour pairs are buffered)
+PLAY_FLUSH_INTERVAL = int(os.environ.get('PLAY_FLUSH_INTERVAL', 10))
+PLAY_BUFFER_MAX_KEYS = 5000
+
+# Trending and popular lists, rebuilt by `manage.py build_rankings` (run it
+# every few minutes): how many audios each list keeps, and how fast a play's
+# weight in trending halves
+RANKING_TOP_K = 50
+RANKING_HALF_LIFE_HOURS = 48
+RANKING_WINDOW_DAYS = 30
+
+# Related audios, rebuilt by `manage.py build_related` (nightly, plus
+# --incremental after publishing): neighbours kept per audio, and audios
+# compared per block (memory is about block size x catalogue x 8 bytes)
+RELATED_TOP_K = 10
+RELATED_BLOCK_SIZE = 256
+
+# Delta sync (/api/public/sync/): rows per model per response, how far
+# behind now a response stops so late-committing transactions are not
+# skipped, and how long deletions are kept. `manage.py compact_sync_log`
+# (daily) drops older tombstones; sync tokens older than that get a 410.
+SYNC_PAGE_SIZE = 500
+SYNC_SETTLE_SECONDS = 5
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# Live updates (/api/admin/live/, ASGI only; see audios.live). Events live
+# in the default cache, so set REDIS_URL for dashboards to see changes made
+# by other workers.
+LIVE_POLL_INTERVAL = float(os.environ.get('LIVE_POLL_INTERVAL', 1.0))
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_EVENT_TTL = 120
+LIVE_QUEUE_SIZE = 100
+LIVE_RETRY_MS = 3000
+UPLOAD_PROGRESS_INTERVAL = 0.5
+
+# Static JSON snapshots of the public catalogue (see audios.snapshots):
+# `manage.py publish_snapshots` writes them to SNAPSHOT_STORAGE_BACKEND,
+# built with SNAPSHOT_STORAGE_OPTIONS (MEDIA_ROOT/snapshots for the default
+# LocalStorage). With SNAPSHOT_ON_CHANGE they are also republished after
+# every audio or event change. The .br copies are written with brotli
+# (requirements.txt); an install without it skips them.
+SNAPSHOT_STORAGE_BACKEND = os.environ.get('SNAPSHOT_STORAGE_BACKEND', 'audios.storage.LocalStorage')
+SNAPSHOT_PAGE_SIZE = 100
+SNAPSHOT_ON_CHANGE = os.environ.get('SNAPSHOT_ON_CHANGE', 'False') == 'True'
+
+# Single-flight response caching (see backend_admin.singleflight): public
+# featured and search responses and the admin statistics stay fresh for
+# these many seconds, then are served stale for CACHE_STALE_SECONDS while
+# one worker recomputes them. Any audio change marks them stale at once.
+PUBLIC_CACHE_SECONDS = 60
+STATISTICS_CACHE_SECONDS = 30
+CACHE_STALE_SECONDS = 300
+SINGLE_FLIGHT_WAIT_SECONDS = 10
+
+# Streaming exports (?as=csv|ndjson, see backend_admin.exports): rows read
+# per query
+EXPORT_CHUNK_SIZE = 2000
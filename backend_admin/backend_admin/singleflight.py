@@ -0,0 +1,137 @@
+"""
+Single-flight caching for expensive computations.
+
+``cached(group, key, compute)`` returns the cached value of ``compute()``
+and makes sure that when the entry is missing or out of date only one
+caller recomputes it:
+
+- within a process, callers of the same entry share one computation: the
+  first runs ``compute`` and the others wait for its result;
+- across processes, the computing process holds ``<entry>:lock`` in the
+  shared cache (``cache.add``); others wait for the entry to appear, for up
+  to ``SINGLE_FLIGHT_WAIT_SECONDS``, then compute it themselves.
+
+An entry is fresh for ``timeout`` seconds and then kept ``stale`` seconds
+longer. While a stale entry is being recomputed, every other caller gets
+the stale value straight away (stale-while-revalidate), so only a cold
+cache makes anyone wait.
+
+``expire(group)`` marks every entry of a group stale, e.g. after a write,
+by bumping the group's generation; entries are not deleted, so the next
+refresh is coalesced like any other.
+"""
+import threading
+import time
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import cache
+
+POLL_SECONDS = 0.05
+
+
+class _Flight:
+    """One in-process computation of an entry, shared by every caller"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def generation_key(group):
+    return f"singleflight:{group}:generation"
+
+
+def request_key(name, request):
+    """Entry key of ``name`` for ``request``'s URL, host and query string included"""
+    return f"{name}:{sha1(request.build_absolute_uri().encode()).hexdigest()}"
+
+
+def expire(group):
+    """Mark every entry of ``group`` stale"""
+    key = generation_key(group)
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+def _join(entry_key):
+    """The running flight of ``entry_key`` and whether the caller leads it"""
+    with _flights_lock:
+        flight = _flights.get(entry_key)
+        if flight is not None:
+            return flight, False
+        flight = _flights[entry_key] = _Flight()
+        return flight, True
+
+
+def _wait_for_other_process(entry_key, lock_key):
+    """Entry stored by the process holding ``lock_key``, or None if it gave up or took too long"""
+    deadline = time.monotonic() + getattr(settings, 'SINGLE_FLIGHT_WAIT_SECONDS', 10)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(entry_key)
+        if entry is not None:
+            return entry
+        if cache.get(lock_key) is None:
+            return None
+    return None
+
+
+def _lead(entry_key, compute, entry, generation, timeout, stale):
+    lock_key = f"{entry_key}:lock"
+    locked = cache.add(lock_key, True, getattr(settings, 'SINGLE_FLIGHT_WAIT_SECONDS', 10))
+    if not locked:
+        if entry is not None:
+            return entry[0]
+        entry = _wait_for_other_process(entry_key, lock_key)
+        if entry is not None:
+            return entry[0]
+    try:
+        value = compute()
+        cache.set(entry_key, (value, time.time() + timeout, generation), timeout + stale)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def cached(group, key, compute, timeout=60, stale=300):
+    """
+    ``compute()`` cached as entry ``key`` of ``group``, computed once at a time
+
+    Args:
+        group: Entries expired together by ``expire(group)``
+        key: Entry within the group, e.g. from ``request_key``
+        compute: Callable returning a picklable value
+        timeout: Seconds the value is fresh
+        stale: Seconds a value past ``timeout`` is still served while it is recomputed
+    """
+    entry_key = f"singleflight:{group}:{key}"
+    found = cache.get_many([entry_key, generation_key(group)])
+    entry, generation = found.get(entry_key), found.get(generation_key(group), 0)
+    if entry is not None and entry[1] > time.time() and entry[2] == generation:
+        return entry[0]
+
+    flight, leader = _join(entry_key)
+    if not leader:
+        if entry is not None:
+            return entry[0]
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+    try:
+        flight.value = _lead(entry_key, compute, entry, generation, timeout, stale)
+        return flight.value
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[entry_key]
+        flight.done.set()
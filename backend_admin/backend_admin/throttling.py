@@ -0,0 +1,159 @@
+"""
+Token-bucket throttling.
+
+Buckets live in the ``THROTTLE_CACHE`` cache alias (``default`` unless
+set): local memory per process in development, memcached or Redis shared
+by every worker in production. A bucket is one cache entry holding
+``(tokens, updated)``. Reads and writes are not atomic across processes,
+so a burst racing on one key can slip a few extra requests through; that
+is acceptable for throttling and keeps a check to one get and one set.
+
+Rates use DRF's notation plus an optional period multiplier, e.g.
+``'600/min'``, ``'5/15m'`` or ``'1000/day'``. The number is the bucket
+size (the burst allowed) and the bucket refills evenly over the period.
+
+Views opt in with ``throttle_scope``, which names a rate in
+``THROTTLE_RATES``; ``ScopedTokenBucketThrottle`` is installed as the
+default throttle class. Login additionally keeps a bucket of failed
+attempts per username and client IP that is checked before the password
+hasher runs; keyed by username alone, anyone could lock an account out.
+
+Client IPs come from DRF's ``get_ident``: ``REMOTE_ADDR``, or with
+``REST_FRAMEWORK['NUM_PROXIES']`` set, the address that many proxies back
+in ``X-Forwarded-For``. A client-supplied header is never trusted beyond
+that.
+"""
+import hashlib
+import re
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+RATE = re.compile(r'^(\d+)/(\d*)([smhd])')
+
+
+def parse_rate(rate):
+    """``'600/min'`` -> ``(600, 60)``: bucket size and seconds to refill it"""
+    match = RATE.match(rate or '')
+    if not match:
+        raise ImproperlyConfigured(f"Invalid throttle rate {rate!r}, expected e.g. '600/min' or '5/15m'")
+    capacity, multiplier, unit = match.groups()
+    return int(capacity), int(multiplier or 1) * PERIODS[unit]
+
+
+def throttle_cache():
+    return caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+
+class TokenBucket:
+    """Buckets of one rate; each key is an independent bucket"""
+
+    def __init__(self, rate):
+        self.capacity, self.period = parse_rate(rate)
+        self.refill = self.capacity / self.period
+
+    def _refilled(self, state, now):
+        if state is None:
+            return self.capacity
+        tokens, updated = state
+        return min(self.capacity, tokens + (now - updated) * self.refill)
+
+    def tokens(self, key, now=None):
+        """Tokens currently in the bucket"""
+        return self._refilled(throttle_cache().get(key), now or time.time())
+
+    def wait(self, key, cost=1, now=None):
+        """Seconds until ``cost`` tokens are available, without taking them"""
+        missing = cost - self.tokens(key, now)
+        return missing / self.refill if missing > 0 else 0.0
+
+    def take(self, key, cost=1, now=None):
+        """Take ``cost`` tokens; returns 0.0, or the seconds to wait when the bucket is short"""
+        now = now or time.time()
+        cache = throttle_cache()
+        tokens = self._refilled(cache.get(key), now)
+        if tokens < cost:
+            return (cost - tokens) / self.refill
+        # An expired entry is a full bucket, so keep it only as long as a refill takes
+        cache.set(key, (tokens - cost, now), int(self.period) + 1)
+        return 0.0
+
+
+@lru_cache(maxsize=None)
+def bucket(rate):
+    return TokenBucket(rate)
+
+
+def throttling_enabled():
+    return getattr(settings, 'THROTTLE_ENABLED', True)
+
+
+class ScopedTokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket named by the view's ``throttle_scope`` (or ``scope`` on a
+    subclass), per user when authenticated and per client IP otherwise.
+    Views without a scope or rate are not throttled.
+    """
+    scope = None
+
+    def get_rate(self, view):
+        scope = getattr(view, 'throttle_scope', None) or self.scope
+        return scope, getattr(settings, 'THROTTLE_RATES', {}).get(scope)
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        if not throttling_enabled():
+            return True
+        scope, rate = self.get_rate(view)
+        if not rate:
+            return True
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            ident = f"user:{user.pk}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+        self.wait_seconds = bucket(rate).take(f"throttle:{scope}:{ident}")
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginRateThrottle(ScopedTokenBucketThrottle):
+    """Every login attempt, per client IP"""
+    scope = 'login'
+
+
+class TokenRefreshRateThrottle(ScopedTokenBucketThrottle):
+    scope = 'token_refresh'
+
+
+def _login_failure_key(request, username):
+    ident = BaseThrottle().get_ident(request)
+    digest = hashlib.sha1(f"{username.strip().casefold()}\n{ident}".encode()).hexdigest()
+    return f"throttle:login-failures:{digest}"
+
+
+def login_failure_bucket():
+    return bucket(getattr(settings, 'LOGIN_FAILURE_RATE', '5/15m'))
+
+
+def login_backoff(request, username):
+    """Seconds the client must wait before its next password check for ``username``, or 0.0"""
+    if not throttling_enabled():
+        return 0.0
+    return login_failure_bucket().wait(_login_failure_key(request, username))
+
+
+def record_login_failure(request, username):
+    if throttling_enabled():
+        login_failure_bucket().take(_login_failure_key(request, username))
+
+
+def reset_login_failures(request, username):
+    throttle_cache().delete(_login_failure_key(request, username))
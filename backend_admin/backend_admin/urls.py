@@ -22,6 +22,8 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from .batch import BatchView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/user/',include('user.urls')),
@@ -29,4 +31,5 @@ urlpatterns = [
     path('api/', include('audios.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/batch/', BatchView.as_view(), name='batch'),
 ]
@@ -1,11 +1,22 @@
 from django.contrib import admin
-from .models import Events
+from backend_admin.paginators import EstimatedCountPaginator
+from .models import Events, EventRecurrence, EventOccurrenceException
 # Register your models here.
+class EventRecurrenceInline(admin.StackedInline):
+    model = EventRecurrence
+    extra = 0
+    max_num = 1
+
 @admin.register(Events)
 class EventsAdmin(admin.ModelAdmin):
+    inlines = [EventRecurrenceInline]
     list_display = ('title', 'description', 'get_date_range', 'author', 'time', 'published')
-    list_filter = ('published', 'created_at', 'author', 'start_date', 'end_date')
-    search_fields = ('title', 'description')
+    # author is free text, so its filter would scan every distinct value;
+    # it is searchable instead
+    list_filter = ('published', 'created_at', 'start_date', 'end_date')
+    search_fields = ('title', 'description', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     prepopulated_fields = {'slug': ('title',)}
     fieldsets = (
         ('Basic Information', {
@@ -21,5 +32,16 @@ class EventsAdmin(admin.ModelAdmin):
     )
     
     def get_date_range(self, obj):
-        return obj.get_date_range_display()
-    get_date_range.short_description = 'Date Range'
\ No newline at end of file
+        return obj.date_display
+    get_date_range.short_description = 'Date Range'
+
+class EventOccurrenceExceptionInline(admin.TabularInline):
+    model = EventOccurrenceException
+    extra = 0
+
+@admin.register(EventRecurrence)
+class EventRecurrenceAdmin(admin.ModelAdmin):
+    list_display = ('event', 'frequency', 'interval', 'by_weekday', 'until', 'count')
+    list_select_related = ('event',)
+    autocomplete_fields = ('event',)
+    inlines = [EventOccurrenceExceptionInline]
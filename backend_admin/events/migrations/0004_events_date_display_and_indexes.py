@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+# Copies of events.models.get_ordinal_suffix and format_date_range as they
+# were when this migration was written, so later changes to them do not
+# change what it backfills
+def ordinal(day):
+    if 10 <= day % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f"{day}{suffix}"
+
+
+def format_date_range(start_date, end_date, date=None):
+    if start_date and end_date:
+        start_month = start_date.strftime('%B')
+        end_month = end_date.strftime('%B')
+        start_ordinal = ordinal(start_date.day)
+        end_ordinal = ordinal(end_date.day)
+        if start_date.year == end_date.year:
+            if start_month == end_month:
+                return f"{start_ordinal} to {end_ordinal} {start_month} {start_date.year}"
+            return f"{start_ordinal} {start_month} to {end_ordinal} {end_month} {start_date.year}"
+        return f"{start_ordinal} {start_month} {start_date.year} to {end_ordinal} {end_month} {end_date.year}"
+    elif date:
+        return date
+    return "No date specified"
+
+
+def backfill_date_display(apps, schema_editor):
+    Events = apps.get_model('events', 'Events')
+    batch = []
+    for event in Events.objects.only('id', 'start_date', 'end_date', 'date').iterator(chunk_size=1000):
+        event.date_display = format_date_range(event.start_date, event.end_date, event.date)
+        batch.append(event)
+        if len(batch) >= 1000:
+            Events.objects.bulk_update(batch, ['date_display'])
+            batch = []
+    if batch:
+        Events.objects.bulk_update(batch, ['date_display'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_alter_events_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='events',
+            name='date_display',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Precomputed date range display, updated on save', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='events',
+            name='end_date',
+            field=models.DateField(blank=True, db_index=True, help_text='End date of the event', null=True),
+        ),
+        migrations.AlterField(
+            model_name='events',
+            name='start_date',
+            field=models.DateField(blank=True, db_index=True, help_text='Start date of the event', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='events',
+            index=models.Index(fields=['published', 'start_date'], name='events_pub_start_idx'),
+        ),
+        migrations.RunPython(backfill_date_display, migrations.RunPython.noop),
+    ]
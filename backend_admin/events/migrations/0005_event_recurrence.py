@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_events_date_display_and_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRecurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='weekly', max_length=10)),
+                ('interval', models.PositiveIntegerField(default=1, help_text='Repeat every N days/weeks/months')),
+                ('by_weekday', models.CharField(blank=True, default='', help_text='Weekly only: comma separated days, e.g. SU,WE', max_length=20)),
+                ('until', models.DateField(blank=True, help_text='Last possible occurrence date', null=True)),
+                ('count', models.PositiveIntegerField(blank=True, help_text='Total number of occurrences', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence', to='events.events')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EventOccurrenceException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_date', models.DateField(help_text='Date the occurrence would normally start')),
+                ('is_cancelled', models.BooleanField(default=False)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('time', models.TimeField(blank=True, null=True)),
+                ('title', models.CharField(blank=True, max_length=200, null=True)),
+                ('location', models.CharField(blank=True, max_length=200, null=True)),
+                ('recurrence', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='events.eventrecurrence')),
+            ],
+            options={
+                'ordering': ['original_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='eventrecurrence',
+            index=models.Index(fields=['until'], name='events_recurrence_until_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='eventoccurrenceexception',
+            constraint=models.UniqueConstraint(fields=('recurrence', 'original_date'), name='unique_occurrence_exception'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_recurrence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='events',
+            index=models.Index(fields=['created_at'], name='events_created_idx'),
+        ),
+    ]
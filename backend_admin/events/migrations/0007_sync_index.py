@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-19 18:49
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Now
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Delta sync orders events by updated_at; rows from before auto_now have none
+    Events = apps.get_model('events', 'Events')
+    Events.objects.filter(updated_at__isnull=True).update(updated_at=Coalesce('created_at', Now()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='events',
+            index=models.Index(fields=['updated_at', 'id'], name='events_updated_idx'),
+        ),
+    ]
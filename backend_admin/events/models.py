@@ -1,13 +1,45 @@
 from django.db import models
 
+
+def get_ordinal_suffix(day):
+    """Return the day with its ordinal suffix, e.g. 1st, 22nd, 13th"""
+    if 10 <= day % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f"{day}{suffix}"
+
+
+def format_date_range(start_date, end_date, date=None):
+    """Returns formatted date range like '20th July to 30th Sept 2025'"""
+    if start_date and end_date:
+        start_month = start_date.strftime('%B')
+        end_month = end_date.strftime('%B')
+        start_ordinal = get_ordinal_suffix(start_date.day)
+        end_ordinal = get_ordinal_suffix(end_date.day)
+
+        if start_date.year == end_date.year:
+            if start_month == end_month:
+                return f"{start_ordinal} to {end_ordinal} {start_month} {start_date.year}"
+            else:
+                return f"{start_ordinal} {start_month} to {end_ordinal} {end_month} {start_date.year}"
+        else:
+            return f"{start_ordinal} {start_month} {start_date.year} to {end_ordinal} {end_month} {end_date.year}"
+    elif date:
+        # If date field contains a formatted string, return it directly
+        return date
+    return "No date specified"
+
+
 # Create your models here.
 class Events(models.Model):
     title = models.CharField(max_length=200,null=True,blank=True)
     description = models.TextField(null=True,blank=True)
     location = models.CharField(max_length=200,null=True,blank=True)
     date = models.CharField(max_length=200,null=True,blank=True, help_text="Formatted date string or date range")
-    start_date = models.DateField(null=True,blank=True, help_text="Start date of the event")
-    end_date = models.DateField(null=True,blank=True, help_text="End date of the event")
+    start_date = models.DateField(null=True,blank=True, db_index=True, help_text="Start date of the event")
+    end_date = models.DateField(null=True,blank=True, db_index=True, help_text="End date of the event")
+    date_display = models.CharField(max_length=200, blank=True, default='', editable=False, help_text="Precomputed date range display, updated on save")
     author = models.CharField(max_length=200,null=True,blank=True)
     time = models.TimeField(null=True,blank=True)
     image_url = models.URLField(null=True,blank=True)
@@ -18,40 +50,95 @@ class Events(models.Model):
 
     class Meta:
         ordering = ['-start_date', '-date']
+        indexes = [
+            models.Index(fields=['published', 'start_date'], name='events_pub_start_idx'),
+            models.Index(fields=['created_at'], name='events_created_idx'),
+            # Delta sync cursor (see audios.sync)
+            models.Index(fields=['updated_at', 'id'], name='events_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
-    
+
+    def save(self, *args, **kwargs):
+        self.date_display = self.get_date_range_display()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'date_display' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['date_display']
+        super().save(*args, **kwargs)
+
     def get_date_range_display(self):
         """Returns formatted date range like '20th July to 30th Sept 2025'"""
-        if self.start_date and self.end_date:
-            start_day = self.start_date.day
-            start_month = self.start_date.strftime('%B')
-            start_year = self.start_date.year
-            
-            end_day = self.end_date.day
-            end_month = self.end_date.strftime('%B')
-            end_year = self.end_date.year
-            
-            # Add ordinal suffix to days
-            def get_ordinal_suffix(day):
-                if 10 <= day % 100 <= 20:
-                    suffix = 'th'
-                else:
-                    suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
-                return f"{day}{suffix}"
-            
-            start_ordinal = get_ordinal_suffix(start_day)
-            end_ordinal = get_ordinal_suffix(end_day)
-            
-            if start_year == end_year:
-                if start_month == end_month:
-                    return f"{start_ordinal} to {end_ordinal} {start_month} {start_year}"
-                else:
-                    return f"{start_ordinal} {start_month} to {end_ordinal} {end_month} {start_year}"
-            else:
-                return f"{start_ordinal} {start_month} {start_year} to {end_ordinal} {end_month} {end_year}"
-        elif self.date:
-            # If date field contains a formatted string, return it directly
-            return self.date
-        return "No date specified"
\ No newline at end of file
+        return format_date_range(self.start_date, self.end_date, self.date)
+
+
+class EventRecurrence(models.Model):
+    """RRULE-style repeat rule; the parent event is the first occurrence"""
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    FREQUENCIES = [
+        (DAILY, 'Daily'),
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+    ]
+    WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+    event = models.OneToOneField(Events, on_delete=models.CASCADE, related_name='recurrence')
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES, default=WEEKLY)
+    interval = models.PositiveIntegerField(default=1, help_text="Repeat every N days/weeks/months")
+    by_weekday = models.CharField(max_length=20, blank=True, default='', help_text="Weekly only: comma separated days, e.g. SU,WE")
+    until = models.DateField(null=True, blank=True, help_text="Last possible occurrence date")
+    count = models.PositiveIntegerField(null=True, blank=True, help_text="Total number of occurrences")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['until'], name='events_recurrence_until_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} ({self.get_frequency_display()})"
+
+    @property
+    def weekdays(self):
+        """Weekday numbers (Monday=0) for weekly rules"""
+        days = [self.WEEKDAYS.index(day.strip().upper()) for day in self.by_weekday.split(',') if day.strip()]
+        return sorted(set(days))
+
+    @property
+    def version(self):
+        """Changes whenever the rule or one of its exceptions is saved"""
+        return int(self.updated_at.timestamp() * 1_000_000) if self.updated_at else 0
+
+
+class EventOccurrenceException(models.Model):
+    """Cancels or overrides a single occurrence of a recurring event"""
+    recurrence = models.ForeignKey(EventRecurrence, on_delete=models.CASCADE, related_name='exceptions')
+    original_date = models.DateField(help_text="Date the occurrence would normally start")
+    is_cancelled = models.BooleanField(default=False)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    time = models.TimeField(null=True, blank=True)
+    title = models.CharField(max_length=200, null=True, blank=True)
+    location = models.CharField(max_length=200, null=True, blank=True)
+
+    class Meta:
+        ordering = ['original_date']
+        constraints = [
+            models.UniqueConstraint(fields=['recurrence', 'original_date'], name='unique_occurrence_exception'),
+        ]
+
+    def __str__(self):
+        return f"{self.recurrence.event} on {self.original_date}"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Bump the rule's version so cached expansions are discarded
+        self.recurrence.save(update_fields=['updated_at'])
+
+    def delete(self, *args, **kwargs):
+        recurrence = self.recurrence
+        result = super().delete(*args, **kwargs)
+        recurrence.save(update_fields=['updated_at'])
+        return result
@@ -0,0 +1,253 @@
+"""
+Lazy expansion of recurring events.
+
+Occurrences are never stored. ``iter_occurrence_dates`` is an unbounded
+generator that skips straight to the requested window, ``get_occurrences``
+materializes (and caches) only the occurrences that overlap a window, and
+``merge_occurrences`` interleaves them with concrete events in date order.
+``MergedWindow`` pages through that merge without building all of it.
+"""
+import heapq
+from itertools import islice
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import EventRecurrence, format_date_range, get_ordinal_suffix
+
+OVERRIDE_FIELDS = ('time', 'title', 'location')
+
+
+@dataclass(frozen=True)
+class Occurrence:
+    original_date: date
+    start_date: date
+    end_date: date = None
+    overrides: dict = field(default_factory=dict)
+
+
+def _daily(rule, first, not_before):
+    interval = max(rule.interval, 1)
+    step = 0
+    if not_before and not_before > first:
+        step = (not_before - first).days // interval
+    while True:
+        try:
+            current = first + timedelta(days=step * interval)
+        except OverflowError:
+            # Past date.max
+            return
+        yield step, current
+        step += 1
+
+
+def _weekly(rule, first, not_before):
+    interval = max(rule.interval, 1)
+    weekdays = rule.weekdays or [first.weekday()]
+    week0 = first - timedelta(days=first.weekday())
+    in_first_week = sum(1 for day in weekdays if week0 + timedelta(days=day) >= first)
+
+    period = 0
+    if not_before and not_before > first:
+        period = (not_before - week0).days // 7 // interval
+    index = 0 if period == 0 else in_first_week + (period - 1) * len(weekdays)
+    while True:
+        for day in weekdays:
+            try:
+                current = week0 + timedelta(weeks=period * interval, days=day)
+            except OverflowError:
+                return
+            if current < first:
+                continue
+            yield index, current
+            index += 1
+        period += 1
+
+
+def _monthly(rule, first, not_before):
+    interval = max(rule.interval, 1)
+    step = 0
+    # Months without the start day are skipped (RFC 5545), so the index can
+    # only be derived arithmetically when no occurrence count applies
+    if not_before and not_before > first and rule.count is None:
+        months = (not_before.year - first.year) * 12 + not_before.month - first.month
+        step = max(months // interval, 0)
+    index = step
+    while True:
+        total = first.month - 1 + step * interval
+        step += 1
+        if first.year + total // 12 > date.max.year:
+            return
+        try:
+            current = date(first.year + total // 12, total % 12 + 1, first.day)
+        except ValueError:
+            continue
+        yield index, current
+        index += 1
+
+
+EXPANDERS = {
+    EventRecurrence.DAILY: _daily,
+    EventRecurrence.WEEKLY: _weekly,
+    EventRecurrence.MONTHLY: _monthly,
+}
+
+
+def iter_occurrence_dates(rule, first, not_before=None):
+    """
+    Yield occurrence start dates of ``rule`` in order, beginning at ``first``.
+
+    Dates before ``not_before`` may be skipped without being generated.
+    The generator is unbounded unless the rule has ``until`` or ``count``.
+    """
+    for index, current in EXPANDERS[rule.frequency](rule, first, not_before):
+        if rule.count is not None and index >= rule.count:
+            return
+        if rule.until and current > rule.until:
+            return
+        yield current
+
+
+def _end_of(start, duration):
+    try:
+        return start + duration
+    except OverflowError:
+        return date.max
+
+
+def expand_occurrences(rule, window_start, window_end):
+    """Yield occurrences of ``rule`` overlapping [window_start, window_end]"""
+    event = rule.event
+    if not event.start_date:
+        return
+    duration = (event.end_date - event.start_date) if event.end_date else timedelta(0)
+    exceptions = {exception.original_date: exception for exception in rule.exceptions.all()}
+
+    try:
+        not_before = window_start - duration
+    except OverflowError:
+        not_before = date.min
+    for start in iter_occurrence_dates(rule, event.start_date, not_before=not_before):
+        if start > window_end:
+            return
+        end = _end_of(start, duration) if event.end_date else None
+        overrides = {}
+        exception = exceptions.get(start)
+        if exception:
+            if exception.is_cancelled:
+                continue
+            if exception.start_date:
+                start, end = exception.start_date, exception.end_date or _end_of(exception.start_date, duration)
+            overrides = {
+                name: getattr(exception, name)
+                for name in OVERRIDE_FIELDS if getattr(exception, name) is not None
+            }
+        if start <= window_end and (end or start) >= window_start:
+            yield Occurrence(original_date=exception.original_date if exception else start,
+                             start_date=start, end_date=end, overrides=overrides)
+
+
+def get_occurrences(rule, window_start, window_end):
+    """Cached, sorted list of the occurrences of ``rule`` in a window"""
+    event_version = int(rule.event.updated_at.timestamp() * 1_000_000) if rule.event.updated_at else 0
+    key = f"events:occurrences:{rule.pk}:{rule.version}:{event_version}:{window_start}:{window_end}"
+    occurrences = cache.get(key)
+    if occurrences is None:
+        occurrences = sorted(
+            expand_occurrences(rule, window_start, window_end),
+            key=lambda occurrence: occurrence.start_date,
+        )
+        # Only windows the API can ask for are worth keeping
+        if (window_end - window_start).days <= getattr(settings, 'EVENT_RECURRENCE_HORIZON_DAYS', 365):
+            cache.set(key, occurrences, getattr(settings, 'EVENT_OCCURRENCE_CACHE_TIMEOUT', 3600))
+    return occurrences
+
+
+def _sort_key(item):
+    event, occurrence = item
+    return (occurrence.start_date if occurrence else event.start_date, event.pk)
+
+
+def merge_occurrences(events, rules, window_start, window_end):
+    """
+    K-way merge of concrete events and virtual occurrences.
+
+    ``events`` must already be ordered by start date. Yields
+    ``(event, occurrence)`` pairs where ``occurrence`` is None for
+    concrete rows.
+    """
+    streams = [((event, None) for event in events)]
+    for rule in rules:
+        streams.append((rule.event, occurrence) for occurrence in get_occurrences(rule, window_start, window_end))
+    return heapq.merge(*streams, key=_sort_key)
+
+
+class MergedWindow:
+    """
+    ``merge_occurrences`` of a window as a sequence for Django's Paginator
+
+    Counting adds the concrete rows' COUNT to the series' occurrences
+    without merging; a slice merges only up to its last item. ``keep``
+    filters occurrences (not concrete rows).
+    """
+
+    def __init__(self, events, rules, window_start, window_end, keep=None):
+        self.events = events
+        self.rules = rules
+        self.window = (window_start, window_end)
+        self.keep = keep or (lambda occurrence: True)
+
+    def count(self):
+        occurrences = sum(
+            1 for rule in self.rules for occurrence in get_occurrences(rule, *self.window) if self.keep(occurrence)
+        )
+        return self.events.count() + occurrences
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('MergedWindow only supports slicing')
+        items = merge_occurrences(self.events.iterator(chunk_size=2000), self.rules, *self.window)
+        items = (item for item in items if item[1] is None or self.keep(item[1]))
+        return list(islice(items, index.start, index.stop))
+
+
+def _display(occurrence):
+    start = occurrence.start_date
+    if occurrence.end_date and occurrence.end_date != start:
+        return format_date_range(start, occurrence.end_date)
+    return f"{get_ordinal_suffix(start.day)} {start.strftime('%B')} {start.year}"
+
+
+def serialize_merged(items, get_serializer):
+    """
+    Serialize merged pairs, reusing one base representation per series.
+
+    ``get_serializer(event)`` returns the serializer of one event. An
+    occurrence only overrides fields present in that representation, so
+    sparse fieldsets stay sparse.
+    """
+    base = {}
+    data = []
+    for event, occurrence in items:
+        if event.pk not in base:
+            base[event.pk] = get_serializer(event).data
+        if occurrence is None:
+            data.append(base[event.pk])
+            continue
+        row = dict(base[event.pk])
+        changes = {
+            'start_date': occurrence.start_date.isoformat(),
+            'end_date': occurrence.end_date.isoformat() if occurrence.end_date else None,
+            'date_range_display': _display(occurrence),
+        }
+        for name, value in occurrence.overrides.items():
+            changes[name] = value.isoformat() if hasattr(value, 'isoformat') else value
+        row.update((name, value) for name, value in changes.items() if name in row)
+        row['occurrence_date'] = occurrence.original_date.isoformat()
+        data.append(row)
+    return data
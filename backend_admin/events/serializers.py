@@ -1,9 +1,9 @@
 from rest_framework import serializers
-from .models import Events
+from .models import Events, EventRecurrence, EventOccurrenceException
 
 
 class RegisterEventsSerializer(serializers.ModelSerializer):
-    date_range_display = serializers.SerializerMethodField()
+    date_range_display = serializers.CharField(source='date_display', read_only=True)
     
     class Meta:
         model = Events
@@ -21,9 +21,6 @@ class RegisterEventsSerializer(serializers.ModelSerializer):
             'author': {'required': False, 'allow_null': True},
         }
     
-    def get_date_range_display(self, obj):
-        return obj.get_date_range_display()
-    
     def create(self, validated_data):
         # Set author from request user if not provided
         request = self.context.get('request')
@@ -51,5 +48,32 @@ class RegisterEventsSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Start date must be before end date.")
         
         return data
-    
-    
\ No newline at end of file
+
+
+class EventRecurrenceSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EventRecurrence
+        fields = ['id', 'frequency', 'interval', 'by_weekday', 'until', 'count', 'updated_at']
+        read_only_fields = ['id', 'updated_at']
+
+    def validate_by_weekday(self, value):
+        days = [day.strip().upper() for day in value.split(',') if day.strip()]
+        invalid = [day for day in days if day not in EventRecurrence.WEEKDAYS]
+        if invalid:
+            raise serializers.ValidationError(f"Unknown weekdays: {', '.join(invalid)}")
+        return ','.join(days)
+
+    def validate(self, data):
+        event = self.instance.event if self.instance else None
+        if event and not event.start_date:
+            raise serializers.ValidationError("Recurring events need a start date.")
+        if data.get('interval') == 0:
+            raise serializers.ValidationError("Interval must be at least 1.")
+        return data
+
+
+class EventOccurrenceExceptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EventOccurrenceException
+        fields = ['id', 'original_date', 'is_cancelled', 'start_date', 'end_date', 'time', 'title', 'location']
+        read_only_fields = ['id']
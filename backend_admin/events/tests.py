@@ -1,3 +1,270 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from audios.models import Audio
+from .models import Events, EventRecurrence, EventOccurrenceException
+from .recurrence import MergedWindow, get_occurrences, iter_occurrence_dates
+
+
+def make_event(title, start=None, end=None, published=True, **kwargs):
+    return Events.objects.create(title=title, start_date=start, end_date=end, published=published, **kwargs)
+
+
+class DateDisplayTests(TestCase):
+    def test_display_is_stored_on_save(self):
+        event = make_event('Conference', date(2025, 7, 20), date(2025, 9, 30))
+        self.assertEqual(event.date_display, '20th July to 30th September 2025')
+
+        event.end_date = date(2026, 1, 2)
+        event.save(update_fields=['end_date'])
+        event.refresh_from_db()
+        self.assertEqual(event.date_display, '20th July 2025 to 2nd January 2026')
+
+    def test_display_falls_back_to_free_text_date(self):
+        self.assertEqual(make_event('Legacy', date='Every Sunday').date_display, 'Every Sunday')
+        self.assertEqual(make_event('Undated').date_display, 'No date specified')
+
+    def test_serializer_reads_stored_display(self):
+        make_event('Crusade', date(2025, 8, 1), date(2025, 8, 3))
+        response = APIClient().get('/api/public/list/')
+        self.assertEqual(response.data['results'][0]['date_range_display'], '1st to 3rd August 2025')
+
+
+class DateRangeFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        cls.past = make_event('Past', today - timedelta(days=10), today - timedelta(days=8))
+        cls.ongoing = make_event('Ongoing', today - timedelta(days=1), today + timedelta(days=1))
+        cls.today_only = make_event('Today', today)
+        cls.upcoming = make_event('Upcoming', today + timedelta(days=5), today + timedelta(days=6))
+        cls.hidden = make_event('Hidden', today + timedelta(days=5), published=False)
+        cls.today = today
+
+    def titles(self, **params):
+        response = APIClient().get('/api/public/list/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['title'] for row in response.data['results']]
+
+    def test_upcoming_past_ongoing(self):
+        self.assertEqual(self.titles(upcoming='true'), ['Upcoming'])
+        self.assertEqual(self.titles(past='true'), ['Past'])
+        self.assertCountEqual(self.titles(ongoing='true'), ['Ongoing', 'Today'])
+
+    def test_between_uses_overlap(self):
+        start = self.today - timedelta(days=9)
+        end = self.today - timedelta(days=1)
+        self.assertEqual(self.titles(between=f"{start},{end}"), ['Past', 'Ongoing'])
+
+    def test_between_rejects_bad_input(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/public/list/', {'between': 'yesterday'}).status_code, 400)
+        self.assertEqual(client.get('/api/public/list/', {'between': '2025-02-01,2025-01-01'}).status_code, 400)
+
+
+class CalendarTests(TestCase):
+    def test_counts_per_day_in_one_aggregate_query(self):
+        make_event('Span', date(2025, 7, 30), date(2025, 8, 2))
+        make_event('Single', date(2025, 8, 2))
+        make_event('Other month', date(2025, 9, 1))
+        make_event('Draft', date(2025, 8, 2), published=False)
+
+        # One aggregate for concrete events, one lookup for recurring series
+        with self.assertNumQueries(2):
+            response = APIClient().get('/api/public/calendar/', {'year': 2025, 'month': 8})
+
+        counts = {row['date']: row['count'] for row in response.data['days']}
+        self.assertEqual(len(counts), 31)
+        self.assertEqual(counts['2025-08-01'], 1)
+        self.assertEqual(counts['2025-08-02'], 2)
+        self.assertEqual(counts['2025-08-03'], 0)
+
+    def test_invalid_month(self):
+        response = APIClient().get('/api/public/calendar/', {'year': 2025, 'month': 13})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecurrenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # 2025-01-05 is a Sunday
+        self.service = make_event('Sunday Service', date(2025, 1, 5))
+        self.rule = EventRecurrence.objects.create(event=self.service, frequency=EventRecurrence.WEEKLY)
+
+    def test_generator_is_lazy_and_skips_to_window(self):
+        dates = iter_occurrence_dates(self.rule, self.service.start_date, not_before=date(2035, 1, 1))
+        first = next(dates)
+        self.assertGreaterEqual(first, date(2034, 12, 25))
+        self.assertEqual(first.weekday(), 6)
+
+    def test_count_and_until_are_respected_after_skipping(self):
+        rule = EventRecurrence(event=self.service, frequency=EventRecurrence.WEEKLY, by_weekday='SU,WE', count=5)
+        self.assertEqual(
+            list(iter_occurrence_dates(rule, date(2025, 1, 5))),
+            [date(2025, 1, 5), date(2025, 1, 8), date(2025, 1, 12), date(2025, 1, 15), date(2025, 1, 19)],
+        )
+        self.assertEqual(list(iter_occurrence_dates(rule, date(2025, 1, 5), not_before=date(2025, 1, 14))),
+                         [date(2025, 1, 15), date(2025, 1, 19)])
+
+        monthly = EventRecurrence(event=self.service, frequency=EventRecurrence.MONTHLY, until=date(2025, 5, 31))
+        self.assertEqual(
+            list(iter_occurrence_dates(monthly, date(2025, 1, 31))),
+            [date(2025, 1, 31), date(2025, 3, 31), date(2025, 5, 31)],
+        )
+
+    def test_series_stop_at_the_last_representable_date(self):
+        for frequency in (EventRecurrence.DAILY, EventRecurrence.WEEKLY, EventRecurrence.MONTHLY):
+            with self.subTest(frequency=frequency):
+                rule = EventRecurrence(event=self.service, frequency=frequency)
+                dates = list(iter_occurrence_dates(rule, date(2025, 1, 5), not_before=date(9999, 12, 1)))
+                self.assertTrue(dates)
+                self.assertLessEqual(dates[-1], date.max)
+
+        response = APIClient().get('/api/public/list/', {'between': '9999-01-01,9999-12-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(APIClient().get('/api/public/calendar/', {'year': 9999, 'month': 12}).status_code, 400)
+
+    def test_exceptions_cancel_and_override(self):
+        EventOccurrenceException.objects.create(recurrence=self.rule, original_date=date(2025, 1, 12), is_cancelled=True)
+        EventOccurrenceException.objects.create(
+            recurrence=self.rule, original_date=date(2025, 1, 19), start_date=date(2025, 1, 18), title='Youth Service',
+        )
+        self.rule.refresh_from_db()
+
+        occurrences = get_occurrences(self.rule, date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(
+            [occurrence.start_date for occurrence in occurrences],
+            [date(2025, 1, 5), date(2025, 1, 18), date(2025, 1, 26)],
+        )
+        self.assertEqual(occurrences[1].overrides, {'title': 'Youth Service'})
+
+    def test_occurrences_are_cached_per_window(self):
+        get_occurrences(self.rule, date(2025, 1, 1), date(2025, 1, 31))
+        with self.assertNumQueries(0):
+            get_occurrences(self.rule, date(2025, 1, 1), date(2025, 1, 31))
+
+    def test_list_merges_concrete_and_virtual_occurrences(self):
+        make_event('Conference', date(2025, 1, 10), date(2025, 1, 11))
+        response = APIClient().get('/api/public/list/', {'between': '2025-01-01,2025-01-20'})
+
+        rows = [(row['title'], row['start_date']) for row in response.data['results']]
+        self.assertEqual(rows, [
+            ('Sunday Service', '2025-01-05'),
+            ('Conference', '2025-01-10'),
+            ('Sunday Service', '2025-01-12'),
+            ('Sunday Service', '2025-01-19'),
+        ])
+        self.assertEqual(response.data['results'][2]['occurrence_date'], '2025-01-12')
+
+    def test_merged_window_is_paged_lazily(self):
+        make_event('Conference', date(2025, 3, 12))
+        window = MergedWindow(Events.objects.filter(recurrence__isnull=True).order_by('start_date', 'id'),
+                              [self.rule], date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual(window.count(), 53)
+        self.assertEqual([item[0].title for item in window[9:12]], ['Sunday Service', 'Conference', 'Sunday Service'])
+
+        response = APIClient().get('/api/public/list/', {'between': '2025-01-01,2025-12-31', 'page': 2})
+        self.assertEqual(response.data['count'], 53)
+        self.assertEqual(response.data['results'][0]['title'], 'Conference')
+        self.assertEqual(response.data['results'][1]['start_date'], '2025-03-16')
+
+    def test_between_span_is_limited(self):
+        response = APIClient().get('/api/public/list/', {'between': '2025-01-01,2225-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('between', response.data)
+
+    def test_sparse_fields_on_merged_occurrences(self):
+        response = APIClient().get('/api/public/list/', {'between': '2025-01-01,2025-01-13', 'fields': 'title'})
+        self.assertEqual(response.data['results'], [
+            {'title': 'Sunday Service', 'occurrence_date': '2025-01-05'},
+            {'title': 'Sunday Service', 'occurrence_date': '2025-01-12'},
+        ])
+
+    def test_calendar_counts_virtual_occurrences(self):
+        response = APIClient().get('/api/public/calendar/', {'year': 2025, 'month': 2})
+        counts = {row['date']: row['count'] for row in response.data['days']}
+        self.assertEqual(sum(counts.values()), 4)
+        self.assertEqual(counts['2025-02-02'], 1)
+
+    def test_recurrence_api(self):
+        user = get_user_model().objects.create_user('editor', password='secret')
+        client = APIClient()
+        client.force_authenticate(user)
+        event = make_event('Midweek Prayer', date(2025, 1, 8))
+
+        response = client.put(f"/api/{event.pk}/recurrence/", {'frequency': 'weekly', 'by_weekday': 'we, fr'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(event.recurrence.by_weekday, 'WE,FR')
+
+        response = client.post(f"/api/{event.pk}/recurrence/exceptions/", {'original_date': '2025-01-10', 'is_cancelled': True})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(client.put(f"/api/{event.pk}/recurrence/", {'by_weekday': 'XX'}).status_code, 400)
+
+
+class EventAudiosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('uploader', password='secret')
+        cls.event = make_event('Crusade', date(2025, 8, 1))
+
+        def audio(title, **kwargs):
+            item = Audio.objects.create(
+                title=title, audio_file=f"audios/{title}.mp3", file_size=1,
+                uploaded_by=cls.user, **{'published': True, 'is_public': True, **kwargs}
+            )
+            item.related_events.add(cls.event)
+            return item
+
+        cls.audio = audio
+        audio('visible')
+        audio('draft', published=False)
+        audio('private', is_public=False)
+
+    def test_event_audios_filters_in_sql(self):
+        response = APIClient().get(f"/api/events/{self.event.pk}/audios/")
+        self.assertEqual([row['title'] for row in response.data['results']], ['visible'])
+
+    def test_unpublished_event_is_hidden(self):
+        draft = make_event('Draft', date(2025, 8, 1), published=False)
+        self.assertEqual(APIClient().get(f"/api/events/{draft.pk}/audios/").status_code, 404)
+
+    def test_include_audios_query_count_is_constant(self):
+        def count_queries():
+            with self.assertNumQueries(3):  # count, events page, one audio prefetch
+                response = APIClient().get('/api/public/list/', {'include': 'audios'})
+            return response
+
+        response = count_queries()
+        self.assertEqual([row['title'] for row in response.data['results'][0]['audios']], ['visible'])
+
+        for index in range(6):
+            event = make_event(f"Event {index}", date(2025, 9, index + 1))
+            self.audio(f"extra-{index}").related_events.add(event)
+        response = count_queries()
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertTrue(all(len(row['audios']) >= 1 for row in response.data['results']))
+
+    def test_plain_list_has_no_audios(self):
+        response = APIClient().get('/api/public/list/')
+        self.assertNotIn('audios', response.data['results'][0])
+
+
+class EventExportTests(TestCase):
+    def test_export_honours_date_filters(self):
+        today = timezone.localdate()
+        make_event('Crusade', today + timedelta(days=3), published=False)
+        make_event('Old', today - timedelta(days=30))
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user('editor', password='secret'))
 
-# Create your tests here.
+        response = client.get('/api/dashboard/export/', {'upcoming': 'true'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'title', 'slug'])
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['Crusade'])
+        self.assertEqual(APIClient().get('/api/dashboard/export/').status_code, 401)
@@ -1,10 +1,15 @@
 from django.urls import path
-from .views import RegisterEventsView, DashboardEventsListView, PublicEventsListView, EventsDetailView
+from .views import RegisterEventsView, DashboardEventsListView, DashboardEventsExportView, PublicEventsListView, EventsDetailView, PublicEventsCalendarView, EventRecurrenceView, EventOccurrenceExceptionListView, EventAudiosListView
 
 urlpatterns = [
     path('create/', RegisterEventsView.as_view(), name='events'),
     path('dashboard/list/', DashboardEventsListView.as_view(), name='dashboard-events-list'),
+    path('dashboard/export/', DashboardEventsExportView.as_view(), name='dashboard-events-export'),
     path('public/list/', PublicEventsListView.as_view(), name='public-events-list'),
+    path('public/calendar/', PublicEventsCalendarView.as_view(), name='public-events-calendar'),
     path('list/', DashboardEventsListView.as_view(), name='events-list'),  # Keep for backward compatibility
+    path('events/<int:pk>/audios/', EventAudiosListView.as_view(), name='events-audios'),
     path('<int:pk>/', EventsDetailView.as_view(), name='events-detail'),
+    path('<int:pk>/recurrence/', EventRecurrenceView.as_view(), name='events-recurrence'),
+    path('<int:pk>/recurrence/exceptions/', EventOccurrenceExceptionListView.as_view(), name='events-recurrence-exceptions'),
 ]
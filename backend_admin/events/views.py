@@ -1,31 +1,297 @@
-from django.shortcuts import render
+import calendar
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.http import Http404
+from django.db.models import Count, Prefetch, Q, prefetch_related_objects
+from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .serializers import RegisterEventsSerializer
-from .models import Events
+from rest_framework.views import APIView
+from backend_admin.exports import ExportMixin
+from backend_admin.fieldsets import SparseFieldsetMixin
+from .serializers import RegisterEventsSerializer, EventRecurrenceSerializer, EventOccurrenceExceptionSerializer
+from .models import Events, EventRecurrence, EventOccurrenceException
+from .recurrence import MergedWindow, get_occurrences, serialize_merged
+from audios.models import Audio
+from audios.serializers import AudioListSerializer, EventWithAudiosSerializer
 
 # Create your views here.
 
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def parse_date_param(value, name):
+    try:
+        return date.fromisoformat(value.strip())
+    except (TypeError, ValueError):
+        raise ValidationError({name: f"Invalid date '{value}', expected YYYY-MM-DD."})
+
+
+def overlapping(start, end):
+    """
+    Q for events whose [start_date, end_date] overlaps [start, end].
+
+    Single-day events may leave end_date empty. The predicate is spelled out
+    on the raw columns instead of Coalesce() so both date indexes stay usable.
+    """
+    q = Q()
+    if end is not None:
+        q &= Q(start_date__lte=end)
+    if start is not None:
+        q &= Q(end_date__gte=start) | Q(end_date__isnull=True, start_date__gte=start)
+    return q & Q(start_date__isnull=False)
+
+
+def recurring_series(events, window_start, window_end):
+    """Recurrence rules of ``events`` that can produce occurrences in a window"""
+    return EventRecurrence.objects.filter(
+        event__in=events.values('pk'),
+        event__start_date__lte=window_end,
+    ).filter(
+        Q(until__isnull=True) | Q(until__gte=window_start)
+    ).select_related('event')
+
+
+class EventDateFilterMixin:
+    """
+    Adds ``upcoming``, ``past``, ``ongoing`` and ``between=start,end``
+    query parameters to an events list view.
+
+    ``upcoming``, ``ongoing`` and ``between`` select a date window; within a
+    window, recurring series are expanded into virtual occurrences and merged
+    with concrete events in start date order.
+    """
+    # Read by the merge whatever ?fields= asks for
+    sparse_required_columns = ('start_date',)
+
+    def is_set(self, name):
+        return self.request.query_params.get(name, '').lower() in TRUE_VALUES
+
+    def get_between(self):
+        between = self.request.query_params.get('between')
+        if not between:
+            return None
+        parts = between.split(',')
+        if len(parts) != 2:
+            raise ValidationError({'between': 'Expected two dates: between=YYYY-MM-DD,YYYY-MM-DD.'})
+        start, end = (parse_date_param(part, 'between') for part in parts)
+        if start > end:
+            raise ValidationError({'between': 'Start date must be before end date.'})
+        horizon = getattr(settings, 'EVENT_RECURRENCE_HORIZON_DAYS', 365)
+        if (end - start).days > horizon:
+            raise ValidationError({'between': f"The range can span at most {horizon} days."})
+        return start, end
+
+    def get_window(self):
+        """Date window for occurrence expansion, or None"""
+        today = timezone.localdate()
+        between = self.get_between()
+        if between:
+            return between
+        if self.is_set('ongoing'):
+            return today, today
+        if self.is_set('upcoming'):
+            horizon = getattr(settings, 'EVENT_RECURRENCE_HORIZON_DAYS', 365)
+            return today + timedelta(days=1), today + timedelta(days=horizon)
+        return None
+
+    def filter_by_dates(self, queryset):
+        today = timezone.localdate()
+
+        if self.is_set('upcoming'):
+            queryset = queryset.filter(start_date__gt=today).order_by('start_date', 'id')
+        if self.is_set('past'):
+            queryset = queryset.filter(
+                Q(end_date__lt=today) | Q(end_date__isnull=True, start_date__lt=today)
+            )
+        if self.is_set('ongoing'):
+            queryset = queryset.filter(overlapping(today, today))
+
+        between = self.get_between()
+        if between:
+            queryset = queryset.filter(overlapping(*between)).order_by('start_date', 'id')
+        return queryset
+
+    def get_queryset(self):
+        return self.filter_by_dates(super().get_queryset())
+
+    def prefetch_series_events(self, events):
+        """Hook for views whose serializer needs related data on series events"""
+
+    def list(self, request, *args, **kwargs):
+        window = self.get_window()
+        if window is None:
+            return super().list(request, *args, **kwargs)
+
+        base = super().get_queryset()
+        concrete = self.filter_queryset(self.get_queryset()).filter(
+            recurrence__isnull=True
+        ).order_by('start_date', 'id')
+        series = list(recurring_series(base, *window))
+        self.prefetch_series_events([rule.event for rule in series])
+        keep = None
+        if self.is_set('upcoming'):
+            today = timezone.localdate()
+            keep = lambda occurrence: occurrence.start_date > today
+
+        page = self.paginate_queryset(MergedWindow(concrete, series, *window, keep=keep))
+        data = serialize_merged(page, self.get_serializer)
+        return self.get_paginated_response(data)
+
+
 class RegisterEventsView(generics.CreateAPIView):
     queryset = Events.objects.all()
     serializer_class = RegisterEventsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class DashboardEventsListView(generics.ListAPIView):
+class DashboardEventsListView(EventDateFilterMixin, SparseFieldsetMixin, generics.ListAPIView):
     """API for dashboard - returns all events (published and unpublished)"""
     queryset = Events.objects.all()
     serializer_class = RegisterEventsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class PublicEventsListView(generics.ListAPIView):
-    """API for public - returns only published events"""
+class DashboardEventsExportView(EventDateFilterMixin, ExportMixin, generics.GenericAPIView):
+    """Every event matching the dashboard list's date filters as CSV or NDJSON
+
+    Recurring series are exported as their stored event, not expanded.
+    """
+    queryset = Events.objects.all()
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'export'
+    export_name = 'events'
+    export_fields = (
+        ('id', 'id'), ('title', 'title'), ('slug', 'slug'), ('date', 'date'), ('start_date', 'start_date'),
+        ('end_date', 'end_date'), ('time', 'time'), ('location', 'location'), ('author', 'author'),
+        ('published', 'published'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
+
+    def get(self, request):
+        return self.export_response(request)
+
+def public_audios_prefetch():
+    """All published public audios of a page of events, in one query"""
+    return Prefetch(
+        'audios',
+        queryset=Audio.objects.published_public().select_related('uploaded_by'),
+        to_attr='public_audios',
+    )
+
+class PublicEventsListView(EventDateFilterMixin, SparseFieldsetMixin, generics.ListAPIView):
+    """API for public - returns only published events
+
+    ``?include=audios`` nests each event's published public audios.
+    """
     queryset = Events.objects.filter(published=True)
     serializer_class = RegisterEventsSerializer
     permission_classes = [permissions.AllowAny]
+    use_read_replica = True
+    throttle_scope = 'public_events'
+
+    def includes_audios(self):
+        return 'audios' in self.request.query_params.get('include', '').split(',')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.includes_audios():
+            queryset = queryset.prefetch_related(public_audios_prefetch())
+        return queryset
+
+    def get_serializer_class(self):
+        if self.includes_audios():
+            return EventWithAudiosSerializer
+        return super().get_serializer_class()
+
+    def prefetch_series_events(self, events):
+        if self.includes_audios():
+            prefetch_related_objects(events, public_audios_prefetch())
+
+class EventAudiosListView(SparseFieldsetMixin, generics.ListAPIView):
+    """Published public audios of a published event"""
+    serializer_class = AudioListSerializer
+    permission_classes = [permissions.AllowAny]
+    use_read_replica = True
+
+    def get_queryset(self):
+        event = get_object_or_404(Events, pk=self.kwargs['pk'], published=True)
+        return Audio.objects.published_public().filter(related_events=event).select_related('uploaded_by')
 
-class EventsDetailView(generics.RetrieveUpdateDestroyAPIView):
+class EventsDetailView(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Events.objects.all()
     serializer_class = RegisterEventsSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+class EventRecurrenceView(generics.RetrieveUpdateDestroyAPIView):
+    """Repeat rule of an event; PUT creates it if missing"""
+    serializer_class = EventRecurrenceSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        event = get_object_or_404(Events, pk=self.kwargs['pk'])
+        try:
+            return event.recurrence
+        except EventRecurrence.DoesNotExist:
+            if self.request.method == 'PUT':
+                return EventRecurrence(event=event)
+            raise Http404
+
+class EventOccurrenceExceptionListView(generics.ListCreateAPIView):
+    """Cancelled or overridden occurrences of a recurring event"""
+    serializer_class = EventOccurrenceExceptionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_recurrence(self):
+        return get_object_or_404(EventRecurrence, event_id=self.kwargs['pk'])
+
+    def get_queryset(self):
+        return EventOccurrenceException.objects.filter(recurrence__event_id=self.kwargs['pk'])
+
+    def perform_create(self, serializer):
+        serializer.save(recurrence=self.get_recurrence())
+
+class PublicEventsCalendarView(APIView):
+    """Published event counts for every day of a month"""
+    permission_classes = [permissions.AllowAny]
+    use_read_replica = True
+
+    def get(self, request):
+        today = timezone.localdate()
+        try:
+            year = int(request.query_params.get('year', today.year))
+            month = int(request.query_params.get('month', today.month))
+            # Occurrences of series near date.min/date.max cannot be expanded
+            if not date.min.year < year < date.max.year:
+                raise ValueError(year)
+            days_in_month = calendar.monthrange(year, month)[1]
+            first = date(year, month, 1)
+            last = date(year, month, days_in_month)
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid year or month'}, status=status.HTTP_400_BAD_REQUEST)
+
+        days = [date(year, month, day) for day in range(1, days_in_month + 1)]
+        published = Events.objects.filter(published=True)
+        counts = published.filter(overlapping(first, last), recurrence__isnull=True).aggregate(**{
+            f"day_{day.day}": Count('id', filter=overlapping(day, day))
+            for day in days
+        })
+        counts = {day: counts[f"day_{day.day}"] for day in days}
+
+        # Recurring series contribute virtual occurrences for this month only
+        for rule in recurring_series(published, first, last):
+            for occurrence in get_occurrences(rule, first, last):
+                end = occurrence.end_date or occurrence.start_date
+                for day in days:
+                    if occurrence.start_date <= day <= end:
+                        counts[day] += 1
 
+        return Response({
+            'year': year,
+            'month': month,
+            'days': [
+                {'date': day.isoformat(), 'count': counts[day]}
+                for day in days
+            ],
+        })
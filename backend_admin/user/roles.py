@@ -0,0 +1,29 @@
+"""
+Cached ``{role_id: name}`` map.
+
+Roles are a handful of rows that almost never change, so list views look
+role names up here instead of joining or querying per user. Any save or
+delete of a Role drops the cached map.
+"""
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Role
+
+ROLE_MAP_KEY = 'user:role-map'
+ROLE_MAP_TIMEOUT = 60 * 60
+
+
+def role_map():
+    roles = cache.get(ROLE_MAP_KEY)
+    if roles is None:
+        roles = dict(Role.objects.values_list('id', 'name'))
+        cache.set(ROLE_MAP_KEY, roles, ROLE_MAP_TIMEOUT)
+    return roles
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def invalidate_role_map(**kwargs):
+    cache.delete(ROLE_MAP_KEY)
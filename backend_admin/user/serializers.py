@@ -32,5 +32,15 @@ class UserSerializer(serializers.ModelSerializer):
         )
         return user
 
-
-
+class UserSummarySerializer(serializers.Serializer):
+    """id, username and role name for user pickers
+
+    Serializes ``values()`` rows; role names come from the ``roles`` map in
+    the context (see user.roles.role_map).
+    """
+    id = serializers.IntegerField()
+    username = serializers.CharField()
+    role = serializers.SerializerMethodField()
+
+    def get_role(self, row):
+        return self.context['roles'].get(row['profile__role_id'])
@@ -1,3 +1,158 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from backend_admin.throttling import TokenBucket, parse_rate
+from .models import Role, UserProfile
+
+User = get_user_model()
+
+RATES = {'login': '100/min', 'token_refresh': '30/min', 'public_audios': '2/min', 'public_events': '600/min'}
+
+
+@override_settings(THROTTLE_RATES=RATES, LOGIN_FAILURE_RATE='3/15m')
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('600/min'), (600, 60))
+        self.assertEqual(parse_rate('5/15m'), (5, 900))
+        self.assertEqual(parse_rate('1000/day'), (1000, 86400))
+        with self.assertRaises(ImproperlyConfigured):
+            parse_rate('often')
+
+    def test_bucket_allows_burst_then_refills(self):
+        bucket = TokenBucket('3/min')
+        self.assertEqual([bucket.take('k', now=100) for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.take('k', now=100), 20)
+        self.assertEqual(bucket.take('k', now=120), 0.0)
+        self.assertEqual(bucket.take('other', now=120), 0.0)
+
+    def test_failed_logins_back_off_before_hashing(self):
+        User.objects.create_user('pastor', password='secret')
+        client = APIClient()
+        for _ in range(3):
+            response = client.post('/api/user/login/', {'username': 'pastor', 'password': 'wrong'}, format='json')
+            self.assertEqual(response.status_code, 401)
+
+        with mock.patch('user.views.authenticate') as authenticate:
+            response = client.post('/api/user/login/', {'username': 'Pastor', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        # One failure refills every 15 / 3 minutes
+        self.assertIn(int(response['Retry-After']), range(295, 301))
+        authenticate.assert_not_called()
+
+        # Other accounts are unaffected, and a success clears the failures
+        User.objects.create_user('deacon', password='secret')
+        response = client.post('/api/user/login/', {'username': 'deacon', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_failed_logins_only_back_off_the_failing_client(self):
+        User.objects.create_user('pastor', password='secret')
+        attacker = APIClient(REMOTE_ADDR='203.0.113.9')
+        for n in range(4):
+            # A rotating X-Forwarded-For is not trusted without NUM_PROXIES
+            attacker.credentials(HTTP_X_FORWARDED_FOR=f"198.51.100.{n}")
+            response = attacker.post('/api/user/login/', {'username': 'pastor', 'password': 'wrong'}, format='json')
+        self.assertEqual(response.status_code, 429)
+
+        response = APIClient().post('/api/user/login/', {'username': 'pastor', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_requires_string_credentials(self):
+        client = APIClient()
+        for payload in ({'username': 123, 'password': 'x'}, {'username': ['pastor'], 'password': 'x'},
+                        {'username': 'pastor', 'password': {'x': 1}}):
+            response = client.post('/api/user/login/', payload, format='json')
+            self.assertEqual(response.status_code, 400, payload)
+
+    @override_settings(THROTTLE_RATES={**RATES, 'login': '2/min'})
+    def test_login_is_throttled_per_ip(self):
+        client = APIClient()
+        statuses = [
+            client.post('/api/user/login/', {'username': f"user{n}", 'password': 'x'}, format='json').status_code
+            for n in range(3)
+        ]
+        self.assertEqual(statuses, [401, 401, 429])
+
+    def test_public_views_use_their_scope(self):
+        client = APIClient()
+        self.assertEqual([client.get('/api/public/audios/').status_code for _ in range(3)], [200, 200, 429])
+        # Separate scope, separate bucket
+        self.assertEqual(client.get('/api/public/list/').status_code, 200)
+
+        # Authenticated clients get a bucket of their own
+        client.force_authenticate(User.objects.create_user('listener', password='secret'))
+        self.assertEqual(client.get('/api/public/audios/').status_code, 200)
+
+        with override_settings(THROTTLE_ENABLED=False):
+            self.assertEqual(APIClient().get('/api/public/audios/').status_code, 200)
+
+
+class UserListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pastor, cls.editor = Role.objects.create(name='Pastor'), Role.objects.create(name='Editor')
+        cls.admin = User.objects.create_user('admin', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_users(self, count):
+        start = User.objects.count()
+        for n in range(start, start + count):
+            user = User.objects.create(username=f"user{n}")
+            UserProfile.objects.create(user=user, role=self.pastor if n % 2 else self.editor)
+
+    def test_list_query_count_is_constant(self):
+        self.add_users(2)
+        with self.assertNumQueries(2):  # count, page joined with profile and role
+            response = self.client.get('/api/user/list/')
+        self.assertEqual(response.data['results'][1]['profile']['role']['name'], 'Pastor')
+        self.assertNotIn('password', response.data['results'][0])
+
+        self.add_users(7)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/user/list/')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_sparse_fields_skip_profile_join(self):
+        self.add_users(2)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/user/list/', {'fields': 'id,username'})
+        self.assertEqual(response.data['results'][1], {'id': self.admin.pk + 1, 'username': 'user1'})
+        response = self.client.get('/api/user/list/', {'fields': 'username,profile'})
+        self.assertEqual(response.data['results'][1]['profile']['role']['name'], 'Pastor')
+        self.assertEqual(self.client.get('/api/user/list/', {'fields': 'password'}).status_code, 400)
+
+    def test_summary_reads_cached_role_map(self):
+        self.add_users(3)
+        self.client.get('/api/user/list/', {'summary': 'true'})
+        with self.assertNumQueries(2):  # count, page; roles come from the cache
+            response = self.client.get('/api/user/list/', {'summary': 'true'})
+        self.assertEqual(response.data['results'], [
+            {'id': self.admin.pk, 'username': 'admin', 'role': None},
+            {'id': self.admin.pk + 1, 'username': 'user1', 'role': 'Pastor'},
+            {'id': self.admin.pk + 2, 'username': 'user2', 'role': 'Editor'},
+            {'id': self.admin.pk + 3, 'username': 'user3', 'role': 'Pastor'},
+        ])
+
+        self.pastor.name = 'Senior Pastor'
+        self.pastor.save()
+        response = self.client.get('/api/user/list/', {'summary': 'true'})
+        self.assertEqual(response.data['results'][1]['role'], 'Senior Pastor')
+
+    def test_detail_is_one_query(self):
+        self.add_users(1)
+        user = User.objects.latest('id')
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/user/{user.pk}/")
+        self.assertEqual(response.data['profile']['role']['name'], 'Pastor')
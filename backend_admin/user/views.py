@@ -1,13 +1,29 @@
+import logging
+import math
+import random
+
+from django.conf import settings
 from django.shortcuts import render
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from django.contrib.auth import authenticate
-from .serializers import UserSerializer
+from backend_admin.fieldsets import SparseFieldsetMixin
+from .roles import role_map
+from .serializers import UserSerializer, UserSummarySerializer
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
+from backend_admin.throttling import (
+    LoginRateThrottle,
+    TokenRefreshRateThrottle,
+    login_backoff,
+    record_login_failure,
+    reset_login_failures,
+)
 # Create your views here.
 
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 
 class RegisterUserView(generics.CreateAPIView):
@@ -15,33 +31,67 @@ class RegisterUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
 
-class UserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+class UserListView(SparseFieldsetMixin, generics.ListAPIView):
+    """Users with their profile and role; ``?summary=true`` returns only id, username and role"""
+    queryset = User.objects.select_related('profile__role').order_by('id')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+
+    def is_summary(self):
+        return self.request.query_params.get('summary', '').lower() in ('1', 'true', 'yes')
+
+    def get_queryset(self):
+        if not self.is_summary():
+            return super().get_queryset()
+        return User.objects.order_by('id').values('id', 'username', 'profile__role_id')
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return UserSummarySerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.is_summary():
+            context['roles'] = role_map()
+        return context
+
     def list(self, request, *args, **kwargs):
-        # Add some debugging
-        print(f"User requesting list: {request.user.username}")
-        print(f"User is authenticated: {request.user.is_authenticated}")
         response = super().list(request, *args, **kwargs)
-        print(f"Response data: {response.data}")
+        if logger.isEnabledFor(logging.DEBUG) and random.random() < settings.USER_LIST_LOG_SAMPLE_RATE:
+            logger.debug(
+                "User list for %s: %s rows (summary=%s)",
+                request.user.username, response.data.get('count'), self.is_summary(),
+            )
         return response
 
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = User.objects.all()
+class UserDetailView(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = User.objects.select_related('profile__role')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+def too_many_attempts(wait):
+    response = Response({
+        'error': 'Too many failed login attempts, try again later'
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([LoginRateThrottle])
 def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
     
-    if username and password:
+    if isinstance(username, str) and isinstance(password, str) and username and password:
+        # Refuse before authenticate() so a guessing burst never reaches the password hasher
+        wait = login_backoff(request, username)
+        if wait:
+            return too_many_attempts(wait)
         user = authenticate(username=username, password=password)
         if user:
+            reset_login_failures(request, username)
             # Generate JWT tokens
             refresh = RefreshToken.for_user(user)
             access_token = str(refresh.access_token)
@@ -55,6 +105,7 @@ def login_view(request):
                 'message': 'Login successful'
             }, status=status.HTTP_200_OK)
         else:
+            record_login_failure(request, username)
             return Response({
                 'error': 'Invalid credentials'
             }, status=status.HTTP_401_UNAUTHORIZED)
@@ -75,6 +126,7 @@ def verify_token_view(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([TokenRefreshRateThrottle])
 def refresh_token_view(request):
     """Refresh access token using refresh token"""
     refresh_token = request.data.get('refresh_token')